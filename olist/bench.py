@@ -0,0 +1,191 @@
+"""
+Benchmarks of the olist feature pipeline.
+
+Times and measures the peak memory of Olist.get_data, of every feature
+method of Order, Seller and Product and of their get_training_data, on
+synthetic datasets of several scales, and compares results with a baseline:
+
+    python -m olist.bench run --scales 1 10 50 --output results.json
+    python -m olist.bench compare baseline.json results.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from olist.data import Olist, ROOT_DIR
+from olist.generator import generate
+from olist.order import Order
+from olist.product import Product
+from olist.seller import Seller
+
+BENCH_PATH = os.path.join(ROOT_DIR, "data", "bench")
+
+# Orders of the 1x dataset
+BASE_ORDERS = 2_000
+SCALES = [1, 10, 50]
+BUILDERS = [Order, Seller, Product]
+
+
+def fixture(scale, bench_dir=BENCH_PATH, base_orders=BASE_ORDERS):
+    """
+    Returns the csv directory of the synthetic dataset of
+    `scale` x `base_orders` orders, generated on first use
+    """
+    csv_dir = os.path.join(bench_dir, f"{scale}x_{base_orders}", "csv")
+    # The translation table is the last file written by the generator
+    translation = "product_category_name_translation.csv"
+    if not os.path.exists(os.path.join(csv_dir, translation)):
+        generate(csv_dir, scale * base_orders)
+    return csv_dir
+
+
+def cases():
+    """
+    Returns a dict of benchmark name: (function of an Olist, whether the
+    datasets are loaded before timing it)
+    """
+    cases = {"Olist.get_data": (lambda olist: olist.get_data(eager=True),
+                                False)}
+    for cls in BUILDERS:
+        for name in list(cls.features.nodes) + ["get_training_data"]:
+            cases[f"{cls.__name__}.{name}"] = (
+                lambda olist, cls=cls, name=name: getattr(cls(olist), name)(),
+                True)
+    return cases
+
+
+def measure(func, olist, preload, repeat=3):
+    """
+    Returns the best wall time of `repeat` runs of func(olist), the peak
+    memory allocated by one more run, and the rows returned.
+    Every run starts from an empty process-wide cache.
+    """
+    def setup():
+        Olist.invalidate()
+        if preload:
+            olist.get_data().load_all()
+
+    times = []
+    for _ in range(repeat):
+        setup()
+        start = time.perf_counter()
+        result = func(olist)
+        times.append(time.perf_counter() - start)
+
+    setup()
+    tracemalloc.start()
+    func(olist)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": min(times),
+            "mean_seconds": sum(times) / len(times),
+            "peak_mb": peak / 2**20,
+            "rows": len(result) if hasattr(result, "__len__") else None}
+
+
+def run(scales=SCALES, select=None, repeat=3, bench_dir=BENCH_PATH,
+        base_orders=BASE_ORDERS):
+    """
+    Runs the benchmarks whose name contains one of `select` (all of them
+    when None) at every scale, and returns the results as a dict
+    """
+    results = []
+    for scale in scales:
+        olist = Olist(csv_dir=fixture(scale, bench_dir, base_orders))
+        for name, (func, preload) in cases().items():
+            if select and not any(s in name for s in select):
+                continue
+            result = measure(func, olist, preload, repeat)
+            results.append(dict(scale=scale, n_orders=scale * base_orders,
+                                case=name, **result))
+            print(f"{scale:>4}x {name:<45} {result['seconds']:9.4f}s "
+                  f"{result['peak_mb']:9.1f}MB", flush=True)
+        Olist.invalidate()
+
+    return {"meta": {"date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                     "python": platform.python_version(),
+                     "pandas": pd.__version__,
+                     "numpy": np.__version__,
+                     "machine": platform.machine(),
+                     "repeat": repeat,
+                     "base_orders": base_orders},
+            "results": results}
+
+
+def compare(baseline, current, threshold=0.2, min_seconds=0.01,
+            min_mb=1.0):
+    """
+    Returns a DataFrame comparing the `current` results to the `baseline`
+    ones, with a 'regression' column flagging the benchmarks more than
+    `threshold` (relative) slower or larger in peak memory. Differences
+    under `min_seconds` or `min_mb` are ignored as noise.
+    """
+    keys = ["scale", "case"]
+    base = pd.DataFrame(baseline["results"]).set_index(keys)
+    new = pd.DataFrame(current["results"]).set_index(keys)
+    df = base[["seconds", "peak_mb"]].join(
+        new[["seconds", "peak_mb"]], how="inner", lsuffix="_base")
+
+    df["time_ratio"] = df["seconds"] / df["seconds_base"]
+    df["memory_ratio"] = df["peak_mb"] / df["peak_mb_base"]
+    slower = (df["time_ratio"] > 1 + threshold) \
+        & (df["seconds"] - df["seconds_base"] > min_seconds)
+    larger = (df["memory_ratio"] > 1 + threshold) \
+        & (df["peak_mb"] - df["peak_mb_base"] > min_mb)
+    df["regression"] = slower | larger
+    return df.reset_index()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m olist.bench",
+        description=__doc__.strip().split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--scales", type=int, nargs="+", default=SCALES)
+    run_parser.add_argument("--select", nargs="+",
+                            help="only run benchmarks containing these names")
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--base-orders", type=int, default=BASE_ORDERS)
+    run_parser.add_argument("--bench-dir", default=BENCH_PATH,
+                            help="directory of the generated datasets")
+    run_parser.add_argument("--output",
+                            default=os.path.join(BENCH_PATH, "results.json"))
+
+    compare_parser = commands.add_parser(
+        "compare", help="flag regressions against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.2)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        results = run(args.scales, args.select, args.repeat, args.bench_dir,
+                      args.base_orders)
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)),
+                    exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    report = compare(baseline, current, args.threshold)
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(report.round(3).to_string(index=False))
+    regressions = report[report["regression"]]
+    print(f"{len(regressions)} regression(s) out of {len(report)} benchmarks")
+    return 1 if len(regressions) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
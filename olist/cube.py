@@ -0,0 +1,298 @@
+import numpy as np
+import pandas as pd
+from olist import profiling
+from olist.graph import Adjacency, OrderGraph
+
+# Entities the cube can be built for
+CUBE_KINDS = ["seller", "product"]
+
+# Measures kept as count, sum and sum of squares, by (entity, month):
+# item price and freight, review scores, and for the items of delivered
+# orders the late handover to the carrier and the customer wait time (days)
+MEASURES = ["price", "freight_value", "review_score", "delay_to_carrier",
+            "wait_time"]
+
+# Statistics of the cube: counts of distinct orders, of items and of
+# reviews of each score, then the count, sum and sum of squares of MEASURES
+STATS = ["orders", "items"] + [f"stars_{k}" for k in range(1, 6)] + \
+    [f"{m}_{s}" for m in MEASURES for s in ["count", "sum", "sumsq"]]
+
+# Ratios of statistics, usable wherever a statistic is
+RATIOS = dict(
+    {m: (f"{m}_sum", f"{m}_count") for m in MEASURES},
+    share_of_one_stars=("stars_1", "review_score_count"),
+    share_of_five_stars=("stars_5", "review_score_count"),
+    quantity_per_order=("items", "orders"),
+)
+
+
+def _months(timestamps):
+    # Months since 1970-01 of datetime64 values, -1 for NaT
+    months = timestamps.astype("datetime64[M]").astype(np.int64)
+    return np.where(np.isnat(timestamps), -1, months)
+
+
+class MetricCube:
+    """
+    Additive statistics (STATS) of the sellers or products (`kind`) by
+    month of purchase of their orders, kept for the (entity, month) cells
+    with orders only: `cells` are the sorted codes entity * n_months +
+    month of these cells, and every statistic an array by cell.
+    Statistics over any range of months, rolling windows and trends are
+    sums of the cells of each entity over these months, instead of new
+    merges of the orders, items and reviews.
+    Orders count once per seller or product, and each review of an order
+    once per seller or product of the order, as in the Seller and Product
+    features; item measures count once per item.
+    """
+
+    def __init__(self, kind, ids, months, cells, stats):
+        self.kind = kind
+        self.ids = pd.Index(ids, name=f"{kind}_id")
+        self.months = months
+        self.cells = cells
+        self.stats = stats
+
+    @classmethod
+    @profiling.profiled("MetricCube.from_olist")
+    def from_olist(cls, olist, kind):
+        """
+        Build the MetricCube of `kind` (one of CUBE_KINDS) from the
+        datasets of `olist`
+        """
+        if kind not in CUBE_KINDS:
+            raise ValueError(f"kind must be one of {CUBE_KINDS}")
+        graph = OrderGraph.get(olist)
+        orders = olist.get_table('orders', [
+            'order_id', 'order_status', 'order_purchase_timestamp',
+            'order_delivered_carrier_date', 'order_delivered_customer_date'])
+        items = olist.get_table('order_items', [
+            'shipping_limit_date', 'price', 'freight_value'])
+        reviews = olist.get_table('order_reviews', ['review_score'])
+
+        # Order columns by graph code, with a trailing missing row for
+        # the rows without a known order (-1)
+        n_orders = len(graph.order_ids)
+        codes = graph.order_codes(orders['order_id'])
+
+        def by_order(values, missing):
+            result = np.full(n_orders + 1, missing, dtype=values.dtype)
+            result[codes] = values
+            return result
+
+        month = by_order(
+            _months(orders['order_purchase_timestamp'].to_numpy()),
+            np.int64(-1))
+        delivered = by_order(
+            (orders['order_status'] == 'delivered').to_numpy(), False)
+        purchase = by_order(orders['order_purchase_timestamp'].to_numpy(),
+                            np.datetime64('NaT'))
+        carrier = by_order(orders['order_delivered_carrier_date'].to_numpy(),
+                           np.datetime64('NaT'))
+        customer = by_order(
+            orders['order_delivered_customer_date'].to_numpy(),
+            np.datetime64('NaT'))
+
+        ids = graph.ids(kind)
+        valid = month[month >= 0]
+        first = valid.min() if len(valid) else 0
+        n_months = int(valid.max() - first + 1) if len(valid) else 0
+        # Cell and weight of every value, by statistic, summed by cell
+        # once all the cells are known
+        values = {}
+
+        def add(name, entities, months, weights=None, dtype=np.float64):
+            keep = (entities >= 0) & (months >= 0)
+            if weights is not None:
+                keep &= ~np.isnan(weights)
+                weights = weights[keep]
+            flat = entities[keep] * n_months + (months[keep] - first)
+            values[name] = (flat, weights, dtype)
+
+        def add_measure(name, entities, months, values):
+            values = np.asarray(values, dtype=np.float64)
+            add(f"{name}_count", entities, months,
+                np.where(np.isnan(values), np.nan, 1.), np.int32)
+            add(f"{name}_sum", entities, months, values)
+            add(f"{name}_sumsq", entities, months, values ** 2)
+
+        # Distinct orders of every entity
+        adjacency = graph.adjacency(kind)
+        add("orders", adjacency.segments(), month[adjacency.indices],
+            dtype=np.int32)
+
+        # Items: price and freight, and delays of delivered orders
+        item_entity = getattr(graph, f"item_{kind}")
+        item_order = graph.item_order
+        item_month = month[item_order]
+        add("items", item_entity, item_month, dtype=np.int32)
+        add_measure("price", item_entity, item_month, items['price'])
+        add_measure("freight_value", item_entity, item_month,
+                    items['freight_value'])
+
+        day = np.timedelta64(24, 'h')
+        is_delivered = delivered[item_order]
+        # Only late handovers to the carrier count as a delay (early
+        # drop-offs and unknown dates count as no delay)
+        delay = (items['shipping_limit_date'].to_numpy() -
+                 carrier[item_order]) / day
+        delay = np.where(delay < 0, -delay, 0.)
+        add_measure("delay_to_carrier", item_entity, item_month,
+                    np.where(is_delivered, delay, np.nan))
+        wait_time = (customer[item_order] - purchase[item_order]) / day
+        add_measure("wait_time", item_entity, item_month,
+                    np.where(is_delivered, wait_time, np.nan))
+
+        # Reviews, once per entity of their order
+        reached = Adjacency(adjacency.offsets, adjacency.indices)\
+            .compose(graph.order_reviews)
+        review_entity = reached.segments()
+        review_month = month[graph.review_order[reached.indices]]
+        scores = reviews['review_score'].to_numpy(np.float64)[reached.indices]
+        for k in range(1, 6):
+            add(f"stars_{k}", review_entity, review_month,
+                np.where(scores == k, 1., 0.), np.int32)
+        add_measure("review_score", review_entity, review_month, scores)
+
+        cells = np.unique(np.concatenate(
+            [flat for flat, _, _ in values.values()]))
+        stats = {}
+        for name in STATS:
+            flat, weights, dtype = values.pop(name)
+            stats[name] = np.bincount(np.searchsorted(cells, flat), weights,
+                                      minlength=len(cells)).astype(dtype)
+
+        months = pd.period_range(
+            pd.Period(np.datetime64(int(first), 'M'), 'M'), periods=n_months,
+            freq='M')
+        return cls(kind, ids, months, cells, stats)
+
+    @classmethod
+    def get(cls, olist, kind):
+        """
+        Returns the MetricCube of `kind` of the dataset loaded by `olist`,
+        built once per process
+        """
+        return olist._cached(("metric_cube", kind, olist.encode_ids),
+                             lambda: cls.from_olist(olist, kind))
+
+    def __repr__(self):
+        return (f"MetricCube({len(self.ids)} {self.kind}s x "
+                f"{len(self.months)} months)")
+
+    def memory_usage(self):
+        """
+        Returns the number of bytes of the cells and statistics
+        """
+        return self.cells.nbytes + sum(values.nbytes
+                                       for values in self.stats.values())
+
+    def _bounds(self, start, end):
+        # Positions of the months from `start` to `end` (both included,
+        # the whole cube when None), clipped to the months of the cube
+        n = len(self.months)
+
+        def position(date, default, offset):
+            if date is None or n == 0:
+                return default
+            position = pd.Period(date, 'M').ordinal \
+                - self.months[0].ordinal + offset
+            return int(np.clip(position, 0, n))
+
+        start = position(start, 0, 0)
+        return start, max(position(end, n, 1), start)
+
+    def _between(self, name, start, stop):
+        # Sums of `name` (a statistic or a ratio) between month positions
+        # start (included) and stop (excluded), broadcast
+        if name in RATIOS:
+            numerator, denominator = RATIOS[name]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return self._between(numerator, start, stop) \
+                    / self._between(denominator, start, stop)
+        if name not in self.stats:
+            raise KeyError(f"Unknown statistic {name}, expected one of "
+                           f"{STATS + list(RATIOS)}")
+        values = self.stats[name]
+        entity, month = np.divmod(self.cells, len(self.months))
+        dtype = np.int64 if values.dtype.kind == "i" else np.float64
+
+        def total(start, stop):
+            inside = (month >= start) & (month < stop)
+            return np.bincount(entity[inside], values[inside],
+                               minlength=len(self.ids)).astype(dtype)
+
+        start, stop = np.broadcast_arrays(start, stop)
+        if start.ndim == 0:
+            return total(start, stop)
+        result = np.zeros((len(self.ids), len(start)), dtype=dtype)
+        for k, bounds in enumerate(zip(start, stop)):
+            result[:, k] = total(*bounds)
+        return result
+
+    def window(self, start=None, end=None, names=None):
+        """
+        Returns a DataFrame indexed by id with the statistics (and ratios)
+        `names` (all of them when None) over the months from `start` to
+        `end` (dates or months like '2017-06', both included; the first
+        and last months of the cube when None), and the standard deviation
+        of MEASURES ('<measure>_std')
+        """
+        start, stop = self._bounds(start, end)
+        columns = {name: self._between(name, start, stop)
+                   for name in (STATS + list(RATIOS) if names is None
+                                else names)}
+        if names is None:
+            for m in MEASURES:
+                n = self._between(f"{m}_count", start, stop)
+                total = self._between(f"{m}_sum", start, stop)
+                squares = self._between(f"{m}_sumsq", start, stop)
+                # Sample standard deviation, as pandas (NaN below two
+                # values)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    variance = np.where(
+                        n > 1, (squares - total ** 2 / n) / (n - 1), np.nan)
+                columns[f"{m}_std"] = np.sqrt(np.maximum(variance, 0))
+        return pd.DataFrame(columns, index=self.ids)
+
+    def last(self, months, end=None, names=None):
+        """
+        Returns the window of the `months` months up to `end` (the last
+        month of the cube when None)
+        """
+        end = pd.Period(end, 'M') if end is not None else self.months[-1]
+        return self.window(end - (months - 1), end, names)
+
+    def rolling(self, name, months=3):
+        """
+        Returns a DataFrame indexed by id, with a column per month, of
+        the statistic or ratio `name` over the `months` months up to each
+        month (fewer at the start of the cube)
+        """
+        stop = np.arange(1, len(self.months) + 1)
+        start = np.maximum(stop - months, 0)
+        return pd.DataFrame(self._between(name, start, stop),
+                            index=self.ids, columns=self.months)
+
+    def trend(self, name, months=None, end=None):
+        """
+        Returns a Series indexed by id with the least squares slope (by
+        month) of the monthly statistic or ratio `name` over the `months`
+        months up to `end` (all the months of the cube when None), skipping
+        the months where a ratio is undefined
+        """
+        start, stop = self._bounds(None, end)
+        if months is not None:
+            start = max(stop - months, 0)
+        positions = np.arange(start, stop)
+        y = self._between(name, positions, positions + 1)
+
+        valid = ~np.isnan(y)
+        x = np.where(valid, positions - start, 0.)
+        y = np.where(valid, y, 0.)
+        n = valid.sum(axis=1)
+        sx, sy = x.sum(axis=1), y.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            slope = (n * (x * y).sum(axis=1) - sx * sy) \
+                / (n * (x ** 2).sum(axis=1) - sx ** 2)
+        return pd.Series(slope, index=self.ids, name=f"{name}_trend")
@@ -1,53 +1,702 @@
 import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import functools
+import threading
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
+from olist import profiling
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CSV_PATH = os.path.join(ROOT_DIR, "data", "csv")
+CACHE_PATH = os.path.join(ROOT_DIR, "data", "cache")
+
+# File extension of the on-disk cache, per format
+CACHE_FORMATS = {"parquet": ".parquet", "feather": ".feather"}
+
+# Join keys that can be interned into integer codes
+ID_COLUMNS = ["order_id", "customer_id", "seller_id", "product_id",
+              "review_id"]
+
+# Declared types of the csv columns, per dataset:
+# - category: low-cardinality strings, loaded as pandas categoricals
+# - integer / float: numerics, downcast to the narrowest lossless width
+# - timestamp: parsed to datetime64 with TIMESTAMP_FORMAT
+# Columns left out (ids, free text, lookup tables such as
+# product_category_name_translation) keep the types inferred by read_csv.
+SCHEMA = {
+    "customers": {
+        "category": ["customer_city", "customer_state"],
+        "integer": ["customer_zip_code_prefix"],
+    },
+    "geolocation": {
+        "category": ["geolocation_city", "geolocation_state"],
+        "integer": ["geolocation_zip_code_prefix"],
+        "float": ["geolocation_lat", "geolocation_lng"],
+    },
+    "order_items": {
+        "integer": ["order_item_id"],
+        "float": ["price", "freight_value"],
+        "timestamp": ["shipping_limit_date"],
+    },
+    "order_payments": {
+        "category": ["payment_type"],
+        "integer": ["payment_sequential", "payment_installments"],
+        "float": ["payment_value"],
+    },
+    "order_reviews": {
+        "integer": ["review_score"],
+        "timestamp": ["review_creation_date", "review_answer_timestamp"],
+    },
+    "orders": {
+        "category": ["order_status"],
+        "timestamp": ["order_purchase_timestamp", "order_approved_at",
+                      "order_delivered_carrier_date",
+                      "order_delivered_customer_date",
+                      "order_estimated_delivery_date"],
+    },
+    "products": {
+        "category": ["product_category_name"],
+        "float": ["product_name_lenght", "product_description_lenght",
+                  "product_photos_qty", "product_weight_g",
+                  "product_length_cm", "product_height_cm",
+                  "product_width_cm"],
+    },
+    "sellers": {
+        "category": ["seller_city", "seller_state"],
+        "integer": ["seller_zip_code_prefix"],
+    },
+}
+
+# Format of every timestamp column of the Olist csv files
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Bump whenever SCHEMA changes, so that stale on-disk caches get rebuilt
+SCHEMA_VERSION = 1
+
+
+def _freeze(df):
+    """
+    Mark the arrays backing `df` as read-only, so that in-place writes
+    on a shared DataFrame raise instead of silently corrupting it.
+    Object columns (strings) stay writable: pandas 1.5 cannot compare
+    read-only object arrays, e.g. in df[df.order_id == order_id]. Hand
+    out frozen frames with _share, which copies them.
+    """
+    for block in df._mgr.blocks:
+        if block.dtype == object:
+            continue
+        values = block.values
+        # Extension arrays (datetimes, categoricals) wrap a numpy array
+        values = getattr(values, "_ndarray", getattr(values, "codes", values))
+        if isinstance(values, np.ndarray):
+            values.flags.writeable = False
+    return df
+
+
+def _share(df):
+    """
+    Returns a shallow copy of the frozen `df` to hand out to a caller:
+    the read-only arrays are shared, while the object arrays are copied
+    (their strings are not), so that writes to them stay with the caller.
+    """
+    shared = df.copy(deep=False)
+    for i in np.flatnonzero((df.dtypes == object).to_numpy()):
+        shared.isetitem(i, df.iloc[:, i].to_numpy().copy())
+    return shared
+
+
+def _downcast_float(series):
+    """
+    Returns `series` as float32 when no value changes in the cast
+    """
+    downcast = series.astype(np.float32)
+    if np.array_equal(downcast.to_numpy(np.float64),
+                      series.to_numpy(np.float64), equal_nan=True):
+        return downcast
+    return series
+
+
+def read_csv(csv_file, key=None, usecols=None):
+    """
+    Read `csv_file` with the SCHEMA declared for dataset `key`
+    (read_csv type inference when `key` has no schema)
+    """
+    profiling.count(csv_loads=1)
+    schema = SCHEMA.get(key, {})
+    columns = pd.read_csv(csv_file, nrows=0).columns
+    if usecols is not None:
+        columns = columns.intersection(usecols)
+
+    df = pd.read_csv(
+        csv_file,
+        usecols=usecols,
+        dtype={c: "category" for c in schema.get("category", [])
+               if c in columns},
+    )
+    # Parse with the known format rather than letting pandas infer it
+    for col in columns.intersection(schema.get("timestamp", [])):
+        df[col] = pd.to_datetime(df[col], format=TIMESTAMP_FORMAT)
+    for col in columns.intersection(schema.get("integer", [])):
+        df[col] = pd.to_numeric(df[col], downcast="integer")
+    for col in columns.intersection(schema.get("float", [])):
+        df[col] = _downcast_float(df[col])
+    return df
+
+
+def _file_hash(path, chunk_size=1 << 20):
+    """
+    Returns the sha256 hex digest of the file at `path`
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class IdCodes:
+    """
+    Process-wide dictionary interning the 32 characters hex ids of each
+    ID_COLUMNS into compact int32 codes (-1 for a missing id).
+    Codes are stable for the lifetime of the process, so frames encoded
+    at different times can be joined together.
+    """
+
+    def __init__(self):
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def encode(self, column, values):
+        """
+        Returns the int32 codes of `values`, interning unseen ids
+        """
+        values = np.asarray(values, dtype=object)
+        with self._lock:
+            index = self._index.get(column, pd.Index([], dtype=object))
+            codes = index.get_indexer(values)
+            unseen = (codes == -1) & pd.notna(values)
+            if unseen.any():
+                index = index.append(pd.Index(pd.unique(values[unseen])))
+                self._index[column] = index
+                codes[unseen] = index.get_indexer(values[unseen])
+        return codes.astype(np.int32)
+
+    def decode(self, column, codes):
+        """
+        Returns the original ids of `codes` (NaN for missing codes)
+        """
+        uniques = self._index.get(column, pd.Index([], dtype=object)).values
+        codes = pd.Series(codes).fillna(-1).to_numpy(dtype=np.int64)
+        ids = uniques.take(codes, mode="clip") if len(uniques) \
+            else np.empty(len(codes), dtype=object)
+        ids[codes < 0] = np.nan
+        return ids
+
+    def __len__(self):
+        return sum(len(index) for index in self._index.values())
+
+    def memory_usage(self):
+        """
+        Returns the bytes used by the interned ids and their hash tables
+        """
+        with self._lock:
+            return sum(index.memory_usage(deep=True)
+                       for index in self._index.values())
+
+
+ID_CODES = IdCodes()
 
 
 class Olist:
-    def get_data(self):
+    """
+    Loads the Olist datasets. Loaded tables are kept in a process-wide cache
+    shared by every Olist instance (and hence by Order, Seller and Product),
+    so the csv files are only parsed once per process.
+
+    With `use_cache=True` (or the OLIST_CACHE environment variable set),
+    each parsed csv is also written to `cache_dir` as a typed columnar file
+    (parquet or feather), which later processes read instead of the csv.
+    A cached table is rebuilt whenever the size, mtime or content hash of
+    its source csv changes.
+
+    With `encode_ids=True` (or the OLIST_ENCODE_IDS environment variable
+    set), every ID_COLUMNS is loaded as int32 codes interned in ID_CODES,
+    so that joins and groupbys run on integers. `decode_ids` restores the
+    original ids.
+    """
+
+    # Process-wide cache, shared across instances and guarded by a lock
+    _cache = {}
+    _lock = threading.RLock()
+    # Per-key locks of the cache entries being loaded
+    _loading = {}
+    # Seconds spent and rows read by the last load of each dataset
+    _load_times = {}
+
+    def __init__(self, use_cache=None, cache_dir=None, cache_format="parquet",
+                 verify_hash=False, encode_ids=None, csv_dir=None):
+        if use_cache is None:
+            use_cache = bool(os.environ.get("OLIST_CACHE"))
+        if encode_ids is None:
+            encode_ids = bool(os.environ.get("OLIST_ENCODE_IDS"))
+        if cache_format not in CACHE_FORMATS:
+            raise ValueError(f"cache_format must be one of "
+                             f"{list(CACHE_FORMATS)}")
+        # Directory of the csv files, data/csv unless said otherwise
+        self.csv_dir = os.path.abspath(
+            csv_dir or os.environ.get("OLIST_CSV_DIR", CSV_PATH))
+        default_cache = CACHE_PATH if self.csv_dir == CSV_PATH \
+            else os.path.join(self.csv_dir, "cache")
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir or os.environ.get("OLIST_CACHE_DIR",
+                                                     default_cache)
+        self.cache_format = cache_format
+        # Hash the csv on every load, even when its size and mtime match
+        self.verify_hash = verify_hash
+        self.encode_ids = encode_ids
+
+    def get_data(self, eager=False, max_workers=None):
         """
-        This function returns a Python dict.
+        This function returns a Python dict-like Datasets.
         Its keys should be 'sellers', 'orders', 'order_items' etc...
-        Its values should be pandas.DataFrame loaded from csv files
+        Its values should be pandas.DataFrame loaded from csv files,
+        each one read on first access only (or right away, by a pool of
+        `max_workers` threads, when `eager`).
+        The DataFrames are read-only views on the shared cache: adding
+        columns is fine, modifying numeric, datetime or categorical values
+        in place raises a ValueError. String columns are copies of their
+        own, so writes to them are not seen by other callers.
         """
-        
-        root_dir = os.path.dirname(os.path.dirname(__file__))
-        csv_path = os.path.join(root_dir, "data", "csv")
+        data = Datasets(self)
+        if eager:
+            data.load_all(max_workers)
+        return data
 
-        file_names = [f for f in os.listdir(csv_path) if f.endswith(".csv")]
+    async def aget_data(self, max_workers=None):
+        """
+        Coroutine returning get_data(eager=True, max_workers), with the
+        files read in threads rather than in the event loop
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self.get_data, True, max_workers))
+
+    def get_table(self, key, columns=None):
+        """
+        Returns the `key` dataset as a read-only DataFrame, read on first
+        access. With `columns`, only these columns are read from the file
+        (or taken from the whole dataset when it is already loaded).
+        """
+        csv_file = self._csv_files()[key]
+        table_key = ("table", self.encode_ids, key)
+
+        if columns is None:
+            df = self._cached(table_key,
+                              lambda: self._load_table(key, csv_file))
+            profiling.count(rows_in=len(df))
+            return _share(df)
+
+        columns = list(columns)
+        with self._lock:
+            full = self._cache.get((self.csv_dir,) + table_key)
+        if full is not None:
+            profiling.count(rows_in=len(full))
+            return full[columns]
+        df = self._cached(table_key + (tuple(columns),),
+                          lambda: self._load_table(key, csv_file, columns))
+        profiling.count(rows_in=len(df))
+        return _share(df)
+
+    def _cached(self, key, load):
+        """
+        Returns the process-wide cached value of `key`, calling `load` on a
+        cache miss. Loads of different keys can run concurrently, while
+        concurrent loads of the same key wait for the first one.
+        Keys are scoped by csv_dir, so datasets of different directories
+        never mix.
+        """
+        key = (self.csv_dir,) + key
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if key in self._cache:
+                    return self._cache[key]
+            value = load()
+            with self._lock:
+                self._cache[key] = value
+                self._loading.pop(key, None)
+        return value
+
+    def _load_table(self, key, csv_file, columns=None):
+        start = time.perf_counter()
+        with profiling.span(f"Olist.load_table[{key}]") as span:
+            df = self._read_table(key, csv_file, columns)
+            if columns is not None:
+                df = df[columns]
+            if self.encode_ids:
+                df = self._encode_ids(df)
+            span.rows(rows_out=len(df))
+        with self._lock:
+            self._load_times[key] = {"seconds": time.perf_counter() - start,
+                                     "rows": len(df),
+                                     "columns": len(df.columns)}
+        return _freeze(df)
+
+    def _csv_files(self):
+        """
+        Returns a dict of dataset name: csv file path, for csv_dir
+        """
+        file_names = sorted(f for f in os.listdir(self.csv_dir)
+                            if f.endswith(".csv"))
 
         key_names = [
-            key_name.replace("olist_", "").replace("_dataset", "").replace(".csv", "")
+            key_name.replace("olist_", "").replace("_dataset", "")
+            .replace(".csv", "")
             for key_name in file_names
         ]
+        return {k: os.path.join(self.csv_dir, f)
+                for k, f in zip(key_names, file_names)}
 
-        # Create the dictionary
-        data = {}
-        for k, f in zip(key_names, file_names):
-            data[k] = pd.read_csv(os.path.join(csv_path, f))
-        return data
+    def _read_table(self, key, csv_file, columns=None):
+        """
+        Returns the DataFrame of `csv_file` (restricted to `columns` if
+        given), going through the on-disk cache when it is enabled
+        """
+        if not self.use_cache:
+            return read_csv(csv_file, key, usecols=columns)
+
+        cache_file = os.path.join(self.cache_dir,
+                                  key + CACHE_FORMATS[self.cache_format])
+        manifest_file = os.path.join(self.cache_dir, key + ".json")
+
+        stat = os.stat(csv_file)
+        source = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+        if os.path.exists(cache_file) and os.path.exists(manifest_file):
+            with open(manifest_file) as f:
+                manifest = json.load(f)
+            fresh = manifest.get("format") == self.cache_format \
+                and manifest.get("schema") == SCHEMA_VERSION \
+                and manifest["size"] == source["size"]
+            if fresh and (self.verify_hash
+                          or manifest["mtime_ns"] != source["mtime_ns"]):
+                # Same size but touched: only the content hash can tell
+                source["sha256"] = _file_hash(csv_file)
+                fresh = manifest["sha256"] == source["sha256"]
+                if fresh and manifest["mtime_ns"] != source["mtime_ns"]:
+                    self._write_manifest(manifest_file, source)
+            if fresh:
+                if self.cache_format == "feather":
+                    return pd.read_feather(cache_file, columns=columns)
+                return pd.read_parquet(cache_file, columns=columns)
+
+        # Missing or stale cache: parse the csv and (re)build the cache
+        df = read_csv(csv_file, key)
+        source.setdefault("sha256", _file_hash(csv_file))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Write to a temporary file first so readers never see a partial file
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        if self.cache_format == "feather":
+            df.to_feather(tmp_file)
+        else:
+            df.to_parquet(tmp_file, index=False)
+        os.replace(tmp_file, cache_file)
+        self._write_manifest(manifest_file, source)
+        return df if columns is None else df[columns]
+
+    def _write_manifest(self, manifest_file, source):
+        tmp_file = f"{manifest_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(dict(source, format=self.cache_format,
+                           schema=SCHEMA_VERSION), f)
+        os.replace(tmp_file, manifest_file)
+
+    def clear_cache(self):
+        """
+        Delete the on-disk cache files of cache_dir and drop the
+        process-wide cache. Only the files written by the cache are
+        deleted: the tables and manifests of the datasets, the
+        geolocation indexes and their temporary files.
+        """
+        if os.path.isdir(self.cache_dir):
+            keys = set(SCHEMA)
+            if os.path.isdir(self.csv_dir):
+                keys |= set(self._csv_files())
+            own = {key + ext for key in keys
+                   for ext in list(CACHE_FORMATS.values()) + [".json"]}
+            for f in os.listdir(self.cache_dir):
+                # Temporary files are <name>.<pid>.tmp[.npz]
+                name = re.sub(r"\.\d+\.tmp(\.npz)?$", "", f)
+                if name in own or re.fullmatch(r"geo_index_\w+\.npz", name):
+                    os.remove(os.path.join(self.cache_dir, f))
+        self.invalidate()
+
+    def memory_report(self):
+        """
+        Returns a DataFrame with, for each dataset:
+        'rows', 'inferred_mb' (memory with read_csv type inference),
+        'schema_mb' (memory with the declared SCHEMA), 'saving' (in %).
+        With encode_ids, the row 'id_codes' gives the ids interned in
+        ID_CODES (shared by all the datasets) and their memory, which the
+        savings of the datasets do not account for.
+        """
+        data = self.get_data()
+        report = []
+        for k, f in self._csv_files().items():
+            inferred = pd.read_csv(f).memory_usage(deep=True).sum()
+            typed = data[k].memory_usage(deep=True).sum()
+            report.append({"dataset": k,
+                           "rows": len(data[k]),
+                           "inferred_mb": inferred / 2**20,
+                           "schema_mb": typed / 2**20,
+                           "saving": 100 * (1 - typed / inferred)})
+        if self.encode_ids:
+            report.append({"dataset": "id_codes",
+                           "rows": len(ID_CODES),
+                           "inferred_mb": 0.0,
+                           "schema_mb": ID_CODES.memory_usage() / 2**20,
+                           "saving": np.nan})
+        return pd.DataFrame(report).set_index("dataset").round(2)
+
+    def load_report(self):
+        """
+        Returns a DataFrame with, for each dataset loaded in this process:
+        'seconds' spent reading it (from the csv or the on-disk cache),
+        'rows' and 'columns' read, slowest first
+        """
+        with self._lock:
+            report = dict(self._load_times)
+        return pd.DataFrame.from_dict(
+            report, orient="index", columns=["seconds", "rows", "columns"])\
+            .rename_axis("dataset").sort_values("seconds", ascending=False)
 
     def get_matching_table(self):
         """
         This function returns a matching table between
-        columns [ "order_id", "review_id", "customer_id", "product_id", "seller_id"]
+        columns [ "order_id", "review_id", "customer_id", "product_id",
+        "seller_id"]
         """
+        matching_table = self._cached(
+            ("matching_table", self.encode_ids),
+            lambda: _freeze(self._build_matching_table()))
 
-        data = self.get_data()
+        return _share(matching_table)
 
+    @profiling.profiled
+    def _build_matching_table(self):
         # Select only the columns of interest
-        orders = data["orders"][["customer_id", "order_id"]]
-        reviews = data["order_reviews"][["order_id", "review_id"]]
-        items = data["order_items"][["order_id", "product_id", "seller_id"]]
+        orders = self.get_table("orders", ["customer_id", "order_id"])
+        reviews = self.get_table("order_reviews", ["order_id", "review_id"])
+        items = self.get_table("order_items",
+                               ["order_id", "product_id", "seller_id"])
 
         # Merge DataFrame
         matching_table = orders\
-        .merge(reviews, on="order_id", how="outer")\
-        .merge(items, on="order_id", how="outer")
+            .merge(reviews, on="order_id", how="outer")\
+            .merge(items, on="order_id", how="outer")
+
+        if self.encode_ids:
+            # The outer merges turn the int32 codes of unmatched rows to NaN
+            matching_table = matching_table.astype(
+                {col: "Int32" for col in ID_COLUMNS})
 
         return matching_table
 
+    def get_order_durations(self):
+        """
+        Returns a read-only DataFrame with, for every order:
+        'order_id', 'order_status', 'wait_time' (purchase to delivery),
+        'expected_wait_time' (purchase to estimated delivery),
+        'delay_vs_expected' (delivery to estimated delivery, negative when
+        late), all in days and NaN when a timestamp is missing.
+        Computed once per process and shared.
+        """
+        durations = self._cached(
+            ("order_durations", self.encode_ids),
+            lambda: _freeze(self._build_order_durations()))
+        return _share(durations)
+
+    @profiling.profiled
+    def _build_order_durations(self):
+        orders = self.get_table("orders")
+        day = np.timedelta64(24, "h")
+        purchase = orders["order_purchase_timestamp"]
+        delivered = orders["order_delivered_customer_date"]
+        estimated = orders["order_estimated_delivery_date"]
+
+        return pd.DataFrame({
+            "order_id": orders["order_id"],
+            "order_status": orders["order_status"],
+            "wait_time": (delivered - purchase) / day,
+            "expected_wait_time": (estimated - purchase) / day,
+            "delay_vs_expected": (estimated - delivered) / day,
+        })
+
+    def get_item_durations(self):
+        """
+        Returns a read-only DataFrame with, for every order item:
+        'order_id', 'product_id', 'seller_id', 'order_status',
+        'delay_to_carrier' (carrier handover to shipping limit, negative
+        when late), 'wait_time' (purchase to delivery), in days.
+        Computed once per process and shared.
+        """
+        durations = self._cached(
+            ("item_durations", self.encode_ids),
+            lambda: _freeze(self._build_item_durations()))
+        return _share(durations)
+
+    @profiling.profiled
+    def _build_item_durations(self):
+        items = self.get_table("order_items")
+        orders = self.get_table("orders")
+        day = np.timedelta64(24, "h")
+        ship = items.merge(orders, on="order_id")
+
+        return pd.DataFrame({
+            "order_id": ship["order_id"],
+            "product_id": ship["product_id"],
+            "seller_id": ship["seller_id"],
+            "order_status": ship["order_status"],
+            "delay_to_carrier": (ship["shipping_limit_date"] -
+                                 ship["order_delivered_carrier_date"]) / day,
+            "wait_time": (ship["order_delivered_customer_date"] -
+                          ship["order_purchase_timestamp"]) / day,
+        })
+
+    @staticmethod
+    def _encode_ids(df):
+        df = df.copy(deep=False)
+        for col in df.columns.intersection(ID_COLUMNS):
+            df[col] = ID_CODES.encode(col, df[col])
+        # Ids may also be index levels, e.g. of a groupby result
+        if any(name in ID_COLUMNS for name in df.index.names):
+            levels = [ID_CODES.encode(name, df.index.get_level_values(i))
+                      if name in ID_COLUMNS
+                      else df.index.get_level_values(i)
+                      for i, name in enumerate(df.index.names)]
+            df.index = pd.MultiIndex.from_arrays(
+                levels, names=df.index.names) if len(levels) > 1 \
+                else pd.Index(levels[0], name=df.index.names[0])
+        return df
+
+    @staticmethod
+    def decode_ids(df):
+        """
+        Returns a copy of `df` with the int32 codes of its ID_COLUMNS
+        replaced by the original ids
+        """
+        df = df.copy(deep=False)
+        for col in df.columns.intersection(ID_COLUMNS):
+            df[col] = ID_CODES.decode(col, df[col])
+        return df
+
+    @classmethod
+    def invalidate(cls):
+        """
+        Drop the process-wide cache: the next call to get_data or
+        get_matching_table reads the csv files again
+        """
+        with cls._lock:
+            cls._cache.clear()
+            cls._load_times.clear()
+
+    def reload(self):
+        """
+        Invalidate the process-wide cache and load the datasets again
+        """
+        # Not under _lock: the threads of load_all take it to fill the cache
+        self.invalidate()
+        return self.get_data(eager=True)
+
     def ping(self):
         """
         You call ping I print pong.
         """
         print("pong")
+
+
+class Datasets(MutableMapping):
+    """
+    Dict-like access to the Olist datasets, as returned by Olist.get_data.
+    A dataset is only read on first access, and `load` reads a subset of
+    its columns without parsing the rest of the file.
+    Assigning or deleting a key only affects this Datasets instance.
+    """
+
+    def __init__(self, olist):
+        self._olist = olist
+        self._keys = list(olist._csv_files())
+        self._local = {}
+
+    def __getitem__(self, key):
+        if key in self._local:
+            return self._local[key]
+        if key not in self._keys:
+            raise KeyError(key)
+        return self._olist.get_table(key)
+
+    def __setitem__(self, key, df):
+        if key not in self._keys:
+            self._keys.append(key)
+        self._local[key] = df
+
+    def __delitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        self._keys.remove(key)
+        self._local.pop(key, None)
+
+    def __iter__(self):
+        return iter(list(self._keys))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return f"Datasets({self._keys})"
+
+    def load(self, key, columns=None):
+        """
+        Returns the `key` dataset, restricted to `columns` if given
+        """
+        if key in self._local:
+            df = self._local[key]
+            return df if columns is None else df[list(columns)]
+        if key not in self._keys:
+            raise KeyError(key)
+        return self._olist.get_table(key, columns)
+
+    def load_all(self, max_workers=None):
+        """
+        Read every dataset not loaded yet, concurrently in a pool of
+        `max_workers` threads (one per dataset, up to the number of CPUs,
+        when None), so that small files do not wait behind large ones
+        """
+        keys = list(self)
+        if max_workers is None:
+            max_workers = min(len(keys), os.cpu_count() or 1)
+
+        def load(key, parent):
+            # Nest the loads of the pool threads under this call
+            with profiling.inherit(parent):
+                return self[key]
+
+        with profiling.span("Olist.load_all"):
+            if max_workers <= 1:
+                for key in keys:
+                    self[key]
+                return self
+            parent = profiling.current()
+            with ThreadPoolExecutor(max_workers) as executor:
+                # Raise the first error, if any
+                list(executor.map(load, keys, [parent] * len(keys)))
+        return self
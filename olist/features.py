@@ -0,0 +1,266 @@
+import functools
+import tempfile
+import threading
+import uuid
+from joblib import Parallel, delayed
+from olist import profiling
+from olist.data import Olist, _freeze, _share
+
+# How build runs independent feature methods concurrently
+BACKENDS = ["threads", "processes"]
+
+# Builder of the last build run by this worker process, reused by the
+# tasks of the same run
+_worker_builder = {}
+
+
+def _compute_node(cls, settings, run, name, kwargs):
+    """
+    Computes the feature method `name` in a worker process, with a builder
+    of class `cls` loading its datasets from the on-disk cache
+    """
+    if _worker_builder.get('run') != run:
+        # Datasets may have changed since the previous run
+        Olist.invalidate()
+        _worker_builder.clear()
+        _worker_builder.update(run=run, builders={})
+    builders = _worker_builder['builders']
+    if cls not in builders:
+        builders[cls] = cls(Olist(**settings))
+    return getattr(builders[cls], name)(**kwargs)
+
+
+class FeatureNode:
+    """
+    A feature method registered in a FeatureGraph
+    """
+
+    def __init__(self, name, columns, requires, output, rows=False):
+        self.name = name
+        self.columns = columns
+        self.requires = requires
+        self.output = output
+        self.rows = rows
+
+    def __repr__(self):
+        return f"FeatureNode({self.name!r}, requires={list(self.requires)})"
+
+
+class FeatureGraph:
+    """
+    Dependency graph of the feature methods of a training-set builder
+    (Order, Seller or Product), joined on `key`.
+
+    Each method registered with `node` declares the columns it returns and
+    the other nodes it requires. Nodes are memoized per instance, so each
+    feature frame (shared intermediates included) is computed at most once
+    per object until `invalidate` is called. `build` evaluates only the
+    nodes needed for the requested columns, along with the nodes deciding
+    the rows (`rows=True`), and merges them on `key`.
+    `tables` are the datasets the nodes read, loaded whole before the
+    threads of a concurrent build start, so that they share one parse of
+    each file rather than racing to parse column projections of it.
+    """
+
+    def __init__(self, key, tables=()):
+        self.key = key
+        self.tables = list(tables)
+        self.nodes = {}
+
+    def node(self, columns=(), requires=(), output=True, rows=False):
+        """
+        Decorator registering a feature method as a node of the graph.
+        `output=False` marks an intermediate, not merged in training sets.
+        `rows=True` marks a node whose keys bound the rows of the training
+        set (e.g. it filters them), evaluated whatever the columns asked
+        for: every other output node must return a row, without missing
+        values, for each key of the rows nodes.
+        """
+        def register(method):
+            name = method.__name__
+            self.nodes[name] = FeatureNode(name, tuple(columns),
+                                           tuple(requires), output, rows)
+
+            @functools.wraps(method)
+            def memoized(obj, *args, **kwargs):
+                memo = obj.__dict__.setdefault('_feature_memo', {})
+                call = (name, args, tuple(sorted(kwargs.items())))
+                if call not in memo:
+                    # Threads asking for the same frame wait for the first
+                    # one to compute it
+                    locks = obj.__dict__.setdefault('_feature_locks', {})
+                    with locks.setdefault(call, threading.Lock()):
+                        if call not in memo:
+                            with profiling.span(
+                                    f"{type(obj).__name__}.{name}") as span:
+                                frame = method(obj, *args, **kwargs)
+                                span.rows(rows_out=len(frame))
+                            memo[call] = _freeze(frame)
+                # Hand out read-only views, so that no caller can alter
+                # the result seen by the other nodes
+                return _share(memo[call])
+            return memoized
+        return register
+
+    def invalidate(self, obj, *names):
+        """
+        Forget the frames memoized by `obj` for the nodes `names` and the
+        nodes requiring them (all of them when no name is given)
+        """
+        stale = set(names)
+        while True:
+            dependents = {n for n, node in self.nodes.items()
+                          if stale & set(node.requires)}
+            if dependents <= stale:
+                break
+            stale |= dependents
+
+        memo = obj.__dict__.get('_feature_memo', {})
+        for call in list(memo):
+            if not names or call[0] in stale:
+                del memo[call]
+
+    def select(self, nodes, columns=None):
+        """
+        Returns the nodes of `nodes` providing at least one of `columns`
+        or deciding the rows (all of them when `columns` is None)
+        """
+        if columns is None:
+            return list(nodes)
+        columns = set(columns) - {self.key}
+        provided = set().union(*(self.nodes[n].columns for n in nodes))
+        missing = columns - provided
+        if missing:
+            raise KeyError(f"No feature provides columns {sorted(missing)}")
+        return [n for n in nodes if self.nodes[n].rows
+                or columns & set(self.nodes[n].columns)]
+
+    def dependencies(self, nodes):
+        """
+        Returns `nodes` and every node they require, dependencies first
+        """
+        ordered = []
+
+        def visit(name, path=()):
+            if name in path:
+                raise ValueError(f"Cycle in features: {path + (name,)}")
+            if name in ordered:
+                return
+            for required in self.nodes[name].requires:
+                visit(required, path + (name,))
+            ordered.append(name)
+
+        for name in nodes:
+            visit(name)
+        return ordered
+
+    def levels(self, nodes):
+        """
+        Returns `nodes` and every node they require, grouped in lists of
+        nodes only requiring nodes of the previous lists
+        """
+        depth = {}
+        for name in self.dependencies(nodes):
+            requires = self.nodes[name].requires
+            depth[name] = 1 + max((depth[r] for r in requires), default=-1)
+        return [[n for n in depth if depth[n] == level]
+                for level in range(max(depth.values(), default=-1) + 1)]
+
+    def build(self, obj, nodes, columns=None, params=None, n_jobs=None,
+              backend="threads", dropna=False):
+        """
+        Returns the training set of `obj`: the output `nodes` providing
+        `columns` (all of them when None) merged on `key`, with `key` and
+        `columns` in this order.
+        `params` maps node names to the keyword arguments to call them with.
+        Rows are the keys present in every node deciding the rows, without
+        missing values with `dropna`, so that they do not depend on
+        `columns`.
+        With `n_jobs`, independent nodes are computed concurrently by a pool
+        of threads or of processes (`backend`). Worker processes read the
+        datasets from the on-disk cache: the one of `obj.olist` with
+        use_cache, else a temporary one deleted after the build.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"backend must be one of {BACKENDS}")
+        params = params or {}
+        outputs = self.select(nodes, columns)
+
+        if n_jobs in (None, 1):
+            # Evaluate shared intermediates first, each one exactly once
+            for name in self.dependencies(outputs):
+                getattr(obj, name)(**params.get(name, {}))
+        elif backend == "threads" or type(obj.olist) is not Olist:
+            # Worker processes load a plain Olist of csv_dir: datasets
+            # held in memory (e.g. the partitions of iter_training_data)
+            # are computed by threads instead
+            self._run_threads(obj, outputs, params, n_jobs)
+        else:
+            self._run_processes(obj, outputs, params, n_jobs)
+        frames = [getattr(obj, name)(**params.get(name, {}))
+                  for name in outputs]
+
+        training_set = frames[0].copy()
+        for name, frame in zip(outputs[1:], frames[1:]):
+            with profiling.span(f"merge[{name}]") as span:
+                span.rows(rows_in=len(training_set) + len(frame))
+                training_set = training_set.merge(frame, on=self.key)
+                span.rows(rows_out=len(training_set))
+
+        if dropna:
+            training_set = training_set.dropna()
+        if columns is not None:
+            training_set = training_set[list(dict.fromkeys(
+                [self.key] + [c for c in columns if c != self.key]))]
+        return training_set
+
+    def _run_threads(self, obj, outputs, params, n_jobs):
+        # Threads share the instance, its memo and the loaded datasets:
+        # nodes of a level only require nodes of the previous levels
+        parent = profiling.current()
+
+        def load(key):
+            with profiling.inherit(parent):
+                obj.olist.get_table(key)
+
+        def compute(name):
+            with profiling.inherit(parent):
+                getattr(obj, name)(**params.get(name, {}))
+
+        with Parallel(n_jobs=n_jobs, backend="threading") as parallel:
+            parallel(delayed(load)(key) for key in self.tables)
+            for level in self.levels(outputs):
+                parallel(delayed(compute)(name) for name in level)
+
+    def _run_processes(self, obj, outputs, params, n_jobs):
+        olist = obj.olist
+        if not olist.use_cache:
+            with tempfile.TemporaryDirectory(prefix="olist-cache-") as tmp:
+                return self._run_processes_from(obj, outputs, params,
+                                                n_jobs, tmp)
+        return self._run_processes_from(obj, outputs, params, n_jobs,
+                                        olist.cache_dir)
+
+    def _run_processes_from(self, obj, outputs, params, n_jobs, cache_dir):
+        olist = obj.olist
+        # Workers read the datasets from the on-disk cache in cache_dir,
+        # written once here, rather than receiving pickled tables with
+        # every task. Ids are encoded here since the codes are only valid
+        # in this process.
+        settings = dict(use_cache=True, cache_dir=cache_dir,
+                        cache_format=olist.cache_format, encode_ids=False,
+                        csv_dir=olist.csv_dir)
+        Olist(**settings).get_data().load_all()
+
+        run = uuid.uuid4().hex
+        frames = Parallel(n_jobs=n_jobs, backend="loky")(
+            delayed(_compute_node)(type(obj), settings, run, name,
+                                   params.get(name, {}))
+            for name in outputs)
+
+        memo = obj.__dict__.setdefault('_feature_memo', {})
+        for name, frame in zip(outputs, frames):
+            if olist.encode_ids:
+                frame = olist._encode_ids(frame)
+            call = (name, (), tuple(sorted(params.get(name, {}).items())))
+            memo[call] = _freeze(frame)
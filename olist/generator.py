@@ -0,0 +1,479 @@
+"""
+Synthetic Olist datasets of any size.
+
+Writes the nine Olist csv files, with the columns and types read by
+olist.data, for any number of orders. Distributions follow the public
+dataset (order statuses, items per order, review scores worse for late
+deliveries, payment types, popular sellers and products...) and every
+foreign key points to an existing row.
+
+Rows are generated and appended to the files chunk by chunk, so memory
+does not grow with the number of orders:
+
+    python -m olist.generator --orders 1000000 --output data/csv
+"""
+import argparse
+import contextlib
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# First day of the public dataset, and its length in days
+START = np.datetime64("2016-09-04T00:00:00")
+SPAN_DAYS = 773
+
+# State, (lat, lng) of its capital and main cities, per range of the
+# first two digits of the zip code prefix
+STATES = [
+    (1, 19, "SP", (-23.55, -46.63), ["sao paulo", "campinas", "guarulhos",
+                                     "santo andre", "sorocaba"]),
+    (20, 28, "RJ", (-22.91, -43.17), ["rio de janeiro", "niteroi",
+                                      "sao goncalo", "duque de caxias"]),
+    (29, 29, "ES", (-20.32, -40.34), ["vitoria", "vila velha", "serra"]),
+    (30, 39, "MG", (-19.92, -43.94), ["belo horizonte", "uberlandia",
+                                      "contagem", "juiz de fora"]),
+    (40, 48, "BA", (-12.97, -38.50), ["salvador", "feira de santana",
+                                      "vitoria da conquista"]),
+    (49, 49, "SE", (-10.91, -37.07), ["aracaju"]),
+    (50, 56, "PE", (-8.05, -34.88), ["recife", "jaboatao dos guararapes",
+                                     "olinda"]),
+    (57, 57, "AL", (-9.67, -35.74), ["maceio"]),
+    (58, 58, "PB", (-7.12, -34.86), ["joao pessoa", "campina grande"]),
+    (59, 59, "RN", (-5.79, -35.21), ["natal", "mossoro"]),
+    (60, 63, "CE", (-3.73, -38.52), ["fortaleza", "juazeiro do norte"]),
+    (64, 64, "PI", (-5.09, -42.80), ["teresina"]),
+    (65, 65, "MA", (-2.53, -44.30), ["sao luis", "imperatriz"]),
+    (66, 68, "PA", (-1.46, -48.50), ["belem", "ananindeua"]),
+    (69, 69, "AM", (-3.12, -60.02), ["manaus"]),
+    (70, 73, "DF", (-15.79, -47.88), ["brasilia"]),
+    (74, 76, "GO", (-16.69, -49.26), ["goiania", "anapolis",
+                                      "aparecida de goiania"]),
+    (77, 77, "TO", (-10.18, -48.33), ["palmas"]),
+    (78, 78, "MT", (-15.60, -56.10), ["cuiaba", "varzea grande"]),
+    (79, 79, "MS", (-20.44, -54.65), ["campo grande", "dourados"]),
+    (80, 87, "PR", (-25.43, -49.27), ["curitiba", "londrina", "maringa"]),
+    (88, 89, "SC", (-27.60, -48.55), ["florianopolis", "joinville",
+                                      "blumenau"]),
+    (90, 99, "RS", (-30.03, -51.23), ["porto alegre", "caxias do sul",
+                                      "pelotas"]),
+]
+
+# Product categories, most frequent first
+CATEGORIES = {
+    "cama_mesa_banho": "bed_bath_table",
+    "beleza_saude": "health_beauty",
+    "esporte_lazer": "sports_leisure",
+    "moveis_decoracao": "furniture_decor",
+    "informatica_acessorios": "computers_accessories",
+    "utilidades_domesticas": "housewares",
+    "relogios_presentes": "watches_gifts",
+    "telefonia": "telephony",
+    "ferramentas_jardim": "garden_tools",
+    "automotivo": "auto",
+    "brinquedos": "toys",
+    "cool_stuff": "cool_stuff",
+    "perfumaria": "perfumery",
+    "bebes": "baby",
+    "eletronicos": "electronics",
+    "papelaria": "stationery",
+    "fashion_bolsas_e_acessorios": "fashion_bags_accessories",
+    "pet_shop": "pet_shop",
+    "moveis_escritorio": "office_furniture",
+    "consoles_games": "consoles_games",
+    "malas_acessorios": "luggage_accessories",
+    "construcao_ferramentas_construcao": "construction_tools_construction",
+    "eletrodomesticos": "home_appliances",
+    "instrumentos_musicais": "musical_instruments",
+    "eletroportateis": "small_appliances",
+}
+
+ORDER_STATUSES = {"delivered": 0.970, "shipped": 0.011, "canceled": 0.0063,
+                  "unavailable": 0.0061, "invoiced": 0.0032,
+                  "processing": 0.0030, "created": 0.0001,
+                  "approved": 0.0001}
+ITEMS_PER_ORDER = {1: 0.900, 2: 0.075, 3: 0.015, 4: 0.006, 5: 0.002, 6: 0.002}
+PAYMENT_TYPES = {"credit_card": 0.74, "boleto": 0.19, "voucher": 0.055,
+                 "debit_card": 0.015}
+# Probabilities of review scores 1 to 5, for orders delivered on time,
+# delivered late and not delivered
+REVIEW_SCORES = {"on_time": [0.07, 0.025, 0.075, 0.20, 0.63],
+                 "late": [0.45, 0.10, 0.13, 0.15, 0.17],
+                 "undelivered": [0.60, 0.10, 0.10, 0.10, 0.10]}
+REVIEW_MESSAGES = ["recebi bem antes do prazo", "produto muito bom",
+                   "otimo vendedor, recomendo", "nao recebi o produto",
+                   "veio com defeito", "entrega atrasou", "tudo certo"]
+
+# Salts of the hashed ids and attributes of each entity
+SALTS = {"order": 1, "customer": 2, "customer_unique": 3, "seller": 4,
+         "product": 5, "review": 6, "zip": 7}
+
+_HEX = np.array([f"{i:02x}".encode() for i in range(256)], dtype="S2")
+
+
+def _mix(x):
+    """
+    splitmix64 finalizer: a bijection of uint64 scrambling its bits
+    """
+    x = np.asarray(x, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _hash(entity, index, field=0):
+    return _mix(np.asarray(index, dtype=np.uint64)
+                + np.uint64((SALTS[entity] << 56) + (field << 48)))
+
+
+def _uniform(entity, index, field):
+    """
+    Returns uniforms in [0, 1) depending only on (`entity`, `index`,
+    `field`), so that any chunk can recompute the attributes of any row
+    """
+    return (_hash(entity, index, field) >> np.uint64(11)) * 2.0 ** -53
+
+
+def _normal(entity, index, field):
+    u1 = _uniform(entity, index, field)
+    u2 = _uniform(entity, index, field + 1)
+    return np.sqrt(-2 * np.log1p(-u1)) * np.cos(2 * np.pi * u2)
+
+
+def _ids(entity, index):
+    """
+    Returns the 32 characters hex ids of the rows `index` of `entity`
+    (unique per entity, since the first 64 bits are a bijection of index)
+    """
+    words = np.stack([_hash(entity, index, 254), _hash(entity, index, 255)],
+                     axis=1)
+    words = words.astype(">u8").view(np.uint8)
+    return _HEX[words].view("S32").ravel().astype(str)
+
+
+def _skewed(u, n, alpha=2.5):
+    """
+    Maps uniforms `u` to indices of [0, n), lower indices being the most
+    frequent (a few sellers or products make most of the sales)
+    """
+    return np.minimum((n * u ** alpha).astype(np.int64), n - 1)
+
+
+def _choice(rng, probabilities, size):
+    keys = list(probabilities)
+    p = np.array(list(probabilities.values()))
+    return np.asarray(keys)[rng.choice(len(keys), size, p=p / p.sum())]
+
+
+def _stamps(values):
+    """
+    Formats datetime64 `values` as in the Olist csv files ('' for NaT)
+    """
+    values = np.asarray(values, dtype="datetime64[s]")
+    text = np.char.replace(np.datetime_as_string(values, unit="s"), "T", " ")
+    return np.where(np.isnat(values), "", text)
+
+
+def _days(days):
+    return (np.asarray(days) * 86400).astype("timedelta64[s]")
+
+
+class Generator:
+    """
+    Generates the Olist datasets for `n_orders` orders. The numbers of
+    sellers, products and zip codes grow with n_orders as in the public
+    dataset. The output depends only on (n_orders, seed, chunk_size).
+    """
+
+    def __init__(self, n_orders, seed=0, chunk_size=50_000):
+        self.n_orders = n_orders
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.n_sellers = max(10, n_orders // 32)
+        self.n_products = max(20, n_orders // 3)
+        self.n_zips = min(19_000, max(50, n_orders // 5))
+
+        rng = np.random.default_rng([seed, SALTS["zip"]])
+        self.zips = np.sort(rng.choice(np.arange(1000, 100_000), self.n_zips,
+                                       replace=False))
+        first_digits = self.zips // 1000
+        state = np.zeros(self.n_zips, dtype=np.int64)
+        for i, (low, high, *_) in enumerate(STATES):
+            state[(first_digits >= low) & (first_digits <= high)] = i
+        # Capitals are the most frequent cities of their state
+        n_cities = np.array([len(s[4]) for s in STATES])[state]
+        city = _skewed(_uniform("zip", self.zips, 0), n_cities, 2)
+        self.zip_city = np.array([STATES[s][4][c] for s, c in
+                                  zip(state, city)], dtype=object)
+        self.zip_state_name = np.array([s[2] for s in STATES],
+                                       dtype=object)[state]
+        center = np.array([s[3] for s in STATES])[state]
+        self.zip_lat = center[:, 0] + 0.5 * _normal("zip", self.zips, 1)
+        self.zip_lng = center[:, 1] + 0.5 * _normal("zip", self.zips, 3)
+
+    def _places(self, zip_index):
+        """
+        Returns the zip code prefix, city and state of `zip_index`
+        """
+        return (self.zips[zip_index], self.zip_city[zip_index],
+                self.zip_state_name[zip_index])
+
+    def _product_seller(self, product):
+        return _skewed(_uniform("product", product, 20), self.n_sellers)
+
+    def _product_price(self, product):
+        return np.exp(4.3 + 0.9 * _normal("product", product, 21))
+
+    def _product_weight(self, product):
+        return np.clip(np.round(np.exp(6.6 + 1.2 * _normal("product",
+                                                           product, 23))),
+                       50, 40_000)
+
+    def _chunks(self, n):
+        for start in range(0, n, self.chunk_size):
+            yield start, np.arange(start, min(start + self.chunk_size, n))
+
+    def write(self, csv_dir):
+        """
+        Write the nine csv files to `csv_dir`
+        """
+        os.makedirs(csv_dir, exist_ok=True)
+        names = ["geolocation", "sellers", "products", "customers", "orders",
+                 "order_items", "order_reviews", "order_payments"]
+        with contextlib.ExitStack() as stack:
+            files = {name: stack.enter_context(open(
+                os.path.join(csv_dir, f"olist_{name}_dataset.csv"), "w",
+                newline="")) for name in names}
+            headers = set()
+
+            def write(name, df):
+                df.to_csv(files[name], index=False,
+                          header=name not in headers)
+                headers.add(name)
+
+            for name, df in self.dimensions():
+                write(name, df)
+            for start, orders in self._chunks(self.n_orders):
+                rng = np.random.default_rng([self.seed, start])
+                for name, df in self.orders(orders, rng).items():
+                    write(name, df)
+
+        pd.DataFrame({
+            "product_category_name": list(CATEGORIES),
+            "product_category_name_english": list(CATEGORIES.values()),
+        }).to_csv(os.path.join(csv_dir,
+                               "product_category_name_translation.csv"),
+                  index=False)
+
+    def dimensions(self):
+        """
+        Yields (dataset name, chunk) of the geolocation, sellers and
+        products datasets
+        """
+        rng = np.random.default_rng([self.seed, SALTS["zip"], 1])
+        # Each zip code prefix has about 50 geolocation rows, scattered
+        # around its center
+        for start, zip_index in self._chunks(self.n_zips):
+            rows = np.repeat(zip_index, 1 + rng.poisson(49, len(zip_index)))
+            zips, city, state = self._places(rows)
+            yield "geolocation", pd.DataFrame({
+                "geolocation_zip_code_prefix": zips,
+                "geolocation_lat": self.zip_lat[rows]
+                + rng.normal(0, 0.02, len(rows)),
+                "geolocation_lng": self.zip_lng[rows]
+                + rng.normal(0, 0.02, len(rows)),
+                "geolocation_city": city,
+                "geolocation_state": state})
+
+        for start, sellers in self._chunks(self.n_sellers):
+            zips, city, state = self._places(
+                _skewed(_uniform("seller", sellers, 0), self.n_zips))
+            yield "sellers", pd.DataFrame({
+                "seller_id": _ids("seller", sellers),
+                "seller_zip_code_prefix": zips,
+                "seller_city": city,
+                "seller_state": state})
+
+        categories = np.array(list(CATEGORIES), dtype=object)
+        for start, products in self._chunks(self.n_products):
+            def field(i):
+                return _normal("product", products, i)
+            category = categories[_skewed(_uniform("product", products, 0),
+                                          len(categories), 1.8)]
+            # About 2% of the products have no category nor description
+            unknown = _uniform("product", products, 1) < 0.0185
+            category[unknown] = None
+            df = pd.DataFrame({
+                "product_id": _ids("product", products),
+                "product_category_name": category,
+                "product_name_lenght": np.clip(np.round(48 + 10 * field(2)),
+                                               5, 76),
+                "product_description_lenght": np.clip(np.round(
+                    np.exp(6.4 + 0.8 * field(4))), 4, 3992),
+                "product_photos_qty": 1 + np.floor(np.abs(1.7 * field(6))),
+                "product_weight_g": self._product_weight(products),
+                "product_length_cm": np.clip(np.round(30 + 16 * field(8)),
+                                             7, 105),
+                "product_height_cm": np.clip(
+                    np.round(np.exp(2.6 + 0.7 * field(10))), 2, 105),
+                "product_width_cm": np.clip(np.round(23 + 12 * field(12)),
+                                            6, 118)})
+            df.loc[unknown, ["product_name_lenght",
+                             "product_description_lenght",
+                             "product_photos_qty"]] = np.nan
+            yield "products", df
+
+    def orders(self, orders, rng):
+        """
+        Returns a dict of the rows of customers, orders, order_items,
+        order_reviews and order_payments for the orders of index `orders`
+        """
+        n = len(orders)
+        order_ids = _ids("order", orders)
+        customer_ids = _ids("customer", orders)
+
+        # About 3% of the customers already ordered before
+        returning = rng.random(n) < 0.03
+        unique = np.where(returning, (orders * rng.random(n)).astype(np.int64),
+                          orders)
+        zips, city, state = self._places(
+            _skewed(_uniform("customer_unique", unique, 0), self.n_zips, 1.6))
+        customers = pd.DataFrame({
+            "customer_id": customer_ids,
+            "customer_unique_id": _ids("customer_unique", unique),
+            "customer_zip_code_prefix": zips,
+            "customer_city": city,
+            "customer_state": state})
+
+        # More and more orders over time
+        purchase = START + _days(SPAN_DAYS * np.sqrt(rng.random(n)))
+        approved = purchase + _days(np.clip(
+            np.exp(rng.normal(np.log(0.015), 1.5, n)), 0.001, 30))
+        carrier = approved + _days(np.exp(rng.normal(np.log(2.5), 0.8, n)))
+        delivered = carrier + _days(np.exp(rng.normal(np.log(7), 0.6, n)))
+        estimated = (purchase + _days(np.clip(rng.normal(25, 8, n), 3, 60)))\
+            .astype("datetime64[D]")
+        status = _choice(rng, ORDER_STATUSES, n)
+        is_delivered = status == "delivered"
+        nat = np.datetime64("NaT")
+        orders_df = pd.DataFrame({
+            "order_id": order_ids,
+            "customer_id": customer_ids,
+            "order_status": status,
+            "order_purchase_timestamp": _stamps(purchase),
+            "order_approved_at": _stamps(
+                np.where(status == "created", nat, approved)),
+            "order_delivered_carrier_date": _stamps(np.where(
+                is_delivered | (status == "shipped"), carrier, nat)),
+            "order_delivered_customer_date": _stamps(
+                np.where(is_delivered, delivered, nat)),
+            "order_estimated_delivery_date": _stamps(estimated)})
+
+        # Items: a product (and its seller) per item, multi-item orders
+        # often repeat the same product
+        n_items = _choice(rng, ITEMS_PER_ORDER, n)
+        item_order = np.repeat(np.arange(n), n_items)
+        first_item = np.repeat(np.cumsum(n_items) - n_items, n_items)
+        item_number = np.arange(len(item_order)) - first_item + 1
+        product = _skewed(rng.random(len(item_order)), self.n_products, 2)
+        repeat = (item_number > 1) & (rng.random(len(item_order)) < 0.5)
+        product = np.where(repeat, product[first_item], product)
+        price = np.round(np.maximum(
+            0.85, self._product_price(product)
+            * (1 + 0.05 * rng.normal(size=len(product)))), 2)
+        freight = np.round(np.maximum(
+            0, 8 + self._product_weight(product) / 1000 * 1.5
+            + rng.exponential(6, len(product))), 2)
+        items = pd.DataFrame({
+            "order_id": order_ids[item_order],
+            "order_item_id": item_number,
+            "product_id": _ids("product", product),
+            "seller_id": _ids("seller", self._product_seller(product)),
+            "shipping_limit_date": _stamps(approved[item_order] + _days(
+                rng.uniform(2, 8, len(item_order)))),
+            "price": price,
+            "freight_value": freight})
+
+        # Reviews: almost every order, a few twice, worse scores for late
+        # and undelivered orders
+        first = np.flatnonzero(rng.random(n) < 0.992)
+        reviewed = np.concatenate([first,
+                                   first[rng.random(len(first)) < 0.006]])
+        late = delivered[reviewed] \
+            > estimated[reviewed] + np.timedelta64(1, "D")
+        kind = np.where(~is_delivered[reviewed], 2, np.where(late, 1, 0))
+        cdf = np.cumsum([REVIEW_SCORES[k] for k in
+                         ["on_time", "late", "undelivered"]], axis=1)[kind]
+        score = np.minimum(
+            1 + (rng.random((len(reviewed), 1)) > cdf).sum(axis=1), 5)
+        created = np.where(is_delivered[reviewed], delivered[reviewed],
+                           estimated[reviewed].astype("datetime64[s]"))\
+            .astype("datetime64[D]") + np.timedelta64(1, "D")
+        answered = created + _days(np.exp(rng.normal(np.log(2), 0.9,
+                                                     len(reviewed))))
+        has_message = rng.random(len(reviewed)) < 0.41
+        messages = np.asarray(REVIEW_MESSAGES, dtype=object)[
+            rng.integers(0, len(REVIEW_MESSAGES), len(reviewed))]
+        review_index = orders[reviewed] * 2 \
+            + (np.arange(len(reviewed)) >= len(first))
+        reviews = pd.DataFrame({
+            "review_id": _ids("review", review_index),
+            "order_id": order_ids[reviewed],
+            "review_score": score,
+            "review_comment_title": np.where(
+                rng.random(len(reviewed)) < 0.12, "recomendo", None),
+            "review_comment_message": np.where(has_message, messages, None),
+            "review_creation_date": _stamps(created),
+            "review_answer_timestamp": _stamps(answered)})
+
+        # Payments: the order total, partly paid by voucher for a few
+        # orders
+        total = np.bincount(item_order, price + freight, minlength=n)
+        payment_type = _choice(rng, PAYMENT_TYPES, n)
+        installments = np.where(payment_type == "credit_card",
+                                np.minimum(rng.geometric(0.3, n), 24), 1)
+        split = rng.random(n) < 0.03
+        voucher_share = np.where(split, rng.uniform(0.1, 0.6, n), 0)
+        payments = pd.DataFrame({
+            "order_id": np.concatenate([order_ids[split], order_ids]),
+            "payment_sequential": np.concatenate(
+                [np.ones(split.sum(), dtype=np.int64), 1 + split]),
+            "payment_type": np.concatenate(
+                [np.full(split.sum(), "voucher"), payment_type]),
+            "payment_installments": np.concatenate(
+                [np.ones(split.sum(), dtype=np.int64), installments]),
+            "payment_value": np.round(np.concatenate(
+                [(total * voucher_share)[split],
+                 total * (1 - voucher_share)]), 2)})
+
+        return {"customers": customers, "orders": orders_df,
+                "order_items": items, "order_reviews": reviews,
+                "order_payments": payments}
+
+
+def generate(csv_dir, n_orders, seed=0, chunk_size=50_000):
+    """
+    Write synthetic Olist csv files with `n_orders` orders to `csv_dir`,
+    `chunk_size` orders at a time
+    """
+    Generator(n_orders, seed, chunk_size).write(csv_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m olist.generator",
+        description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--orders", type=int, required=True)
+    parser.add_argument("--output", required=True,
+                        help="directory of the csv files")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    args = parser.parse_args(argv)
+    generate(args.output, args.orders, args.seed, args.chunk_size)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
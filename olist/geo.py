@@ -0,0 +1,137 @@
+import os
+import numpy as np
+import pandas as pd
+from olist.data import SCHEMA_VERSION
+
+# How the (lat, lng) of a zip code prefix or city is picked among its
+# geolocation rows: the first one, or the mean of all of them
+GEO_MODES = ["first", "centroid"]
+
+
+class GeoIndex:
+    """
+    Maps zip code prefixes and city names to a representative (lat, lng),
+    built once per dataset from the ~1M rows geolocation table.
+    Zip code prefixes index a dense array and cities a sorted array, so
+    geocoding a batch of sellers or customers is an array gather instead
+    of a merge with the geolocation table.
+    """
+
+    def __init__(self, zip_lat, zip_lng, cities, city_lat, city_lng,
+                 mode="first"):
+        self.zip_lat = zip_lat
+        self.zip_lng = zip_lng
+        self.cities = pd.Index(cities)
+        self.city_lat = city_lat
+        self.city_lng = city_lng
+        self.mode = mode
+        # Fingerprint of the geolocation csv the index was built from
+        self.source = np.array([])
+
+    @classmethod
+    def from_geolocation(cls, geolocation, mode="first"):
+        """
+        Build a GeoIndex from the geolocation DataFrame
+        """
+        if mode not in GEO_MODES:
+            raise ValueError(f"mode must be one of {GEO_MODES}")
+        agg = "first" if mode == "first" else "mean"
+        columns = ['geolocation_lat', 'geolocation_lng']
+
+        zips = geolocation.groupby('geolocation_zip_code_prefix')[columns]\
+            .agg(agg)
+        size = int(zips.index.max()) + 1 if len(zips) else 0
+        zip_lat = np.full(size, np.nan)
+        zip_lng = np.full(size, np.nan)
+        zip_lat[zips.index] = zips['geolocation_lat']
+        zip_lng[zips.index] = zips['geolocation_lng']
+
+        cities = geolocation.groupby('geolocation_city',
+                                     observed=True)[columns].agg(agg)
+        return cls(zip_lat, zip_lng,
+                   np.asarray(cities.index, dtype=object),
+                   cities['geolocation_lat'].to_numpy(np.float64),
+                   cities['geolocation_lng'].to_numpy(np.float64),
+                   mode)
+
+    @classmethod
+    def get(cls, olist, mode="first"):
+        """
+        Returns the GeoIndex of the dataset loaded by `olist`, built once
+        per process. When olist uses its on-disk cache, the index is also
+        saved to its cache_dir and rebuilt when the geolocation csv changes.
+        """
+        return olist._cached(("geo_index", mode),
+                             lambda: cls._load_or_build(olist, mode))
+
+    @classmethod
+    def _load_or_build(cls, olist, mode):
+        if not olist.use_cache:
+            return cls.from_geolocation(olist.get_table('geolocation'), mode)
+
+        stat = os.stat(olist._csv_files()['geolocation'])
+        source = np.array([stat.st_size, stat.st_mtime_ns, SCHEMA_VERSION])
+        path = os.path.join(olist.cache_dir, f"geo_index_{mode}.npz")
+        if os.path.exists(path):
+            index = cls.load(path)
+            if np.array_equal(index.source, source):
+                return index
+
+        index = cls.from_geolocation(olist.get_table('geolocation'), mode)
+        index.source = source
+        os.makedirs(olist.cache_dir, exist_ok=True)
+        index.save(path)
+        return index
+
+    def save(self, path):
+        """
+        Save the index to the .npz file `path`
+        """
+        # Write to a temporary file first so readers never see a partial file
+        tmp_file = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_file,
+                 zip_lat=self.zip_lat, zip_lng=self.zip_lng,
+                 cities=np.asarray(self.cities, dtype=str),
+                 city_lat=self.city_lat, city_lng=self.city_lng,
+                 mode=self.mode,
+                 source=self.source)
+        os.replace(tmp_file, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load an index saved with `save`
+        """
+        with np.load(path) as f:
+            index = cls(f['zip_lat'], f['zip_lng'],
+                        f['cities'].astype(object),
+                        f['city_lat'], f['city_lng'], str(f['mode']))
+            index.source = f['source']
+        return index
+
+    def lookup_zip(self, zip_code_prefixes):
+        """
+        Returns the (lat, lng) arrays of `zip_code_prefixes`
+        (NaN for unknown zip code prefixes)
+        """
+        zips = pd.to_numeric(pd.Series(zip_code_prefixes), errors='coerce')\
+            .fillna(-1).to_numpy(np.int64)
+        known = (zips >= 0) & (zips < len(self.zip_lat))
+        return self._gather(self.zip_lat, self.zip_lng, zips, known)
+
+    def lookup_city(self, cities):
+        """
+        Returns the (lat, lng) arrays of `cities`
+        (NaN for unknown cities)
+        """
+        positions = self.cities.get_indexer(np.asarray(cities, dtype=object))
+        return self._gather(self.city_lat, self.city_lng,
+                            positions, positions >= 0)
+
+    @staticmethod
+    def _gather(lats, lngs, positions, known):
+        lat = np.full(len(positions), np.nan)
+        lng = np.full(len(positions), np.nan)
+        lat[known] = lats[positions[known]]
+        lng[known] = lngs[positions[known]]
+        return lat, lng
@@ -0,0 +1,313 @@
+import numpy as np
+import pandas as pd
+from olist import profiling
+
+# Reductions of Adjacency.reduce
+REDUCTIONS = ["sum", "mean", "count", "min", "max"]
+
+
+class Adjacency:
+    """
+    One to many relation between integer codes, as compressed sparse rows:
+    the targets of source i are indices[offsets[i]:offsets[i + 1]], and
+    weights (when not None) the weight of each of these edges, e.g. the
+    number of rows a deduplicated (source, target) pair stands for.
+    """
+
+    __slots__ = ("offsets", "indices", "weights")
+
+    def __init__(self, offsets, indices, weights=None):
+        self.offsets = offsets
+        self.indices = indices
+        self.weights = weights
+
+    @classmethod
+    def from_pairs(cls, sources, targets, n_sources, n_targets=None,
+                   unique=False):
+        """
+        Build the Adjacency of the (sources[i], targets[i]) pairs, skipping
+        pairs with a negative (missing) code. With `unique`, repeated
+        pairs are kept once, weighted by their number of occurrences.
+        Targets keep the order of the pairs within each source (sorted
+        with `unique`).
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        valid = (sources >= 0) & (targets >= 0)
+        sources, targets = sources[valid], targets[valid]
+
+        weights = None
+        if unique:
+            if n_targets is None:
+                n_targets = int(targets.max()) + 1 if len(targets) else 1
+            pairs, weights = np.unique(sources * n_targets + targets,
+                                       return_counts=True)
+            sources, targets = pairs // n_targets, pairs % n_targets
+        else:
+            order = np.argsort(sources, kind="stable")
+            sources, targets = sources[order], targets[order]
+
+        offsets = np.zeros(n_sources + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n_sources),
+                  out=offsets[1:])
+        return cls(offsets, targets, weights)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __repr__(self):
+        return f"Adjacency({len(self)} sources, {len(self.indices)} edges)"
+
+    def degree(self):
+        """
+        Returns the number of targets of every source
+        """
+        return np.diff(self.offsets)
+
+    def segments(self):
+        """
+        Returns the source of every edge
+        """
+        return np.repeat(np.arange(len(self)), self.degree())
+
+    def neighbors(self, source):
+        """
+        Returns the targets of `source`
+        """
+        return self.indices[self.offsets[source]:self.offsets[source + 1]]
+
+    def compose(self, other):
+        """
+        Returns the Adjacency of the sources of self to the targets of
+        `other` reached through the targets of self (which are sources of
+        `other`), with the product of the weights of both edges
+        """
+        degree = other.degree()[self.indices]
+        total = int(degree.sum())
+        # Position in other.indices of every reached edge: the start of
+        # the range of the intermediate node plus the rank in that range
+        ends = np.cumsum(degree)
+        positions = np.repeat(other.offsets[self.indices] - (ends - degree),
+                              degree) + np.arange(total)
+
+        offsets = np.concatenate([[0], ends])[self.offsets]
+        weights = None
+        if self.weights is not None or other.weights is not None:
+            weights = np.ones(total)
+            if self.weights is not None:
+                weights = weights * np.repeat(self.weights, degree)
+            if other.weights is not None:
+                weights = weights * other.weights[positions]
+        return Adjacency(offsets, other.indices[positions], weights)
+
+    def reduce(self, values, how="mean", weights=None):
+        """
+        Returns, for every source, the `how` (one of REDUCTIONS) of the
+        values of its targets (`values` is indexed by target code),
+        skipping NaN and NaT, like a pandas groupby. 'sum', 'mean' and
+        'count' are weighted by `weights` (one per edge) when given.
+        Sources without any value get NaN (NaT), or 0 for 'sum' and 'count'.
+        """
+        if how not in REDUCTIONS:
+            raise ValueError(f"how must be one of {REDUCTIONS}")
+        values = np.asarray(values)
+        n = len(self)
+        datetimes = values.dtype.kind == "M"
+        if datetimes:
+            if how in ("sum", "mean"):
+                raise ValueError(f"Cannot compute the {how} of datetimes")
+            dtype = values.dtype
+            values = values.view(np.int64)
+            missing = values == np.iinfo(np.int64).min
+        else:
+            values = values.astype(np.float64)
+            missing = np.isnan(values)
+
+        gathered = values[self.indices]
+        valid = ~missing[self.indices]
+
+        if how in ("sum", "mean", "count"):
+            segments = self.segments()
+            edge_weights = valid.astype(np.float64)
+            if weights is not None:
+                edge_weights = edge_weights * weights
+            total_weight = np.bincount(segments, weights=edge_weights,
+                                       minlength=n)
+            if how == "count":
+                return total_weight if weights is not None \
+                    else total_weight.astype(np.int64)
+            total = np.bincount(
+                segments, weights=edge_weights * np.where(valid, gathered, 0),
+                minlength=n)
+            if how == "sum":
+                return total
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return total / total_weight
+
+        # min and max: missing values are replaced by the neutral element,
+        # and reduceat runs over the non-empty segments only (an empty
+        # segment would yield the first value of the next one)
+        if datetimes:
+            info = np.iinfo(np.int64)
+            fill = info.max if how == "min" else info.min + 1
+        else:
+            fill = np.inf if how == "min" else -np.inf
+        ufunc = np.minimum if how == "min" else np.maximum
+        result = np.full(n, fill, dtype=values.dtype)
+        starts = self.offsets[:-1][self.degree() > 0]
+        if len(starts):
+            result[self.degree() > 0] = ufunc.reduceat(
+                np.where(valid, gathered, fill), starts)
+        if datetimes:
+            result[result == fill] = np.iinfo(np.int64).min
+            return result.view(dtype)
+        result[result == fill] = np.nan
+        return result
+
+
+class OrderGraph:
+    """
+    Relations of the orders with their items, reviews, sellers, products
+    and customers as integer coded Adjacency, in place of the outer
+    merged matching table (one row per item and review of every order).
+    Sellers, products and customers are related to each of their orders
+    once, weighted by their number of items in the order. Codes are
+    positions in order_ids, seller_ids, product_ids and customer_ids, which
+    are sorted.
+    """
+
+    # Entities related to orders
+    KINDS = ["seller", "product", "customer"]
+
+    def __init__(self, orders, items, reviews):
+        n_items = len(items)
+        codes, self.order_ids = pd.factorize(
+            np.concatenate([orders["order_id"].to_numpy(),
+                            items["order_id"].to_numpy(),
+                            reviews["order_id"].to_numpy()]),
+            sort=True)
+        order_codes = codes[:len(orders)]
+        # Order of every row of order_items and order_reviews
+        self.item_order = codes[len(orders):len(orders) + n_items]
+        self.review_order = codes[len(orders) + n_items:]
+        n_orders = len(self.order_ids)
+
+        customer_codes, self.customer_ids = pd.factorize(
+            orders["customer_id"], sort=True)
+        self.item_seller, self.seller_ids = pd.factorize(
+            items["seller_id"], sort=True)
+        self.item_product, self.product_ids = pd.factorize(
+            items["product_id"], sort=True)
+        # Customer of every order, -1 for orders only known from their
+        # items or reviews
+        self.order_customer = np.full(n_orders, -1, dtype=np.int64)
+        self.order_customer[order_codes] = customer_codes
+
+        # Order -> rows of order_items and of order_reviews
+        self.order_items = Adjacency.from_pairs(
+            self.item_order, np.arange(n_items), n_orders)
+        self.order_reviews = Adjacency.from_pairs(
+            self.review_order, np.arange(len(reviews)), n_orders)
+        # Seller, product and customer -> orders
+        self.seller_orders = Adjacency.from_pairs(
+            self.item_seller, self.item_order, len(self.seller_ids), n_orders,
+            unique=True)
+        self.product_orders = Adjacency.from_pairs(
+            self.item_product, self.item_order, len(self.product_ids),
+            n_orders,
+            unique=True)
+        self.customer_orders = Adjacency.from_pairs(
+            self.order_customer, np.arange(n_orders), len(self.customer_ids))
+        self._order_index = pd.Index(self.order_ids)
+
+    @classmethod
+    @profiling.profiled("OrderGraph.from_olist")
+    def from_olist(cls, olist):
+        """
+        Build the OrderGraph of the orders, order_items and order_reviews
+        datasets of `olist`
+        """
+        return cls(olist.get_table("orders", ["order_id", "customer_id"]),
+                   olist.get_table("order_items",
+                                   ["order_id", "product_id", "seller_id"]),
+                   olist.get_table("order_reviews", ["order_id"]))
+
+    @classmethod
+    def get(cls, olist):
+        """
+        Returns the OrderGraph of the dataset loaded by `olist`, built
+        once per process
+        """
+        return olist._cached(("order_graph", olist.encode_ids),
+                             lambda: cls.from_olist(olist))
+
+    def __repr__(self):
+        return (f"OrderGraph({len(self.order_ids)} orders, "
+                f"{len(self.order_items.indices)} items, "
+                f"{len(self.order_reviews.indices)} reviews)")
+
+    def adjacency(self, kind):
+        """
+        Returns the Adjacency of `kind` (one of KINDS) to its orders
+        """
+        if kind not in self.KINDS:
+            raise ValueError(f"kind must be one of {self.KINDS}")
+        return getattr(self, f"{kind}_orders")
+
+    def ids(self, kind):
+        """
+        Returns the ids of `kind` ('order' or one of KINDS), by code
+        """
+        if kind != "order" and kind not in self.KINDS:
+            raise ValueError(f"kind must be 'order' or one of {self.KINDS}")
+        return getattr(self, f"{kind}_ids")
+
+    def order_codes(self, order_ids):
+        """
+        Returns the codes of `order_ids`, -1 for unknown orders
+        """
+        return self._order_index.get_indexer(order_ids)
+
+    def _reach(self, kind, order_ids, per_item=False, order_weights=None):
+        # Adjacency of `kind` to the positions of `order_ids`, through
+        # the orders, weighted as requested
+        rows = Adjacency.from_pairs(self.order_codes(order_ids),
+                                    np.arange(len(order_ids)),
+                                    len(self.order_ids))
+        if order_weights is not None:
+            rows.weights = np.asarray(order_weights,
+                                      dtype=np.float64)[rows.segments()]
+        adjacency = self.adjacency(kind)
+        if not per_item:
+            adjacency = Adjacency(adjacency.offsets, adjacency.indices)
+        return adjacency.compose(rows)
+
+    def aggregate(self, kind, values, how="mean", per_item=False,
+                  order_weights=None):
+        """
+        Returns a Series indexed by the ids of `kind` (one of KINDS) with
+        the `how` (see Adjacency.reduce) of `values`, a Series indexed by
+        order_id (with one row per value: an order can have several), over
+        the orders of each seller, product or customer having values.
+        Each order counts once per seller or product, or once per item
+        with `per_item`, times `order_weights` (by order code) when given.
+        """
+        reached = self._reach(kind, values.index, per_item, order_weights)
+        result = reached.reduce(values.to_numpy(), how, reached.weights)
+        present = reached.degree() > 0
+        return pd.Series(result[present], name=values.name,
+                         index=pd.Index(self.ids(kind)[present],
+                                        name=f"{kind}_id"))
+
+    def expand(self, kind, frame):
+        """
+        Returns the rows of `frame` (with an 'order_id' column) repeated
+        for every seller, product or customer (`kind`) of their order, with
+        its id as a '<kind>_id' column: the merge of `frame` with the
+        deduplicated (order_id, <kind>_id) pairs of the matching table
+        """
+        reached = self._reach(kind, frame["order_id"])
+        expanded = frame.iloc[reached.indices].reset_index(drop=True)
+        expanded[f"{kind}_id"] = self.ids(kind)[reached.segments()]
+        return expanded[["order_id", f"{kind}_id"] +
+                        [c for c in frame.columns if c != "order_id"]]
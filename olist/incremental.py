@@ -0,0 +1,305 @@
+import numpy as np
+import pandas as pd
+from olist.data import Olist, TIMESTAMP_FORMAT
+from olist.product import Product
+from olist.seller import Seller
+
+DAY = 24 * 3600
+
+# Running sums kept per seller and per product: every training-set feature
+# is a ratio or a combination of them
+SELLER_STATS = ['delivered_items', 'delay_sum', 'wait_sum', 'wait_count',
+                'first_sale', 'last_sale', 'sold', 'reviews', 'one_stars',
+                'five_stars', 'score_sum', 'review_costs', 'n_orders',
+                'quantity', 'sales']
+PRODUCT_STATS = ['wait_rows', 'wait_sum', 'wait_count', 'reviews',
+                 'one_stars', 'five_stars', 'score_sum', 'review_costs',
+                 'n_orders', 'quantity', 'sales']
+
+# Review summary kept per order: number of reviews, one stars, five stars,
+# sum of scores, seller review costs, product review costs
+REVIEW_FIELDS = 6
+
+
+def _seconds(values):
+    """
+    Returns the timestamps `values` as float seconds since epoch (NaN for NaT)
+    """
+    stamps = pd.to_datetime(pd.Series(values), format=TIMESTAMP_FORMAT)
+    seconds = stamps.to_numpy('datetime64[ns]').astype(np.int64) / 1e9
+    seconds[stamps.isna().to_numpy()] = np.nan
+    return seconds
+
+
+class IncrementalFeatures:
+    """
+    Seller and product training sets maintained incrementally.
+
+    Instead of re-aggregating the whole history, the running sufficient
+    statistics of every seller and product (counts, sums, first and last
+    sale dates, one and five stars, review costs, sales) are kept, along
+    with a small summary of every order, so that a batch of new orders,
+    order items and reviews is folded in with `append` in time proportional
+    to the batch. The training sets are then derived from these statistics,
+    with the same rows and values as Seller/Product.get_training_data on
+    the whole history.
+
+    Orders must be appended before or along with their items. Reviews may
+    come at any time, including for orders appended in earlier batches.
+    """
+
+    def __init__(self, olist=None, bootstrap=True):
+        self.olist = olist or Olist()
+        # Static features, not affected by new orders
+        self.seller_features = Seller(self.olist).get_seller_features()\
+            .set_index('seller_id')
+        self.product_features = Product(self.olist).get_product_features()\
+            .set_index('product_id')
+
+        # order_id -> (is_delivered, wait_time, carrier_date, approved_at)
+        self._orders = {}
+        # order_id -> set of seller_id, and dict of product_id -> n items
+        self._order_sellers = {}
+        self._order_products = {}
+        # order_id -> review summary
+        self._order_reviews = {}
+
+        self._sellers = {}
+        self._products = {}
+        # Sum of sqrt(n_orders) over sellers, spreading the IT costs
+        self._sqrt_orders = 0.0
+
+        if bootstrap:
+            data = self.olist.get_data()
+            self._append(orders=data['orders'],
+                         order_items=data['order_items'],
+                         order_reviews=data['order_reviews'])
+
+    def append(self, orders=None, order_items=None, order_reviews=None):
+        """
+        Fold a batch of new rows of the orders, order_items and
+        order_reviews datasets into the statistics.
+        Returns a dict with the 'seller_id' and 'product_id' whose
+        features changed (besides the IT costs of every seller, which
+        depend on the total number of orders).
+        """
+        if self.olist.encode_ids:
+            orders, order_items, order_reviews = (
+                None if df is None else self.olist._encode_ids(df)
+                for df in (orders, order_items, order_reviews))
+        return self._append(orders, order_items, order_reviews)
+
+    def _append(self, orders=None, order_items=None, order_reviews=None):
+        touched = {'seller_id': set(), 'product_id': set()}
+        if orders is not None:
+            self._append_orders(orders)
+        if order_items is not None:
+            self._append_items(order_items, touched)
+        if order_reviews is not None:
+            self._append_reviews(order_reviews, touched)
+        return touched
+
+    def _append_orders(self, orders):
+        order_ids = orders['order_id'].tolist()
+        is_delivered = (orders['order_status'] == 'delivered').tolist()
+        purchase = _seconds(orders['order_purchase_timestamp'])
+        delivered = _seconds(orders['order_delivered_customer_date'])
+        wait_time = ((delivered - purchase) / DAY).tolist()
+        carrier = _seconds(orders['order_delivered_carrier_date']).tolist()
+        approved = _seconds(orders['order_approved_at']).tolist()
+
+        for order_id, *order in zip(order_ids, is_delivered, wait_time,
+                                    carrier, approved):
+            if order_id in self._orders or order_id in self._order_sellers:
+                raise ValueError(f"Order {order_id} appended twice or "
+                                 "after its items")
+            self._orders[order_id] = tuple(order)
+
+    def _append_items(self, order_items, touched):
+        no_reviews = np.zeros(REVIEW_FIELDS)
+        shipping_limit = _seconds(order_items['shipping_limit_date']).tolist()
+
+        for order_id, seller_id, product_id, price, limit in zip(
+                order_items['order_id'].tolist(),
+                order_items['seller_id'].tolist(),
+                order_items['product_id'].tolist(),
+                order_items['price'].tolist(), shipping_limit):
+            order = self._orders.get(order_id)
+            reviews = self._order_reviews.get(order_id, no_reviews)
+            sellers = self._order_sellers.setdefault(order_id, set())
+            products = self._order_products.setdefault(order_id, {})
+
+            seller = self._seller(seller_id)
+            seller['quantity'] += 1
+            seller['sales'] += price
+            if seller_id not in sellers:
+                sellers.add(seller_id)
+                self._sqrt_orders += np.sqrt(seller['n_orders'] + 1) \
+                    - np.sqrt(seller['n_orders'])
+                seller['n_orders'] += 1
+                self._add_reviews(seller, reviews, reviews[4])
+            touched['seller_id'].add(seller_id)
+
+            product = self._product(product_id)
+            product['quantity'] += 1
+            product['sales'] += price
+            if product_id not in products:
+                product['n_orders'] += 1
+                self._add_reviews(product, reviews, reviews[5])
+            products[product_id] = products.get(product_id, 0) + 1
+            touched['product_id'].add(product_id)
+
+            # Dates and durations only count for items of known orders
+            if order is None:
+                continue
+            is_delivered, wait_time, carrier, approved = order
+            seller['sold'] = True
+            if approved == approved:
+                if not seller['first_sale'] <= approved:
+                    seller['first_sale'] = approved
+                if not seller['last_sale'] >= approved:
+                    seller['last_sale'] = approved
+            if is_delivered:
+                # Only late handovers to the carrier count as a delay
+                delay = (limit - carrier) / DAY
+                seller['delivered_items'] += 1
+                seller['delay_sum'] += -delay if delay < 0 else 0
+                if wait_time == wait_time:
+                    seller['wait_sum'] += wait_time
+                    seller['wait_count'] += 1
+                # Product wait times are weighted by the number of
+                # reviews of the order, as in the matching table
+                self._add_wait_time(product, wait_time, max(1, reviews[0]))
+
+    def _append_reviews(self, order_reviews, touched):
+        scores = order_reviews['review_score'].to_numpy(np.float64)
+        batch = pd.DataFrame({
+            'order_id': order_reviews['order_id'].to_numpy(),
+            'reviews': 1.0,
+            'one_stars': scores == 1,
+            'five_stars': scores == 5,
+            'score_sum': scores,
+            'seller_costs': np.select([scores <= 2, scores == 3],
+                                      [100 / scores, 40], 0),
+            'product_costs': np.select([scores <= 2, scores == 3],
+                                       [75 / scores, 30], 0),
+        }).groupby('order_id', sort=False).sum().astype(np.float64)
+
+        for order_id, new in zip(batch.index.tolist(), batch.to_numpy()):
+            old = self._order_reviews.get(order_id, np.zeros(REVIEW_FIELDS))
+            self._order_reviews[order_id] = old + new
+
+            for seller_id in self._order_sellers.get(order_id, ()):
+                self._add_reviews(self._sellers[seller_id], new, new[4])
+                touched['seller_id'].add(seller_id)
+
+            order = self._orders.get(order_id)
+            extra_rows = max(1, old[0] + new[0]) - max(1, old[0])
+            for product_id, n_items in \
+                    self._order_products.get(order_id, {}).items():
+                product = self._products[product_id]
+                self._add_reviews(product, new, new[5])
+                if order is not None and order[0] and extra_rows:
+                    self._add_wait_time(product, order[1],
+                                        extra_rows * n_items)
+                touched['product_id'].add(product_id)
+
+    @staticmethod
+    def _add_reviews(stats, reviews, review_costs):
+        stats['reviews'] += reviews[0]
+        stats['one_stars'] += reviews[1]
+        stats['five_stars'] += reviews[2]
+        stats['score_sum'] += reviews[3]
+        stats['review_costs'] += review_costs
+
+    @staticmethod
+    def _add_wait_time(product, wait_time, rows):
+        product['wait_rows'] += rows
+        if wait_time == wait_time:
+            product['wait_sum'] += rows * wait_time
+            product['wait_count'] += rows
+
+    def _seller(self, seller_id):
+        if seller_id not in self._sellers:
+            stats = dict.fromkeys(SELLER_STATS, 0)
+            stats['first_sale'] = stats['last_sale'] = np.nan
+            stats['sold'] = False
+            self._sellers[seller_id] = stats
+        return self._sellers[seller_id]
+
+    def _product(self, product_id):
+        if product_id not in self._products:
+            self._products[product_id] = dict.fromkeys(PRODUCT_STATS, 0)
+        return self._products[product_id]
+
+    @staticmethod
+    def _stats(entities, features, ids):
+        """
+        Returns the statistics of the `ids` (all of them when None) having
+        static features, as a DataFrame aligned with these features
+        """
+        if ids is None:
+            ids = list(entities)
+        ids = [i for i in ids if i in entities]
+        positions = features.index.get_indexer(ids)
+        known = positions >= 0
+        stats = pd.DataFrame.from_records(
+            [entities[i] for i, k in zip(ids, known) if k],
+            columns=list(next(iter(entities.values()), {})))
+        return features.iloc[positions[known]].reset_index(), stats
+
+    def get_seller_training_data(self, seller_ids=None):
+        """
+        Returns the same DataFrame as Seller.get_training_data, for the
+        `seller_ids` (all sellers when None)
+        """
+        features, stats = self._stats(self._sellers, self.seller_features,
+                                      seller_ids)
+        df = features
+        df['delay_to_carrier'] = stats['delay_sum'] / stats['delivered_items']
+        df['wait_time'] = stats['wait_sum'] / stats['wait_count']
+        df['date_first_sale'] = pd.to_datetime(stats['first_sale'], unit='s')
+        df['date_last_sale'] = pd.to_datetime(stats['last_sale'], unit='s')
+        df['active_months'] = np.floor(
+            ((df['date_last_sale'] - df['date_first_sale'])
+             / np.timedelta64(1, 'M')) + 1)
+        df['share_of_one_stars'] = stats['one_stars'] / stats['reviews']
+        df['share_of_five_stars'] = stats['five_stars'] / stats['reviews']
+        df['review_score'] = stats['score_sum'] / stats['reviews']
+        it_costs = np.sqrt(stats['n_orders']) * 500_000 / self._sqrt_orders
+        df['costs'] = it_costs + stats['review_costs']
+        df['revenues'] = stats['sales'] / 10 + df['active_months'] * 80
+        df['profits'] = df['revenues'] - df['costs']
+        df['n_orders'] = stats['n_orders'].astype(np.int64)
+        df['quantity'] = stats['quantity'].astype(np.int64)
+        df['quantity_per_order'] = df['quantity'] / df['n_orders']
+        df['sales'] = stats['sales']
+
+        # Sellers missing from a feature frame are dropped by the merges
+        # of get_training_data
+        present = (stats['delivered_items'] > 0) & stats['sold'] \
+            & (stats['reviews'] > 0)
+        return df[present.to_numpy()].reset_index(drop=True)
+
+    def get_product_training_data(self, product_ids=None):
+        """
+        Returns the same DataFrame as Product.get_training_data, for the
+        `product_ids` (all products when None)
+        """
+        features, stats = self._stats(self._products, self.product_features,
+                                      product_ids)
+        df = features
+        df['wait_time'] = stats['wait_sum'] / stats['wait_count']
+        df['price'] = stats['sales'] / stats['quantity']
+        df['share_of_one_stars'] = stats['one_stars'] / stats['reviews']
+        df['share_of_five_stars'] = stats['five_stars'] / stats['reviews']
+        df['review_score'] = stats['score_sum'] / stats['reviews']
+        df['costs'] = stats['review_costs']
+        df['revenues'] = stats['sales'] / 10
+        df['profits'] = df['revenues'] - df['costs']
+        df['n_orders'] = stats['n_orders'].astype(np.int64)
+        df['quantity'] = stats['quantity'].astype(np.int64)
+        df['sales'] = stats['sales']
+
+        present = (stats['wait_rows'] > 0) & (stats['reviews'] > 0)
+        return df[present.to_numpy()].reset_index(drop=True)
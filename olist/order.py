@@ -1,7 +1,14 @@
-import pandas as pd
+import tempfile
 import numpy as np
+import pandas as pd
+from memoized_property import memoized_property
 from olist.utils import haversine_distance
+from olist import profiling
 from olist.data import Olist
+from olist.features import FeatureGraph
+from olist.geo import GeoIndex
+from olist.graph import OrderGraph
+from olist.streaming import PartitionOlist, partition_by_order
 
 
 class Order:
@@ -10,60 +17,59 @@ class Order:
     and various properties of these orders as columns
     '''
 
-    def __init__(self):
-        self.data = Olist().get_data()
-        # The constructor of class Order assigns an attribute ".data" to all new instances of Order
-        # i.e Order().data is defined
+    # Feature methods, as nodes of the graph building the training set
+    features = FeatureGraph(
+        'order_id',
+        tables=['orders', 'order_items', 'order_reviews'])
+
+    def __init__(self, olist=None):
+        # Pass an Olist instance to choose how the datasets are loaded
+        self.olist = olist or Olist()
 
+    @memoized_property
+    def data(self):
+        # Order().data is defined, and loaded on first access only
+        return self.olist.get_data()
+
+    def invalidate(self, *names):
+        """
+        Forget the feature frames memoized by this instance for the
+        methods `names` and the methods using them (all of them, along
+        with the datasets, when no name is given), e.g. after Olist.reload()
+        """
+        self.features.invalidate(self, *names)
+        if not names:
+            self.__dict__.pop('_data', None)
+
+    @features.node(columns=['wait_time', 'expected_wait_time',
+                            'delay_vs_expected', 'order_status'],
+                   rows=True)
     def get_wait_time(self, is_delivered=True):
         """
         02-01 > Returns a DataFrame with:
         [order_id, wait_time, expected_wait_time, delay_vs_expected, order_status]
         filtering out non-delivered orders unless specified
         """
-        # make sure we don't create a "view" but a copy
-        orders = self.data['orders'].copy()
+        # wait_time, expected_wait_time and delay_vs_expected (in days)
+        # are computed once per dataset by Olist
+        orders = self.olist.get_order_durations()
 
         # filter delivered orders
         if is_delivered:
             orders = orders.query("order_status=='delivered'").copy()
 
-        # handle datetime
-        orders.loc[:, 'order_delivered_customer_date'] = \
-            pd.to_datetime(orders['order_delivered_customer_date'])
-        orders.loc[:, 'order_estimated_delivery_date'] = \
-            pd.to_datetime(orders['order_estimated_delivery_date'])
-        orders.loc[:, 'order_purchase_timestamp'] = \
-            pd.to_datetime(orders['order_purchase_timestamp'])
-
-        # compute delay vs expected
-        orders.loc[:, 'delay_vs_expected'] = \
-            (orders['order_estimated_delivery_date'] -
-             orders['order_delivered_customer_date']) / np.timedelta64(24, 'h')
-
-        def handle_delay(x):
-            # We only want to keep delay where wait_time is longer than expected (not the other way around)
-            # This is what drives customer dissatisfaction!
-            if x < 0:
-                return abs(x)
-            return 0
-
-        orders.loc[:, 'delay_vs_expected'] = \
-            orders['delay_vs_expected'].apply(handle_delay)
-
-        # compute wait time
-        orders.loc[:, 'wait_time'] = \
-            (orders['order_delivered_customer_date'] -
-             orders['order_purchase_timestamp']) / np.timedelta64(24, 'h')
-
-        # compute expected wait time
-        orders.loc[:, 'expected_wait_time'] = \
-            (orders['order_estimated_delivery_date'] -
-             orders['order_purchase_timestamp']) / np.timedelta64(24, 'h')
+        # We only want to keep delay where wait_time is longer than expected
+        # (not the other way around)
+        # This is what drives customer dissatisfaction!
+        delay = orders['delay_vs_expected']
+        orders['delay_vs_expected'] = np.where(delay < 0, -delay, 0)
 
         return orders[['order_id', 'wait_time', 'expected_wait_time',
                        'delay_vs_expected', 'order_status']]
 
+    @features.node(columns=['dim_is_five_star', 'dim_is_one_star',
+                            'review_score'],
+                   rows=True)
     def get_review_score(self):
         """
         02-01 > Returns a DataFrame with:
@@ -91,6 +97,7 @@ class Order:
         return reviews[['order_id', 'dim_is_five_star',
                         'dim_is_one_star', 'review_score']]
 
+    @features.node(columns=['number_of_products'])
     def get_number_products(self):
         """
         02-01 > Returns a DataFrame with:
@@ -105,6 +112,7 @@ class Order:
         products.columns = ['order_id', 'number_of_products']
         return products
 
+    @features.node(columns=['number_of_sellers'])
     def get_number_sellers(self):
         """
         02-01 > Returns a DataFrame with:
@@ -119,6 +127,7 @@ class Order:
 
         return sellers
 
+    @features.node(columns=['price', 'freight_value'], rows=True)
     def get_price_and_freight(self):
         """
         02-01 > Returns a DataFrame with:
@@ -134,6 +143,7 @@ class Order:
 
         return price_freight
 
+    @features.node(columns=['distance_seller_customer'], rows=True)
     def get_distance_seller_customer(self):
         """
         02-01 > Returns a DataFrame with order_id
@@ -143,88 +153,111 @@ class Order:
         # import data
 
         data = self.data
-        matching_table = Olist().get_matching_table()
+        graph = OrderGraph.get(self.olist)
 
         # Since one zipcode can map to multiple (lat, lng), take first one
-        geo = data['geolocation']
-        geo = geo.groupby('geolocation_zip_code_prefix',
-                          as_index=False).first()
+        geo = GeoIndex.get(self.olist, mode='first')
 
         # Select sellers and customers
-        sellers = data['sellers']
-        customers = data['customers']
-
-        # Merge geo_location for sellers
-        sellers_mask_columns = ['seller_id', 'seller_zip_code_prefix',
-                                'seller_city', 'seller_state',
-                                'geolocation_lat', 'geolocation_lng']
-
-        sellers_geo = sellers.merge(
-            geo,
-            how='left',
-            left_on='seller_zip_code_prefix',
-            right_on='geolocation_zip_code_prefix')[sellers_mask_columns]
-
-        # Merge geo_location for customers
-        customers_mask_columns = ['customer_id', 'customer_zip_code_prefix',
-                                  'customer_city', 'customer_state',
-                                  'geolocation_lat', 'geolocation_lng']
-
-        customers_geo = customers.merge(
-            geo,
-            how='left',
-            left_on='customer_zip_code_prefix',
-            right_on='geolocation_zip_code_prefix')[customers_mask_columns]
-
-        # Use the matching table and merge customers and sellers
-        matching_geo = matching_table.merge(sellers_geo,
-                                            on='seller_id')\
-                                     .merge(customers_geo,
-                                            on='customer_id',
-                                            suffixes=('_seller',
-                                                      '_customer'))
-        # Remove na()
-        matching_geo = matching_geo.dropna()
-
-        matching_geo.loc[:, 'distance_seller_customer'] =\
-            matching_geo.apply(
-                lambda row: haversine_distance(
-                    row['geolocation_lng_seller'],
-                    row['geolocation_lat_seller'],
-                    row['geolocation_lng_customer'],
-                    row['geolocation_lat_customer']), axis=1)
-        # Since an order can have multiple sellers,
-        # return the average of the distance per order
-        order_distance =\
-            matching_geo.groupby(
-                'order_id',
-                as_index=False).agg({'distance_seller_customer': 'mean'})
-
-        return order_distance
-
+        sellers_geo = data['sellers'][['seller_id', 'seller_zip_code_prefix',
+                                       'seller_city', 'seller_state']]
+        customers_geo = data['customers'][['customer_id',
+                                           'customer_zip_code_prefix',
+                                           'customer_city', 'customer_state']]
+
+        # Geocode sellers and customers from their zip code prefix
+        sellers_geo['geolocation_lat'], sellers_geo['geolocation_lng'] = \
+            geo.lookup_zip(sellers_geo['seller_zip_code_prefix'])
+        customers_geo['geolocation_lat'], customers_geo['geolocation_lng'] = \
+            geo.lookup_zip(customers_geo['customer_zip_code_prefix'])
+
+        # Coordinates by graph code, with a trailing NaN row for the
+        # missing (-1) codes; sellers and customers with missing
+        # information are left out
+        sellers_geo = sellers_geo.dropna().set_index('seller_id')\
+            .reindex(graph.seller_ids)
+        customers_geo = customers_geo.dropna().set_index('customer_id')\
+            .reindex(graph.customer_ids)
+        columns = ['geolocation_lng', 'geolocation_lat']
+        seller_lng, seller_lat = np.vstack(
+            [sellers_geo[columns].to_numpy(np.float64),
+             np.full((1, 2), np.nan)]).T
+        customer_lng, customer_lat = np.vstack(
+            [customers_geo[columns].to_numpy(np.float64),
+             np.full((1, 2), np.nan)]).T
+
+        # Distance between the seller of every item and the customer of
+        # its order
+        item_customer = graph.order_customer[graph.order_items.segments()]
+        item_seller = graph.item_seller[graph.order_items.indices]
+        distance = np.full(len(graph.item_seller), np.nan)
+        distance[graph.order_items.indices] = haversine_distance(
+            seller_lng[item_seller], seller_lat[item_seller],
+            customer_lng[item_customer], customer_lat[item_customer])
+
+        # Since an order can have multiple sellers, return the average of
+        # the distance per order, over the orders with a review as the
+        # matching table rows without one were dropped
+        order_distance = graph.order_items.reduce(distance, 'mean')
+        keep = ~np.isnan(order_distance) & (graph.order_reviews.degree() > 0)
+        return pd.DataFrame({
+            'order_id': graph.order_ids[keep],
+            'distance_seller_customer': order_distance[keep],
+        })
+
+    @profiling.profiled
     def get_training_data(self, is_delivered=True,
-                          with_distance_seller_customer=False):
+                          with_distance_seller_customer=False, columns=None,
+                          n_jobs=None, backend='threads'):
         """
         02-01 > Returns a clean DataFrame (without NaN), with the following
         columns: [order_id, wait_time, expected_wait_time, delay_vs_expected,
         dim_is_five_star, dim_is_one_star, review_score, number_of_products,
         number_of_sellers, price, freight_value, distance_customer_seller]
+        Pass `columns` to only compute the features providing these columns,
+        and `n_jobs` to compute independent features concurrently in a pool
+        of threads or of processes (`backend`).
         """
         # Hint: make sure to re-use your instance methods defined above
-        training_set =\
-            self.get_wait_time(is_delivered)\
-                .merge(
-                self.get_review_score(), on='order_id'
-               ).merge(
-                self.get_number_products(), on='order_id'
-               ).merge(
-                self.get_number_sellers(), on='order_id'
-               ).merge(
-                self.get_price_and_freight(), on='order_id'
-               )
+        nodes = ['get_wait_time', 'get_review_score', 'get_number_products',
+                 'get_number_sellers', 'get_price_and_freight']
         # Skip heavy computation of distance_seller_customer unless specified
-        if with_distance_seller_customer:
-            training_set = training_set.merge(
-                self.get_distance_seller_customer(), on='order_id')
+        if with_distance_seller_customer \
+                or 'distance_seller_customer' in (columns or []):
+            nodes.append('get_distance_seller_customer')
+
+        training_set = self.features.build(
+            self, nodes, columns,
+            params={'get_wait_time': {'is_delivered': is_delivered}},
+            n_jobs=n_jobs, backend=backend, dropna=True)
+
+        return training_set
 
-        return training_set.dropna()
+    def iter_training_data(self, chunk_size=100_000, tmp_dir=None, **kwargs):
+        """
+        Yields the rows of get_training_data(**kwargs) chunk by chunk, for
+        datasets too large to be held in memory: orders, order_items and
+        order_reviews are partitioned on disk (in `tmp_dir`) by order_id
+        into buckets of about `chunk_size` orders, and the features of
+        each bucket are computed separately. Rows come in bucket order.
+        """
+        with tempfile.TemporaryDirectory(dir=tmp_dir) as directory:
+            for tables in partition_by_order(self.olist, chunk_size,
+                                             directory):
+                bucket = Order(PartitionOlist(tables, self.olist))
+                yield bucket.get_training_data(**kwargs)
+
+    @profiling.profiled
+    def write_training_data(self, path, chunk_size=100_000, tmp_dir=None,
+                            **kwargs):
+        """
+        Writes get_training_data(**kwargs) to the csv file `path` chunk by
+        chunk (see iter_training_data), and returns the number of rows
+        """
+        n_rows = 0
+        for i, chunk in enumerate(self.iter_training_data(
+                chunk_size, tmp_dir, **kwargs)):
+            chunk.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0,
+                         index=False)
+            n_rows += len(chunk)
+        return n_rows
@@ -1,18 +1,54 @@
+from memoized_property import memoized_property
+from olist import profiling
+from olist.cube import MetricCube
 from olist.data import Olist
+from olist.features import FeatureGraph
+from olist.graph import OrderGraph
 from olist.order import Order
-from olist.seller import Seller
 import numpy as np
 
 
 class Product:
 
-    def __init__(self):
+    # Feature methods, as nodes of the graph building the training set
+    features = FeatureGraph(
+        'product_id',
+        tables=['products', 'product_category_name_translation', 'orders',
+                'order_items', 'order_reviews'])
+
+    def __init__(self, olist=None):
         # Import data only once
-        olist = Olist()
-        self.data = olist.get_data()
-        self.matching_table = olist.get_matching_table()
-        self.order = Order()
+        self.olist = olist or Olist()
+
+    @memoized_property
+    def data(self):
+        return self.olist.get_data()
+
+    @memoized_property
+    def matching_table(self):
+        return self.olist.get_matching_table()
+
+    @memoized_property
+    def order(self):
+        return Order(self.olist)
+
+    def invalidate(self, *names):
+        """
+        Forget the feature frames memoized by this instance for the
+        methods `names` and the methods using them (all of them, along
+        with the datasets, when no name is given), e.g. after Olist.reload()
+        """
+        self.features.invalidate(self, *names)
+        if not names:
+            for attr in ['_data', '_matching_table', '_order']:
+                self.__dict__.pop(attr, None)
 
+    @features.node(columns=['category', 'product_name_length',
+                            'product_description_length',
+                            'product_photos_qty', 'product_weight_g',
+                            'product_length_cm', 'product_height_cm',
+                            'product_width_cm'],
+                   rows=True)
     def get_product_features(self):
         """
         Returns a DataFrame with:
@@ -34,45 +70,57 @@ class Product:
 
         return df
 
+    @features.node(columns=['price'], rows=True)
     def get_price(self):
         """
         Return a DataFrame with:
         'product_id', 'price'
         """
-        order_items = self.data['order_items']
+        order_items = self.data.load('order_items', ['product_id', 'price'])
         # There are many different order_items per product_id, each with different prices. Take the mean of various prices
-        return order_items[['product_id', 'price']].groupby('product_id').mean()
+        return order_items.groupby('product_id').mean().reset_index()
 
+    @features.node(columns=['wait_time'], rows=True)
     def get_wait_time(self):
         """
         Returns a DataFrame with:
         'product_id', 'wait_time'
         """
-        matching_table = self.matching_table
-        orders_wait_time = self.order.get_wait_time()
+        graph = OrderGraph.get(self.olist)
+        wait_time = self.order.get_wait_time()\
+            .set_index('order_id')['wait_time']
 
-        df = matching_table.merge(orders_wait_time,
-                                 on='order_id')
+        # Weigh each order by its items of the product times its reviews,
+        # as the rows of the matching table did
+        n_reviews = np.maximum(graph.order_reviews.degree(), 1)
+        return graph.aggregate('product', wait_time, 'mean', per_item=True,
+                               order_weights=n_reviews).reset_index()
 
-        return df.groupby('product_id',
-                          as_index=False).agg({'wait_time': 'mean'})
-
-    def get_review_score(self):
+    @features.node(output=False)
+    def get_product_order_reviews(self):
         """
         Returns a DataFrame with:
-        'product_id', 'share_of_five_stars', 'share_of_one_stars',
+        'order_id', 'product_id', 'dim_is_five_star', 'dim_is_one_star',
         'review_score'
+        for each (product <> order) pair, shared by get_review_score and
+        get_costs
         """
-        matching_table = self.matching_table
         orders_reviews = self.order.get_review_score()
 
-        # Since the same products can appear multiple times in the same
-        # order, create a product <> order matching table
+        # The same product can appear multiple times in the same order: the
+        # graph relates each product to each of its orders once
+        return OrderGraph.get(self.olist).expand('product', orders_reviews)
 
-        matching_table = matching_table[['order_id',
-                                         'product_id']].drop_duplicates()
-        df = matching_table.merge(orders_reviews,
-                                  on='order_id')
+    @features.node(columns=['share_of_one_stars', 'share_of_five_stars',
+                            'review_score'],
+                   requires=['get_product_order_reviews'], rows=True)
+    def get_review_score(self):
+        """
+        Returns a DataFrame with:
+        'product_id', 'share_of_five_stars', 'share_of_one_stars',
+        'review_score'
+        """
+        df = self.get_product_order_reviews()
         df = df.groupby('product_id',
                         as_index=False).agg({'dim_is_one_star': 'mean',
                                              'dim_is_five_star': 'mean',
@@ -83,6 +131,7 @@ class Product:
 
         return df
 
+    @features.node(columns=['revenues'], requires=['get_sales'])
     def get_revenues(self):
         """
         Returns a DataFrame with:
@@ -91,7 +140,7 @@ class Product:
             Olist takes a 10% cut on the product price (excl. freight) of each order delivered.
         """
         # get 10% cut
-        revenues = Product().get_sales().copy()
+        revenues = self.get_sales().copy()
         revenues.loc[:, 'sales'] = revenues['sales'].map(lambda x: x/10)
         revenues.rename(columns={'sales': 'revenues'}, inplace=True)
         # get subscription
@@ -101,23 +150,16 @@ class Product:
         #revenues['revenues'] = revenues['sales'] + revenues['subscription']
         return revenues[['product_id', 'revenues']]
 
+    @features.node(columns=['costs'],
+                   requires=['get_product_order_reviews'])
     def get_costs(self):
         """
         Returns a DataFrame with:
         'product_id', 'share_of_five_stars', 'share_of_one_stars',
         'review_score'
         """
-        matching_table = self.matching_table
-        orders_reviews = self.order.get_review_score()
-
-        # Since the same products can appear multiple times in the same
-        # order, create a product <> order matching table
+        df = self.get_product_order_reviews()
 
-        matching_table = matching_table[['order_id',
-                                         'product_id']].drop_duplicates()
-        df = matching_table.merge(orders_reviews,
-                                  on='order_id')
-        
         # Get cost from bad reviews
         def review_costs(review):
             if review <= 2:
@@ -128,7 +170,7 @@ class Product:
         
         df['costs'] = df['review_score'].map(review_costs)
         df = df.groupby(
-            'product_id', as_index=False).sum()
+            'product_id', as_index=False).agg({'costs': 'sum'})
         return df[['product_id', 'costs']]
         # Get cost from IT
         #total_cost = 500_000
@@ -142,22 +184,27 @@ class Product:
         #df['costs'] = df['IT_costs'] + df['review_costs']
         #return df[['product_id', 'costs']]
 
+    @features.node(columns=['profits'],
+                   requires=['get_costs', 'get_revenues'])
     def get_profits(self):
         """Returns a DataFrame with:
         'product_id', 'profits'
         profits = revenues - costs
         """
-        costs = Product().get_costs()
-        revenues = Product().get_revenues()
-        revenues['profits'] = revenues['revenues'] - costs['costs']
+        costs = self.get_costs()
+        revenues = self.get_revenues()
+        # Align on product_id rather than on row position
+        revenues = revenues.merge(costs, on='product_id')
+        revenues['profits'] = revenues['revenues'] - revenues['costs']
         return revenues[['product_id', 'profits']]
 
+    @features.node(columns=['n_orders', 'quantity'])
     def get_quantity(self):
         """
         Returns a DataFrame with:
         'product_id', 'n_orders', 'quantity'
         """
-        order_items = self.data['order_items']
+        order_items = self.data.load('order_items', ['product_id', 'order_id'])
 
         n_orders =\
             order_items.groupby('product_id')['order_id'].nunique().reset_index()
@@ -170,36 +217,41 @@ class Product:
 
         return n_orders.merge(quantity, on='product_id')
 
+    @features.node(columns=['sales'])
     def get_sales(self):
         """
         Returns a DataFrame with:
         'product_id', 'sales'
         """
-        return self.data['order_items'][['product_id', 'price']]\
+        return self.data.load('order_items', ['product_id', 'price'])\
             .groupby('product_id', as_index=False)\
             .sum()\
             .rename(columns={'price': 'sales'})
 
-    def get_training_data(self):
-
-        training_set =\
-            self.get_product_features()\
-                .merge(
-                self.get_wait_time(), on='product_id'
-               ).merge(
-                self.get_price(), on='product_id'
-               ).merge(
-                self.get_review_score(), on='product_id'
-               ).merge(
-                self.get_costs(), on='product_id'
-               ).merge(
-                self.get_revenues(), on='product_id'
-               ).merge(
-                self.get_profits(), on='product_id'
-               ).merge(
-                self.get_quantity(), on='product_id'
-               ).merge(
-                self.get_sales(), on='product_id'
-               )
+    def get_window_features(self, start=None, end=None):
+        """
+        Returns a DataFrame with 'product_id' and the statistics of the
+        orders of each product from the month of `start` to the month of
+        `end` (see MetricCube.window), e.g. get_window_features('2018-06')
+        """
+        return MetricCube.get(self.olist, 'product').window(start, end)\
+            .reset_index()
+
+    @profiling.profiled
+    def get_training_data(self, columns=None, n_jobs=None,
+                          backend='threads'):
+        """
+        Returns a DataFrame with the features of every product, merged from
+        the feature methods above.
+        Pass `columns` to only compute the features providing these columns,
+        and `n_jobs` to compute independent features concurrently in a pool
+        of threads or of processes (`backend`).
+        """
+
+        training_set = self.features.build(
+            self, ['get_product_features', 'get_wait_time', 'get_price',
+                   'get_review_score', 'get_costs', 'get_revenues',
+                   'get_profits', 'get_quantity', 'get_sales'],
+            columns, n_jobs=n_jobs, backend=backend)
 
         return training_set
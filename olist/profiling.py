@@ -0,0 +1,308 @@
+"""
+Profiling of the olist pipeline.
+
+Feature methods, get_training_data, merges, dataset loads and derived
+tables record a span with their wall time, CPU time, peak memory delta,
+input and output rows and number of csv files parsed, nested as they call
+each other. Profiling is off by default, in which case each hook costs a
+single global check. Switch it on with a context manager:
+
+    with profile() as prof:
+        Seller().get_training_data()
+    print(prof)                 # call tree as text
+    prof.to_json('profile.json')
+
+or for a whole process with the OLIST_PROFILE environment variable: the
+report is printed to stderr at exit, and also written as JSON when the
+variable is a path ending in '.json'.
+
+Feature methods computed by worker processes (build with
+backend='processes') are not recorded, and CPU times are those of the
+whole process, so they include the other threads of a concurrent build.
+"""
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+# Profile being recorded, if any
+_profile = None
+
+
+class Span:
+    """
+    One call of a profiled function, and the calls it made
+    """
+
+    __slots__ = ("name", "wall", "cpu", "peak", "rows_in", "rows_out",
+                 "csv_loads", "children", "_start", "_memory", "_child_peak")
+
+    def __init__(self, name):
+        self.name = name
+        self.wall = self.cpu = 0.0
+        self.peak = 0
+        self.rows_in = 0
+        self.rows_out = None
+        self.csv_loads = 0
+        self.children = []
+
+    @property
+    def total_csv_loads(self):
+        return self.csv_loads + sum(c.total_csv_loads for c in self.children)
+
+    def to_dict(self):
+        return {"name": self.name,
+                "wall_s": self.wall,
+                "cpu_s": self.cpu,
+                "peak_mb": self.peak / 2**20,
+                "rows_in": self.rows_in,
+                "rows_out": self.rows_out,
+                "csv_loads": self.total_csv_loads,
+                "children": [c.to_dict() for c in self.children]}
+
+
+class Profile:
+    """
+    Call trees of the spans recorded while the profile is active, one
+    stack per thread
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.roots = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._started_tracing = False
+
+    def start(self):
+        global _profile
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        _profile = self
+        return self
+
+    def stop(self):
+        global _profile
+        _profile = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def enter(self, name):
+        span = Span(name)
+        stack = self._stack()
+        if stack:
+            stack[-1].children.append(span)
+        else:
+            with self._lock:
+                self.roots.append(span)
+        if self.trace_memory and tracemalloc.is_tracing():
+            # The peak is global: fold the peak seen so far into the
+            # parent before resetting it for this span
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1]._child_peak = max(stack[-1]._child_peak, peak)
+            tracemalloc.reset_peak()
+            span._memory = current
+        else:
+            span._memory = None
+        span._child_peak = 0
+        stack.append(span)
+        span._start = (time.perf_counter(), time.process_time())
+        return span
+
+    def exit(self, span):
+        wall, cpu = span._start
+        span.wall = time.perf_counter() - wall
+        span.cpu = time.process_time() - cpu
+        stack = self._stack()
+        stack.pop()
+        if span._memory is not None and tracemalloc.is_tracing():
+            _, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, span._child_peak)
+            span.peak = max(peak - span._memory, 0)
+            if stack:
+                stack[-1]._child_peak = max(stack[-1]._child_peak, peak)
+
+    def current(self):
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def to_dict(self):
+        return {"spans": [s.to_dict() for s in self.roots]}
+
+    def to_json(self, path=None):
+        """
+        Returns the call trees as a JSON string, also written to `path`
+        """
+        text = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+    def to_text(self):
+        """
+        Returns the call trees as an indented text table
+        """
+        lines = [f"{'call':<60}{'wall ms':>10}{'cpu ms':>10}{'peak MB':>10}"
+                 f"{'rows in':>10}{'rows out':>10}{'csv':>5}"]
+
+        def visit(span, depth):
+            rows_out = "" if span.rows_out is None else span.rows_out
+            lines.append(f"{'  ' * depth + span.name:<60}"
+                         f"{span.wall * 1000:>10.1f}{span.cpu * 1000:>10.1f}"
+                         f"{span.peak / 2**20:>10.1f}{span.rows_in:>10}"
+                         f"{rows_out:>10}{span.total_csv_loads:>5}")
+            for child in span.children:
+                visit(child, depth + 1)
+
+        for span in self.roots:
+            visit(span, 0)
+        return "\n".join(lines)
+
+    __str__ = to_text
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def profile(trace_memory=True):
+    """
+    Context manager recording the spans of the calls made in its block.
+    `trace_memory=False` skips tracemalloc, which slows allocations down.
+    """
+    return Profile(trace_memory)
+
+
+class span:
+    """
+    Context manager recording a span named `name` when profiling is on
+    """
+
+    __slots__ = ("name", "span", "profile")
+
+    def __init__(self, name):
+        self.name = name
+        self.span = None
+
+    def __enter__(self):
+        self.profile = _profile
+        if self.profile is not None:
+            self.span = self.profile.enter(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        if self.span is not None:
+            self.profile.exit(self.span)
+
+    def rows(self, rows_in=0, rows_out=None):
+        """
+        Record the input and output rows of the span
+        """
+        if self.span is not None:
+            self.span.rows_in += rows_in
+            if rows_out is not None:
+                self.span.rows_out = rows_out
+
+
+class inherit:
+    """
+    Context manager nesting the spans recorded by this thread under
+    `parent` (a span of another thread, see current), for the tasks
+    of a thread pool
+    """
+
+    __slots__ = ("parent", "profile")
+
+    def __init__(self, parent):
+        self.parent = parent
+
+    def __enter__(self):
+        self.profile = _profile
+        if self.profile is not None and self.parent is not None:
+            self.profile._stack().append(self.parent)
+        return self
+
+    def __exit__(self, *exc):
+        if self.profile is not None and self.parent is not None:
+            self.profile._stack().pop()
+
+
+def current():
+    """
+    Returns the span being recorded by this thread, None when profiling
+    is off
+    """
+    return None if _profile is None else _profile.current()
+
+
+def profiled(name=None):
+    """
+    Decorator recording a span (named `name`, or after the function) for
+    each call of the decorated function, with the length of its result
+    as output rows. Also usable bare, as @profiled.
+    """
+    if callable(name):
+        return profiled()(name)
+
+    def decorate(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _profile is None:
+                return func(*args, **kwargs)
+            with span(label) as s:
+                result = func(*args, **kwargs)
+                s.rows(rows_out=len(result) if hasattr(result, "__len__")
+                       else None)
+            return result
+        return wrapper
+    return decorate
+
+
+def count(rows_in=0, csv_loads=0):
+    """
+    Add `rows_in` input rows and `csv_loads` csv files parsed to the
+    current span, if any
+    """
+    if _profile is None:
+        return
+    current = _profile.current()
+    if current is not None:
+        current.rows_in += rows_in
+        current.csv_loads += csv_loads
+
+
+def _profile_process(target):
+    prof = Profile().start()
+
+    def report():
+        prof.stop()
+        if target.endswith(".json"):
+            prof.to_json(target)
+        print(prof.to_text(), file=sys.stderr)
+    atexit.register(report)
+
+
+# Worker processes inherit the environment: only the process that
+# switched profiling on reports
+if os.environ.get("OLIST_PROFILE") \
+        and os.environ.setdefault("OLIST_PROFILE_PID",
+                                  str(os.getpid())) == str(os.getpid()):
+    _profile_process(os.environ["OLIST_PROFILE"])
@@ -1,18 +1,54 @@
-import pandas as pd
+import itertools
 import numpy as np
+import pandas as pd
+from memoized_property import memoized_property
+from olist import profiling
+from olist.cube import MetricCube
 from olist.data import Olist
+from olist.features import FeatureGraph
+from olist.geo import GeoIndex
+from olist.graph import OrderGraph
 from olist.order import Order
 
 
 class Seller:
 
-    def __init__(self):
+    # Feature methods, as nodes of the graph building the training set
+    features = FeatureGraph(
+        'seller_id',
+        tables=['sellers', 'orders', 'order_items', 'order_reviews',
+                'geolocation'])
+
+    def __init__(self, olist=None):
         # Import data only once
-        olist = Olist()
-        self.data = olist.get_data()
-        self.matching_table = olist.get_matching_table()
-        self.order = Order()
+        self.olist = olist or Olist()
+
+    @memoized_property
+    def data(self):
+        return self.olist.get_data()
+
+    @memoized_property
+    def matching_table(self):
+        return self.olist.get_matching_table()
 
+    @memoized_property
+    def order(self):
+        return Order(self.olist)
+
+    def invalidate(self, *names):
+        """
+        Forget the feature frames memoized by this instance for the
+        methods `names` and the methods using them (all of them, along
+        with the datasets, when no name is given), e.g. after Olist.reload()
+        """
+        self.features.invalidate(self, *names)
+        if not names:
+            for attr in ['_data', '_matching_table', '_order']:
+                self.__dict__.pop(attr, None)
+
+    @features.node(columns=['seller_city', 'seller_state',
+                            'geolocation_lat', 'geolocation_lng'],
+                   rows=True)
     def get_seller_features(self):
         """
         Returns a DataFrame with:
@@ -21,109 +57,83 @@ class Seller:
         # Make a copy before using inplace=True so as to avoid modifying
         # self.data
         sellers = self.data['sellers'].copy()
-        geo = self.data['geolocation']
         # Since one city can map to multiple (lat, lng), take first one
-        geo = geo.groupby('geolocation_city',
-                          as_index=False).first()
+        geo = GeoIndex.get(self.olist, mode='first')
         # There are multiple rows per seller
         sellers.drop_duplicates(inplace=True)
-        sellers = sellers.merge(
-            geo,
-            how='left',
-            left_on='seller_city',
-            right_on='geolocation_city')
+        sellers['geolocation_lat'], sellers['geolocation_lng'] = \
+            geo.lookup_city(sellers['seller_city'])
         return sellers[['seller_id', 'seller_city', 'seller_state', 'geolocation_lat', 'geolocation_lng']]
 
+    @features.node(columns=['delay_to_carrier', 'wait_time'], rows=True)
     def get_seller_delay_wait_time(self):
         """
         Returns a DataFrame with:
         'seller_id', 'delay_to_carrier', 'wait_time'
         """
-        # Get data
-        order_items = self.data['order_items'].copy()
-        orders = self.data['orders'].query("order_status=='delivered'").copy()
-
-        ship = order_items.merge(orders, on='order_id')
-
-        # Handle datetime
-        ship.loc[:, 'shipping_limit_date'] = pd.to_datetime(
-            ship['shipping_limit_date'])
-        ship.loc[:, 'order_delivered_carrier_date'] = pd.to_datetime(
-            ship['order_delivered_carrier_date'])
-        ship.loc[:, 'order_delivered_customer_date'] = pd.to_datetime(
-            ship['order_delivered_customer_date'])
-        ship.loc[:, 'order_purchase_timestamp'] = pd.to_datetime(
-            ship['order_purchase_timestamp'])
-
-        # Compute delay and wait_time
-        def handle_early_dropoff(x):
-            if x < 0:
-                return abs(x)
-            return 0
+        # Get data: delays and wait times (in days) of every order item are
+        # computed once per dataset by Olist
+        ship = self.olist.get_item_durations()\
+            .query("order_status=='delivered'")[
+                ['seller_id', 'delay_to_carrier', 'wait_time']]
 
-        def delay_to_logistic_partner(df):
-            df['delay'] = (df.shipping_limit_date -
-                      df.order_delivered_carrier_date) / np.timedelta64(24, 'h')
-            df.loc[:,'delay'] = df.delay.apply(handle_early_dropoff)
-            return np.mean(df.delay)
+        # Only late handovers to the carrier count as a delay
+        # (early drop-offs and unknown dates count as no delay)
+        delay = ship['delay_to_carrier']
+        ship['delay_to_carrier'] = np.where(delay < 0, -delay, 0)
 
-        def order_wait_time(df):
-            days = np.mean(
-                (df.order_delivered_customer_date - df.order_purchase_timestamp)
-                / np.timedelta64(24, 'h'))
-            return days
-
-        delay = ship.groupby('seller_id')\
-                    .apply(delay_to_logistic_partner)\
-                    .reset_index()
-        delay.columns = ['seller_id', 'delay_to_carrier']
-
-        wait = ship.groupby('seller_id')\
-                   .apply(order_wait_time)\
-                   .reset_index()
-        wait.columns = ['seller_id', 'wait_time']
-
-        order_wait_time_df = delay.merge(wait, on='seller_id')
+        # Average delay and wait_time per seller in a single groupby pass
+        order_wait_time_df = ship.groupby('seller_id', as_index=False)\
+            .agg({'delay_to_carrier': 'mean', 'wait_time': 'mean'})
 
         return order_wait_time_df
 
+    @features.node(columns=['date_first_sale', 'date_last_sale',
+                            'active_months'])
     def get_active_dates(self):
         """
         Returns a DataFrame with: 'seller_id', 'date_first_sale',
         'date_last_sale', 'active_months'
         """
-        orders = self.data['orders'][['order_id', 'order_approved_at']].copy()
-
-        # create two new columns with a view to aggregate
-        orders.loc[:, 'date_first_sale'] = pd.to_datetime(
-            orders['order_approved_at'])
-        orders['date_last_sale'] = orders['date_first_sale']
-
-        orders = orders.merge(
-            self.matching_table[['seller_id', 'order_id']], on="order_id")\
-            .groupby('seller_id', as_index=False)\
-            .agg({
-                "date_first_sale": min,
-                "date_last_sale": max
-            })
+        approved_at = self.data.load('orders', ['order_id',
+                                                'order_approved_at'])\
+            .set_index('order_id')['order_approved_at']
+
+        # First and last approval among the orders of each seller
+        graph = OrderGraph.get(self.olist)
+        orders = pd.DataFrame({
+            'date_first_sale': graph.aggregate('seller', approved_at, 'min'),
+            'date_last_sale': graph.aggregate('seller', approved_at, 'max'),
+        }).reset_index()
         orders['active_months'] = np.floor(((orders['date_last_sale'] - orders['date_first_sale']) \
                                 / np.timedelta64(1, 'M')) + 1)
         return orders
 
-    def get_review_score(self):
+    @features.node(output=False)
+    def get_seller_order_reviews(self):
         """
         Returns a DataFrame with:
-        'seller_id', 'share_of_five_stars', 'share_of_one_stars', 'review_score'
+        'order_id', 'seller_id', 'dim_is_five_star', 'dim_is_one_star',
+        'review_score'
+        for each (seller <> order) pair, shared by get_review_score and
+        get_costs
         """
-        matching_table = self.matching_table
         orders_reviews = self.order.get_review_score()
 
-        # Since the same seller can appear multiple times in the same order,
-        # create a (seller <> order) matching table
+        # The same seller can appear multiple times in the same order: the
+        # graph relates each seller to each of its orders once
+        return OrderGraph.get(self.olist).expand('seller', orders_reviews)
 
-        matching_table = matching_table[['order_id', 'seller_id']]\
-            .drop_duplicates()
-        reviews_df = matching_table.merge(orders_reviews, on='order_id')
+    @features.node(columns=['share_of_one_stars', 'share_of_five_stars',
+                            'review_score'],
+                   requires=['get_seller_order_reviews'], rows=True)
+    def get_review_score(self):
+        """
+        Returns a DataFrame with:
+        'seller_id', 'share_of_five_stars', 'share_of_one_stars',
+        'review_score'
+        """
+        reviews_df = self.get_seller_order_reviews()
         reviews_df = reviews_df.groupby(
             'seller_id', as_index=False).agg({'dim_is_one_star': 'mean',
                                               'dim_is_five_star': 'mean',
@@ -134,12 +144,13 @@ class Seller:
 
         return reviews_df
 
+    @features.node(columns=['n_orders', 'quantity', 'quantity_per_order'])
     def get_quantity(self):
         """
         Returns a DataFrame with:
         'seller_id', 'n_orders', 'quantity', 'quantity_per_order'
         """
-        order_items = self.data['order_items']
+        order_items = self.data.load('order_items', ['seller_id', 'order_id'])
 
         n_orders = order_items.groupby('seller_id')['order_id']\
             .nunique().reset_index()
@@ -153,16 +164,19 @@ class Seller:
         result['quantity_per_order'] = result['quantity'] / result['n_orders']
         return result
 
+    @features.node(columns=['sales'], rows=True)
     def get_sales(self):
         """
         Returns a DataFrame with:
         'seller_id', 'sales'
         """
-        return self.data['order_items'][['seller_id', 'price']]\
+        return self.data.load('order_items', ['seller_id', 'price'])\
             .groupby('seller_id', as_index=False)\
             .sum()\
             .rename(columns={'price': 'sales'})
             
+    @features.node(columns=['revenues'],
+                   requires=['get_sales', 'get_active_dates'])
     def get_revenues(self):
         """
         Returns a DataFrame with:
@@ -172,16 +186,21 @@ class Seller:
             Olist charges 80 BRL by month per seller.
         """
         # get 10% cut
-        revenues = Seller().get_sales().copy()
+        revenues = self.get_sales().copy()
         revenues.loc[:, 'sales'] = revenues['sales'].map(lambda x: x/10)
         revenues.rename(columns={'sales': '10%_cut'})
         # get subscription
-        dates = Seller().get_active_dates().copy()
-        revenues['subscription'] = dates['active_months'] * 80
+        dates = self.get_active_dates().copy()
+        # Align on seller_id rather than on row position
+        revenues = revenues.merge(dates[['seller_id', 'active_months']],
+                                  on='seller_id')
+        revenues['subscription'] = revenues['active_months'] * 80
         # sum cut and subscription
         revenues['revenues'] = revenues['sales'] + revenues['subscription']
         return revenues[['seller_id', 'revenues']]
 
+    @features.node(columns=['costs'],
+                   requires=['get_seller_order_reviews', 'get_quantity'])
     def get_costs(self):
         """
         Returns a DataFrame with:
@@ -195,15 +214,8 @@ class Seller:
         4 stars	        0
         5 stars	        0
         """
-        matching_table = self.matching_table
-        orders_reviews = self.order.get_review_score()[['order_id', 'review_score']]
-
-        # Since the same seller can appear multiple times in the same order,
-        # create a (seller <> order) matching table
-
-        matching_table = matching_table[['order_id', 'seller_id']]\
-            .drop_duplicates()
-        costs_df = matching_table.merge(orders_reviews, on='order_id')
+        costs_df = self.get_seller_order_reviews()[['order_id', 'seller_id',
+                                                    'review_score']]
 
         # Get cost from bad review
         def review_costs(review):
@@ -215,11 +227,11 @@ class Seller:
         
         costs_df['review_costs'] = costs_df['review_score'].map(review_costs)
         costs_df = costs_df.groupby(
-            'seller_id', as_index=False).sum()
+            'seller_id', as_index=False).agg({'review_costs': 'sum'})
         
         # Get cost from IT
         total_cost = 500_000
-        quantity = Seller().get_quantity()[['seller_id', 'n_orders']].copy()
+        quantity = self.get_quantity()[['seller_id', 'n_orders']].copy()
         order_cost = total_cost / np.sum(np.sqrt(quantity['n_orders']))
         quantity['IT_costs'] = np.sqrt(quantity['n_orders']) * order_cost
         
@@ -228,43 +240,156 @@ class Seller:
         costs_df['costs'] = costs_df['IT_costs'] + costs_df['review_costs']
         return costs_df[['seller_id', 'costs']]
     
+    @features.node(columns=['profits'],
+                   requires=['get_costs', 'get_revenues'])
     def get_profits(self):
         """Returns a DataFrame with:
         'seller_id', 'profits'
         profits = revenues - costs
         """
-        costs = Seller().get_costs()
-        revenues = Seller().get_revenues()
-        revenues['profits'] = revenues['revenues'] - costs['costs']
+        costs = self.get_costs()
+        revenues = self.get_revenues()
+        # Align on seller_id rather than on row position
+        revenues = revenues.merge(costs, on='seller_id')
+        revenues['profits'] = revenues['revenues'] - revenues['costs']
         return revenues[['seller_id', 'profits']]
 
-    def get_training_data(self):
+    def get_window_features(self, start=None, end=None):
+        """
+        Returns a DataFrame with 'seller_id' and the statistics of the
+        orders of each seller from the month of `start` to the month of
+        `end` (see MetricCube.window), e.g. get_window_features('2018-06')
+        """
+        return MetricCube.get(self.olist, 'seller').window(start, end)\
+            .reset_index()
+
+    @profiling.profiled
+    def get_training_data(self, columns=None, n_jobs=None,
+                          backend='threads'):
         """
         Returns a DataFrame with:
         'seller_id', 'seller_state', 'seller_city', 'lat', lng' 'delay_to_carrier',
         'wait_time', 'share_of_five_stars', 'share_of_one_stars',
         'review_score', 'review_cost' 'n_orders', 'quantity,' 'date_first_sale',
         'date_last_sale', 'sales'
+        Pass `columns` to only compute the features providing these columns,
+        and `n_jobs` to compute independent features concurrently in a pool
+        of threads or of processes (`backend`).
         """
 
-        training_set =\
-            self.get_seller_features()\
-                .merge(
-                self.get_seller_delay_wait_time(), on='seller_id'
-               ).merge(
-                self.get_active_dates(), on='seller_id'
-               ).merge(
-                self.get_review_score(), on='seller_id'
-               ).merge(
-                self.get_costs(), on='seller_id'
-               ).merge(
-                self.get_revenues(), on='seller_id'
-               ).merge(
-                self.get_profits(), on='seller_id'
-               ).merge(
-                self.get_quantity(), on='seller_id'
-               ).merge(
-                self.get_sales(), on='seller_id'
-               )
+        training_set = self.features.build(
+            self, ['get_seller_features', 'get_seller_delay_wait_time',
+                   'get_active_dates', 'get_review_score', 'get_costs',
+                   'get_revenues', 'get_profits', 'get_quantity',
+                   'get_sales'],
+            columns, n_jobs=n_jobs, backend=backend)
 
         return training_set
+
+    @staticmethod
+    def _worst_first(values):
+        # Sellers without a value rank worst, as at the tail of a
+        # descending sort_values
+        return np.where(np.isnan(values), -np.inf, values)
+
+    def get_removal_gains(self, sellers=None):
+        """
+        Returns a DataFrame with, for n from 0 to the number of sellers - 1:
+        'n_sellers_removed' (n), 'profits' (total profits without the n
+        sellers of lowest profits) and 'benefits_of_removing' (gain in %
+        of the total profits).
+        `sellers` is a DataFrame with 'seller_id' and 'profits' (the
+        get_profits ones when None), e.g. a training set.
+        """
+        sellers = self.get_profits() if sellers is None else sellers
+        profits = sellers['profits'].to_numpy(np.float64)
+        # One sort and one cumulative sum give the profits removed for
+        # every n at once
+        ranked = np.sort(self._worst_first(profits))
+        removed = np.concatenate(
+            [[0.], np.cumsum(np.where(np.isinf(ranked), 0., ranked))])
+        total = np.nansum(profits)
+        n = len(profits)
+        return pd.DataFrame({
+            'n_sellers_removed': np.arange(n),
+            'profits': total - removed[:n],
+            'benefits_of_removing': -removed[:n] / total * 100,
+        })
+
+    def get_profiles(self, bounds=(180, 500, 1300),
+                     labels=('Worst', 'Bad', 'Neutral', 'Good'),
+                     by='profits', quantiles=False, sellers=None):
+        """
+        Returns a DataFrame with 'seller_id', `by` and 'profile': the
+        `bounds[0]` sellers of lowest `by` are labelled labels[0], the
+        next ones up to `bounds[1]` labels[1], etc, and the others
+        labels[-1]. With `quantiles`, bounds are shares of the sellers.
+        Only the bounds are placed by a partial sort, not the whole ranking.
+        `sellers` is a DataFrame with 'seller_id' and `by` (the
+        get_profits one when None).
+        """
+        if len(labels) != len(bounds) + 1:
+            raise ValueError("labels must have one more item than bounds")
+        sellers = self.get_profits() if sellers is None else sellers
+        values = self._worst_first(sellers[by].to_numpy(np.float64))
+        n = len(values)
+
+        counts = np.asarray(bounds, dtype=np.float64)
+        if quantiles:
+            counts = np.rint(counts * n)
+        counts = np.clip(counts, 0, n).astype(np.int64)
+        if np.any(np.diff(counts) < 0):
+            raise ValueError("bounds must be increasing")
+
+        # After partitioning around the bounds, the sellers between two
+        # bounds are those of these ranks
+        kth = counts[(counts > 0) & (counts < n)]
+        ranking = np.argpartition(values, kth) if len(kth) else np.arange(n)
+        codes = np.empty(n, dtype=np.int64)
+        codes[ranking] = np.searchsorted(counts, np.arange(n), side='right')
+
+        return pd.DataFrame({
+            'seller_id': sellers['seller_id'].to_numpy(),
+            by: sellers[by].to_numpy(),
+            'profile': pd.Categorical.from_codes(codes, categories=labels,
+                                                 ordered=True),
+        })
+
+    def simulate_removal(self, seller_sets, sellers=None):
+        """
+        Returns a DataFrame with, for each set of seller ids of
+        `seller_sets` (a dict name: ids, or a list of ids):
+        'n_sellers_removed', 'profits' (total profits without these
+        sellers) and 'benefits_of_removing' (gain in % of the total
+        profits), computed for all the sets at once.
+        `sellers` is a DataFrame with 'seller_id' and 'profits' (the
+        get_profits ones when None).
+        """
+        sellers = self.get_profits() if sellers is None else sellers
+        if not isinstance(seller_sets, dict):
+            seller_sets = dict(enumerate(seller_sets))
+        seller_sets = {name: list(ids) for name, ids in seller_sets.items()}
+        profits = sellers['profits'].to_numpy(np.float64)
+        n = len(profits)
+
+        flat = pd.Index(list(itertools.chain.from_iterable(
+            seller_sets.values())))
+        positions = pd.Index(sellers['seller_id']).get_indexer(flat)
+        if np.any(positions < 0):
+            raise KeyError(f"Unknown sellers: {list(flat[positions < 0][:5])}")
+        set_codes = np.repeat(np.arange(len(seller_sets)),
+                              [len(ids) for ids in seller_sets.values()])
+        # Count a seller listed twice in a set once
+        pairs = np.unique(set_codes * n + positions)
+        set_codes, positions = pairs // n, pairs % n
+
+        removed = np.bincount(set_codes,
+                              weights=np.nan_to_num(profits[positions]),
+                              minlength=len(seller_sets))
+        total = np.nansum(profits)
+        return pd.DataFrame({
+            'n_sellers_removed': np.bincount(set_codes,
+                                             minlength=len(seller_sets)),
+            'profits': total - removed,
+            'benefits_of_removing': -removed / total * 100,
+        }, index=pd.Index(list(seller_sets), name='set'))
@@ -0,0 +1,434 @@
+"""
+HTTP server of the seller and product features.
+
+Serves FeatureStore lookups over HTTP/1.1 with asyncio streams, without
+any dependency beyond the standard library:
+
+    python -m olist.server --port 8080
+    python -m olist.server --features seller=data/snapshots/sellers
+
+    GET  /seller/<seller_id>     features of a seller as a JSON object
+    GET  /product/<product_id>   (404 when unknown)
+    POST /seller                 {"ids": [...]} -> {"features": [...]}, with
+                                 null for the unknown ids
+    POST /reload                 recompute the features in the background
+    GET  /metrics                latency histograms, batches and snapshots
+    GET  /health
+
+The features are computed once at start up from the csv files (through
+the on-disk cache with OLIST_CACHE), or read from precomputed training
+sets with --features. Lookups arriving in the same turn of the event loop
+(or within --batch-window ms) are coalesced into one vectorized lookup per
+kind. Reloads build the new snapshots in a thread and swap them in at
+once, while the current ones keep being served; a failed reload keeps
+them.
+"""
+import argparse
+import asyncio
+import bisect
+import datetime
+import json
+import os
+import sys
+import time
+import traceback
+from urllib.parse import unquote, urlsplit
+import numpy as np
+import pandas as pd
+from olist.data import Olist
+from olist.product import Product
+from olist.seller import Seller
+from olist.snapshot import read_snapshot
+from olist.store import FeatureStore
+
+# Builder and id column of the training set of every kind of features.
+# Orders are not served: their training set has a row per review, so an
+# order_id may have several rows
+BUILDERS = {"seller": Seller, "product": Product}
+KEYS = {"seller": "seller_id", "product": "product_id"}
+
+# Largest request body accepted, in bytes
+MAX_BODY = 1 << 20
+
+REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large",
+           500: "Internal Server Error"}
+
+
+def csv_loader(kind, csv_dir=None):
+    """
+    Returns a function computing the training set of `kind` from the csv
+    files of `csv_dir`, with the original ids
+    """
+    def load():
+        olist = Olist(csv_dir=csv_dir)
+        training_set = BUILDERS[kind](olist).get_training_data()
+        return olist.decode_ids(training_set) if olist.encode_ids \
+            else training_set
+    return load
+
+
+def file_loader(path):
+    """
+    Returns a function reading the precomputed training set of `path`: a
+    snapshot directory (see olist.snapshot), or a parquet, feather, pickle
+    or csv file, after its extension
+    """
+    readers = {".parquet": pd.read_parquet, ".feather": pd.read_feather,
+               ".pkl": pd.read_pickle, ".pickle": pd.read_pickle}
+
+    def load():
+        if os.path.isdir(path):
+            return read_snapshot(path)
+        for extension, read in readers.items():
+            if path.endswith(extension):
+                return read(path)
+        return pd.read_csv(path)
+    return load
+
+
+class LatencyHistogram:
+    """
+    Counts of latencies in buckets of increasing upper bounds (ms)
+    """
+
+    BOUNDS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+              1000, 2500]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.BOUNDS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def quantile(self, q):
+        """
+        Returns the upper bound (ms) of the bucket of the `q` quantile
+        """
+        if not self.count:
+            return None
+        seen = 0
+        for bound, count in zip(self.BOUNDS + [self.max], self.counts):
+            seen += count
+            if seen >= q * self.count:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {"count": self.count,
+                "mean_ms": self.total / self.count if self.count else None,
+                "p50_ms": self.quantile(0.5),
+                "p90_ms": self.quantile(0.9),
+                "p99_ms": self.quantile(0.99),
+                "max_ms": self.max,
+                "buckets": {f"le_{bound}": count for bound, count
+                            in zip(self.BOUNDS + ["inf"], self.counts)}}
+
+
+class _Batcher:
+    """
+    Coalesces the lookups of one kind made within a batch window into a
+    single lookup of the current snapshot
+    """
+
+    def __init__(self, store, window=0.0):
+        self.store = store
+        self.window = window
+        self.pending = []
+        self.batches = 0
+        self.ids = 0
+        self.largest = 0
+
+    def lookup(self, ids):
+        """
+        Returns a future of the features of `ids`, as a list of dicts
+        (None for the unknown ids)
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self.pending:
+            if self.window:
+                loop.call_later(self.window, self._flush)
+            else:
+                loop.call_soon(self._flush)
+        self.pending.append((ids, future))
+        return future
+
+    def _flush(self):
+        pending, self.pending = self.pending, []
+        ids = [id_ for batch, _ in pending for id_ in batch]
+        try:
+            snapshot = self.store.snapshot
+            rows = snapshot.rows(snapshot.locate(ids))
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.ids += len(ids)
+        self.largest = max(self.largest, len(ids))
+        start = 0
+        for batch, future in pending:
+            # Requests whose client went away are cancelled
+            if not future.done():
+                future.set_result(rows[start:start + len(batch)])
+            start += len(batch)
+
+    def to_dict(self):
+        return {"batches": self.batches, "ids": self.ids,
+                "mean_size": self.ids / self.batches if self.batches
+                else None,
+                "max_size": self.largest}
+
+
+def _to_json(value):
+    # Values json does not know of: timestamps, numpy scalars
+    if isinstance(value, (pd.Timestamp, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+class FeatureServer:
+    """
+    Serves over HTTP a FeatureStore per kind of features, built from the
+    training sets returned by `loaders` (a dict of kind: function),
+    reloading them every `reload_every` seconds when given.
+    `refresh` is called before the loaders on reload, e.g. Olist.invalidate
+    to read the csv files again.
+    """
+
+    def __init__(self, loaders, batch_window=0.0, reload_every=None,
+                 refresh=None):
+        self.loaders = loaders
+        self.batch_window = batch_window
+        self.reload_every = reload_every
+        self.refresh = refresh
+        self.stores = {}
+        self.batchers = {}
+        self.latency = {}
+        self.reloads = {"count": 0, "last_s": None, "last_error": None,
+                        "running": False}
+        self._reload_lock = None
+
+    def load(self):
+        """
+        Build the stores from the loaders, before serving
+        """
+        for kind, load in self.loaders.items():
+            self.stores[kind] = FeatureStore(load(), KEYS.get(kind))
+            self.batchers[kind] = _Batcher(self.stores[kind],
+                                           self.batch_window)
+        return self
+
+    def _swap_all(self):
+        # Runs in a thread: every training set is loaded before any swap
+        if self.refresh is not None:
+            self.refresh()
+        training_sets = {kind: load() for kind, load in self.loaders.items()}
+        for kind, training_set in training_sets.items():
+            self.stores[kind].swap(training_set)
+
+    async def reload(self):
+        """
+        Load the training sets again in a thread and swap them in, keeping
+        the current snapshots when loading fails. Returns whether the
+        reload succeeded; concurrent calls wait for the running reload.
+        """
+        async with self._reload_lock:
+            self.reloads["running"] = True
+            start = time.perf_counter()
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self._swap_all)
+            except Exception:
+                self.reloads["last_error"] = traceback.format_exc(limit=3)
+                print(f"Reload failed:\n{self.reloads['last_error']}",
+                      file=sys.stderr)
+                return False
+            finally:
+                self.reloads["running"] = False
+            self.reloads["count"] += 1
+            self.reloads["last_s"] = time.perf_counter() - start
+            self.reloads["last_error"] = None
+            return True
+
+    async def _reload_periodically(self):
+        while True:
+            await asyncio.sleep(self.reload_every)
+            await self.reload()
+
+    def metrics(self):
+        return {"stores": {kind: {"version": store.version,
+                                  "rows": len(store),
+                                  "built_at": store.snapshot.built_at}
+                           for kind, store in self.stores.items()},
+                "batches": {kind: batcher.to_dict()
+                            for kind, batcher in self.batchers.items()},
+                "latency": {route: histogram.to_dict()
+                            for route, histogram in self.latency.items()},
+                "reloads": self.reloads}
+
+    async def route(self, method, path, body):
+        """
+        Returns the (status, JSON document) answering a request
+        """
+        parts = [unquote(p) for p in urlsplit(path).path.split("/") if p]
+        if parts == ["health"] and method == "GET":
+            return 200, {"status": "ok"}
+        if parts == ["metrics"] and method == "GET":
+            return 200, self.metrics()
+        if parts == ["reload"] and method == "POST":
+            asyncio.ensure_future(self.reload())
+            return 202, {"reloading": True}
+        if not parts or parts[0] not in self.stores or len(parts) > 2:
+            return 404, {"error": f"Unknown path {path}"}
+
+        batcher = self.batchers[parts[0]]
+        if len(parts) == 2 and method == "GET":
+            row, = await batcher.lookup([parts[1]])
+            if row is None:
+                return 404, {"error": f"Unknown {KEYS[parts[0]]} {parts[1]}"}
+            return 200, row
+        if len(parts) == 1 and method == "POST":
+            try:
+                ids = json.loads(body)["ids"]
+            except (ValueError, KeyError, TypeError):
+                return 400, {"error": 'Expected a JSON body {"ids": [...]}'}
+            if not isinstance(ids, list):
+                return 400, {"error": "ids must be a list"}
+            return 200, {"features": await batcher.lookup(ids)}
+        return 405, {"error": f"{method} not allowed on {path}"}
+
+    async def handle(self, reader, writer):
+        """
+        Answers the requests of one connection, kept alive until the
+        client closes it
+        """
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        ConnectionError):
+                    break
+                start = time.perf_counter()
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, path, version = lines[0].split(" ")
+                except ValueError:
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close" \
+                    and version == "HTTP/1.1"
+
+                length = headers.get("content-length") or "0"
+                # The body of a request with an invalid length cannot be
+                # skipped: answer and close the connection
+                if not (length.isascii() and length.isdigit()):
+                    status, document = 400, {"error": "Invalid Content-Length"}
+                    keep_alive = False
+                elif int(length) > MAX_BODY:
+                    status, document = 413, {"error": "Body too large"}
+                    keep_alive = False
+                else:
+                    length = int(length)
+                    body = await reader.readexactly(length) if length else b""
+                    try:
+                        status, document = await self.route(method, path,
+                                                            body)
+                    except Exception:
+                        traceback.print_exc()
+                        status, document = 500, {"error": "Internal error"}
+
+                payload = json.dumps(document, default=_to_json).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}"
+                    f"\r\n\r\n".encode() + payload)
+                await writer.drain()
+
+                route = method + " /" + "/".join(
+                    urlsplit(path).path.split("/")[1:2])
+                if status == 404:
+                    route = "not found"
+                self.latency.setdefault(route, LatencyHistogram())\
+                    .record(time.perf_counter() - start)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        """
+        Serve until cancelled, loading the stores first if need be
+        """
+        self._reload_lock = asyncio.Lock()
+        if not self.stores:
+            await asyncio.get_running_loop().run_in_executor(None, self.load)
+        server = await asyncio.start_server(self.handle, host, port)
+        reloading = None
+        if self.reload_every:
+            reloading = asyncio.ensure_future(self._reload_periodically())
+        print(f"Serving {', '.join(self.stores)} features on "
+              f"http://{host}:{port}", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if reloading is not None:
+                reloading.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m olist.server",
+        description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--kinds", nargs="+", choices=list(BUILDERS),
+                        default=["seller", "product"])
+    parser.add_argument("--csv-dir", help="directory of the csv files")
+    parser.add_argument("--features", nargs="+", default=[],
+                        metavar="KIND=PATH",
+                        help="precomputed training sets to serve, "
+                             "instead of computing them from the csv files")
+    parser.add_argument("--batch-window", type=float, default=0.0,
+                        help="ms to wait for lookups to coalesce")
+    parser.add_argument("--reload-every", type=float,
+                        help="seconds between reloads of the features")
+    args = parser.parse_args(argv)
+
+    files = dict(f.split("=", 1) for f in args.features)
+    loaders = {kind: file_loader(files[kind]) if kind in files
+               else csv_loader(kind, args.csv_dir)
+               for kind in args.kinds}
+    server = FeatureServer(loaders, args.batch_window / 1000,
+                           args.reload_every,
+                           None if files.keys() >= set(args.kinds)
+                           else Olist.invalidate)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Memory-mapped snapshots of training sets.
+
+A snapshot is a directory with one .npy file per column and a manifest.
+String columns (object or categorical) are stored as integer codes, with
+the distinct values in a dictionary .npy file. Processes reading a
+snapshot map the files read-only instead of parsing or unpickling them, so
+that every worker shares the same page-cache copy of the data:
+
+    export_training_data(Seller(), 'data/snapshots/sellers')
+    # in each worker process
+    sellers = read_snapshot('data/snapshots/sellers')
+
+Only the dictionaries are copied in each process. String columns come back
+as categoricals over the shared codes, or as object columns (a copy per
+process) with `decode_strings=True`.
+
+The snapshot path is a symbolic link to a directory of data files
+(`<path>.<id>.data`), so that a new snapshot replaces the previous one
+with a single rename of the link. The previous data directory is kept
+for the readers that resolved the link just before, and deleted when
+the next snapshot is written.
+"""
+import json
+import os
+import re
+import shutil
+import uuid
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_categorical_dtype, is_object_dtype
+
+MANIFEST = "manifest.json"
+# Version of the layout of the snapshot directories
+SNAPSHOT_VERSION = 1
+
+
+def _save(path, values):
+    # np.save without pickled objects, which could not be memory-mapped
+    np.save(path, np.ascontiguousarray(values), allow_pickle=False)
+
+
+def write_snapshot(training_set, path):
+    """
+    Writes the columns of `training_set` (its index is not kept) to the
+    snapshot directory `path`, replacing the previous snapshot at once,
+    and returns `path`.
+    Supports numeric, boolean, datetime64 and timedelta64 columns, and
+    columns of strings (object or categorical) with missing values.
+    """
+    path = path.rstrip(os.sep)
+    tmp_dir = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    columns = []
+    for i, (name, series) in enumerate(training_set.items()):
+        column = {"name": name, "file": f"{i:04d}.npy"}
+        dtype = series.dtype
+        if is_object_dtype(dtype):
+            if pd.api.types.infer_dtype(series, skipna=True) \
+                    not in ("string", "empty"):
+                raise TypeError(f"Column {name} holds other objects than "
+                                f"strings")
+            series = series.astype("category")
+            column["strings"] = True
+        elif not is_categorical_dtype(dtype) and (
+                not isinstance(dtype, np.dtype) or dtype.kind not in "biufmM"):
+            raise TypeError(f"Cannot snapshot column {name} of dtype {dtype}")
+
+        if is_categorical_dtype(series.dtype):
+            categories = series.cat.categories
+            if is_object_dtype(categories) and \
+                    pd.api.types.infer_dtype(categories) != "string":
+                raise TypeError(f"Column {name} has other categories than "
+                                f"strings")
+            column["dictionary"] = f"{i:04d}.dict.npy"
+            column["ordered"] = bool(series.cat.ordered)
+            column["strings"] = column.get("strings", False)
+            _save(os.path.join(tmp_dir, column["dictionary"]),
+                  categories.to_numpy(str) if is_object_dtype(categories)
+                  else categories.to_numpy())
+            values = series.cat.codes.to_numpy()
+        else:
+            values = series.to_numpy()
+        _save(os.path.join(tmp_dir, column["file"]), values)
+        columns.append(column)
+
+    # The manifest is written last: a directory without one is incomplete
+    with open(os.path.join(tmp_dir, MANIFEST), "w") as f:
+        json.dump({"version": SNAPSHOT_VERSION, "rows": len(training_set),
+                   "columns": columns}, f, indent=2)
+    data_dir = f"{path}.{uuid.uuid4().hex[:12]}.data"
+    os.replace(tmp_dir, data_dir)
+
+    previous = os.path.realpath(path) if os.path.islink(path) else None
+    if os.path.isdir(path) and previous is None:
+        # Snapshot written as a plain directory: move it aside first
+        previous = f"{path}.{uuid.uuid4().hex[:12]}.data"
+        os.replace(path, previous)
+    link = f"{path}.{os.getpid()}.link"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(data_dir), link)
+    # Atomic: readers see either the previous snapshot or the new one
+    os.replace(link, path)
+
+    keep = {os.path.realpath(data_dir), previous}
+    parent, name = os.path.split(os.path.abspath(path))
+    for f in os.listdir(parent):
+        stale = os.path.join(parent, f)
+        if re.fullmatch(re.escape(name) + r"\.[0-9a-f]{12}\.data", f) \
+                and os.path.realpath(stale) not in keep:
+            shutil.rmtree(stale, ignore_errors=True)
+    return path
+
+
+def read_snapshot(path, columns=None, mmap=True, decode_strings=False):
+    """
+    Returns the DataFrame of the snapshot directory `path` (only
+    `columns` when given), over read-only memory maps of its files (or
+    arrays read in memory without `mmap`). String columns are categoricals
+    sharing the mapped codes, or object columns with `decode_strings`.
+    """
+    # Resolve the link once, so that all the files come from one snapshot
+    path = os.path.realpath(path)
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest["version"] != SNAPSHOT_VERSION:
+        raise ValueError(f"Snapshot {path} has version {manifest['version']}"
+                         f", expected {SNAPSHOT_VERSION}")
+    by_name = {c["name"]: c for c in manifest["columns"]}
+    if columns is not None:
+        unknown = [c for c in columns if c not in by_name]
+        if unknown:
+            raise KeyError(f"Columns {unknown} not in the snapshot {path}")
+    names = list(by_name) if columns is None else list(columns)
+
+    data = {}
+    for name in names:
+        column = by_name[name]
+        values = np.load(os.path.join(path, column["file"]),
+                         mmap_mode="r" if mmap else None, allow_pickle=False)
+        if "dictionary" in column:
+            categories = np.load(os.path.join(path, column["dictionary"]),
+                                 allow_pickle=False)
+            values = pd.Categorical.from_codes(
+                values, pd.Index(categories, dtype=object
+                                 if categories.dtype.kind == "U" else None),
+                ordered=column["ordered"])
+            if decode_strings and column["strings"]:
+                values = np.asarray(values, dtype=object)
+        data[name] = values
+    # Without copy, pandas keeps every column in its own block, over the
+    # mapped arrays
+    return pd.DataFrame(data, columns=names, copy=False)
+
+
+def export_training_data(builder, path, **kwargs):
+    """
+    Writes `builder.get_training_data(**kwargs)` (builder is an Order,
+    Seller or Product) to the snapshot directory `path`, with the
+    original ids when its datasets are loaded with encode_ids, and
+    returns `path`
+    """
+    training_set = builder.get_training_data(**kwargs)
+    if builder.olist.encode_ids:
+        training_set = builder.olist.decode_ids(training_set)
+    return write_snapshot(training_set, path)
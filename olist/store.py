@@ -0,0 +1,204 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+from pandas.api.types import (is_bool_dtype, is_integer_dtype,
+                              is_numeric_dtype)
+
+
+class FeatureSnapshot:
+    """
+    Read-only features of one training set, for lookups by id: numeric
+    columns in one row-major float64 matrix (a row is a contiguous slice),
+    the other columns in object arrays, and a hash index of the ids.
+    """
+
+    def __init__(self, training_set, key, version=0):
+        ids = training_set[key]
+        if ids.duplicated().any():
+            raise ValueError(f"Duplicate {key} in the training set")
+        features = training_set.drop(columns=key)
+
+        self.key = key
+        self.version = version
+        self.built_at = time.time()
+        self.columns = [key] + list(features.columns)
+        self.ids = ids.to_numpy()
+        self.index = pd.Index(self.ids)
+        # Python dict for single lookups, the pandas hash table for batches
+        self._id_list = self.ids.tolist()
+        self.positions = dict(zip(self._id_list, range(len(ids))))
+
+        numeric = [c for c in features.columns
+                   if is_numeric_dtype(features[c].dtype)]
+        self.matrix = np.ascontiguousarray(
+            features[numeric].to_numpy(np.float64, na_value=np.nan))
+        self.objects = {
+            c: features[c].astype(object).where(features[c].notna(), None)
+            .to_numpy()
+            for c in features.columns if c not in numeric}
+        # Arrays of the other columns, with their dtype, for batches
+        self.arrays = {c: features[c].array for c in self.objects}
+        # How each column is read: (name, column of matrix or None, type)
+        self._layout = []
+        for c in features.columns:
+            if c in self.objects:
+                self._layout.append((c, None, None))
+            else:
+                dtype = features[c].dtype
+                self._layout.append((c, numeric.index(c),
+                                     bool if is_bool_dtype(dtype)
+                                     else int if is_integer_dtype(dtype)
+                                     else float))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, id_):
+        return id_ in self.positions
+
+    def row(self, position):
+        """
+        Returns the features of the row at `position` as a dict, with
+        Python scalars and None for missing values
+        """
+        values = self.matrix[position].tolist()
+        row = {self.key: self._id_list[position]}
+        for name, column, kind in self._layout:
+            if column is None:
+                row[name] = self.objects[name][position]
+            else:
+                value = values[column]
+                row[name] = None if value != value \
+                    else value if kind is float else kind(value)
+        return row
+
+    def locate(self, ids):
+        """
+        Returns the positions of `ids`, -1 for the unknown ones
+        """
+        if len(ids) <= 1000:
+            # A few ids: the dict is faster than the pandas hash table
+            return np.fromiter((self.positions.get(id_, -1) for id_ in ids),
+                               np.int64, len(ids))
+        return self.index.get_indexer(ids)
+
+    def rows(self, positions):
+        """
+        Returns the features of the rows at `positions` as dicts (see
+        row), None for negative positions, with one gather of the matrix
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        found = positions >= 0
+        block = self.matrix[np.where(found, positions, 0)].tolist()
+        rows = []
+        for position, values in zip(np.where(found, positions, -1).tolist(),
+                                    block):
+            if position < 0:
+                rows.append(None)
+                continue
+            row = {self.key: self._id_list[position]}
+            for name, column, kind in self._layout:
+                if column is None:
+                    row[name] = self.objects[name][position]
+                else:
+                    value = values[column]
+                    row[name] = None if value != value \
+                        else value if kind is float else kind(value)
+            rows.append(row)
+        return rows
+
+    def frame(self, ids):
+        """
+        Returns a DataFrame of the features of `ids`, in order, with
+        missing values for the unknown ones
+        """
+        positions = self.locate(ids)
+        found = positions >= 0
+        block = self.matrix[np.where(found, positions, 0)]
+        block[~found] = np.nan
+
+        data = {self.key: np.asarray(ids)}
+        for name, column, kind in self._layout:
+            if column is None:
+                data[name] = self.arrays[name].take(positions, allow_fill=True)
+            elif kind is float or not found.all():
+                data[name] = block[:, column]
+            else:
+                data[name] = block[:, column].astype(kind)
+        return pd.DataFrame(data)
+
+
+class FeatureStore:
+    """
+    In-process lookup of the features of a training set by id (the `key`
+    column, the first one when None), e.g. for a scoring service:
+
+        store = FeatureStore(Seller().get_training_data(), 'seller_id')
+        store.get(seller_id)          # dict of features, None if unknown
+        store.get([id_1, id_2])       # list of dicts
+        store.get_frame([id_1, id_2]) # DataFrame
+
+    swap replaces the features by those of a newly computed training set
+    at once: every lookup reads either the old or the new snapshot, never
+    a mix of both.
+    """
+
+    def __init__(self, training_set, key=None):
+        self.key = key or training_set.columns[0]
+        self._swap_lock = threading.Lock()
+        self._snapshot = FeatureSnapshot(training_set, self.key)
+
+    @property
+    def snapshot(self):
+        """
+        The FeatureSnapshot currently served
+        """
+        return self._snapshot
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    def __len__(self):
+        return len(self._snapshot)
+
+    def __contains__(self, id_):
+        return id_ in self._snapshot
+
+    def __repr__(self):
+        snapshot = self._snapshot
+        return (f"FeatureStore({len(snapshot)} {self.key}, "
+                f"{len(snapshot.columns) - 1} features, "
+                f"version {snapshot.version})")
+
+    def get(self, ids, default=None):
+        """
+        Returns the features of the id `ids` as a dict (`default` when
+        unknown), or of each id of a list of `ids` as a list of dicts
+        """
+        snapshot = self._snapshot
+        if pd.api.types.is_list_like(ids):
+            return [default if row is None else row
+                    for row in snapshot.rows(snapshot.locate(list(ids)))]
+        position = snapshot.positions.get(ids)
+        return default if position is None else snapshot.row(position)
+
+    def get_frame(self, ids):
+        """
+        Returns a DataFrame of the features of `ids`, in order, with
+        missing values for the unknown ones
+        """
+        return self._snapshot.frame(ids)
+
+    def swap(self, training_set):
+        """
+        Serve the features of `training_set` from now on, and return the
+        version of the new snapshot. The snapshot is built before it
+        replaces the current one, which lookups keep reading meanwhile.
+        """
+        with self._swap_lock:
+            snapshot = FeatureSnapshot(training_set, self.key,
+                                       self._snapshot.version + 1)
+            self._snapshot = snapshot
+        return snapshot.version
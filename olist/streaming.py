@@ -0,0 +1,110 @@
+import math
+import os
+import pandas as pd
+from olist.data import Olist, read_csv, _freeze, _share
+
+# Datasets partitioned by order_id, and the columns the order features use
+ORDER_TABLES = {
+    "orders": None,
+    "order_items": ["order_id", "order_item_id", "product_id", "seller_id",
+                    "shipping_limit_date", "price", "freight_value"],
+    "order_reviews": ["review_id", "order_id", "review_score"],
+}
+
+
+def _count_rows(csv_file, block_size=1 << 20):
+    """
+    Returns the number of lines of `csv_file` after its header, read block
+    by block
+    """
+    with open(csv_file, "rb") as f:
+        lines = sum(block.count(b"\n")
+                    for block in iter(lambda: f.read(block_size), b""))
+    return max(lines - 1, 0)
+
+
+def partition_by_order(olist, chunk_size, directory):
+    """
+    Split the ORDER_TABLES csv files of `olist` into buckets of about
+    `chunk_size` orders each, hashed on order_id, so that every order is in
+    the same bucket as its items and reviews.
+    The csv files are read `chunk_size` rows at a time and the buckets are
+    written to `directory`. Yields, bucket by bucket, a dict of
+    dataset name: DataFrame read with the dataset's schema.
+    """
+    csv_files = olist._csv_files()
+    n_buckets = max(1, math.ceil(_count_rows(csv_files["orders"])
+                                 / chunk_size))
+
+    def bucket_file(key, bucket):
+        return os.path.join(directory, f"{key}_{bucket}.csv")
+
+    # Start every bucket with the header, so that empty buckets still
+    # read back with the columns of the dataset
+    for key, columns in ORDER_TABLES.items():
+        header = pd.read_csv(csv_files[key], usecols=columns, nrows=0)
+        for bucket in range(n_buckets):
+            header.to_csv(bucket_file(key, bucket), index=False)
+
+    for key, columns in ORDER_TABLES.items():
+        # Keep the values as they are in the csv, they are only parsed once
+        # the bucket is read back
+        chunks = pd.read_csv(csv_files[key], usecols=columns, dtype=str,
+                             keep_default_na=False, chunksize=chunk_size)
+        for chunk in chunks:
+            buckets = pd.util.hash_array(chunk["order_id"].to_numpy(object))\
+                % n_buckets
+            for bucket, part in chunk.groupby(buckets):
+                part.to_csv(bucket_file(key, bucket), mode="a", index=False,
+                            header=False)
+
+    for bucket in range(n_buckets):
+        tables = {}
+        for key in ORDER_TABLES:
+            path = bucket_file(key, bucket)
+            tables[key] = read_csv(path, key)
+            os.remove(path)
+        yield tables
+
+
+class PartitionOlist(Olist):
+    """
+    Olist serving one bucket of partition_by_order in place of the
+    orders, order_items and order_reviews datasets, and every other dataset
+    from `parent`. Tables and derived frames (matching table, durations)
+    are cached by the instance rather than process-wide, so that buckets
+    never mix.
+    """
+
+    # Cached values not depending on the partitioned datasets
+    SHARED = ("geo_index",)
+
+    def __init__(self, tables, parent):
+        super().__init__(use_cache=parent.use_cache,
+                         cache_dir=parent.cache_dir,
+                         cache_format=parent.cache_format,
+                         verify_hash=parent.verify_hash,
+                         encode_ids=parent.encode_ids,
+                         csv_dir=parent.csv_dir)
+        self.parent = parent
+        self._cache = {}
+        self._loading = {}
+        self._tables = {}
+        for key, df in tables.items():
+            if self.encode_ids:
+                df = self._encode_ids(df)
+            self._tables[key] = _freeze(df)
+
+    def _csv_files(self):
+        return self.parent._csv_files()
+
+    def get_table(self, key, columns=None):
+        if key not in self._tables:
+            return self.parent.get_table(key, columns)
+        df = self._tables[key]
+        return _share(df) if columns is None else df[list(columns)]
+
+    def _cached(self, key, load):
+        if key[0] in self.SHARED:
+            return self.parent._cached(key, load)
+        return super()._cached(key, load)
@@ -1,18 +1,61 @@
-from math import radians, sin, cos, asin, sqrt
+import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 
 
-def haversine_distance(lon1, lat1, lon2, lat2):
+def haversine_distance(lon1, lat1, lon2, lat2, dtype=np.float64):
     """
-    Compute distance between two pairs of (lat, lng)
+    Compute distance (in km) between two pairs of (lat, lng)
     See - (https://en.wikipedia.org/wiki/Haversine_formula)
+    Accepts scalars, NumPy arrays or pandas Series, in which case all
+    distances are computed element-wise in one vectorized pass.
+    Use dtype=np.float32 to halve memory and speed up large arrays.
     """
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(x, dtype=dtype))
+                              for x in (lon1, lat1, lon2, lat2))
     dlon = lon2 - lon1
     dlat = lat2 - lat1
-    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-    return 2 * 6371 * asin(sqrt(a))
+    a = np.sin(dlat / 2) ** 2 \
+        + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    distance = 2 * 6371 * np.arcsin(np.sqrt(a))
+    if distance.ndim == 0:
+        return float(distance)
+    return distance
+
+
+def haversine_matrix_chunks(lon1, lat1, lon2, lat2, chunk_size=1024,
+                            dtype=np.float32):
+    """
+    Yields (start, stop, distances) blocks of the pairwise distance matrix
+    (in km) between the n points (lon1, lat1) and the m points (lon2, lat2),
+    where distances[i - start, j] is the distance between point i of the
+    first set and point j of the second set.
+    Only chunk_size x m distances are held in memory at once.
+    """
+    lon1, lat1 = np.asarray(lon1, dtype=dtype), np.asarray(lat1, dtype=dtype)
+    lon2, lat2 = np.asarray(lon2, dtype=dtype), np.asarray(lat2, dtype=dtype)
+    for start in range(0, len(lon1), chunk_size):
+        stop = min(start + chunk_size, len(lon1))
+        distances = haversine_distance(lon1[start:stop, None],
+                                       lat1[start:stop, None],
+                                       lon2[None, :], lat2[None, :],
+                                       dtype=dtype)
+        yield start, stop, distances
+
+
+def haversine_matrix(lon1, lat1, lon2, lat2, chunk_size=1024,
+                     dtype=np.float32, out=None):
+    """
+    Returns the n x m pairwise distance matrix (in km) between the points
+    (lon1, lat1) and (lon2, lat2), computed chunk_size rows at a time.
+    Pass a np.memmap as `out` for matrices that do not fit in memory.
+    """
+    if out is None:
+        out = np.empty((len(lon1), len(lon2)), dtype=dtype)
+    for start, stop, distances in haversine_matrix_chunks(
+            lon1, lat1, lon2, lat2, chunk_size, dtype):
+        out[start:stop] = distances
+    return out
 
 
 def return_significative_coef(model):
@@ -0,0 +1,28 @@
+import pytest
+from olist.data import Olist
+from olist.generator import generate
+
+# Orders of the synthetic dataset the tests run on
+N_ORDERS = 500
+
+
+@pytest.fixture(scope="session")
+def csv_dir(tmp_path_factory):
+    """
+    Directory of the csv files of a small synthetic dataset
+    """
+    csv_dir = str(tmp_path_factory.mktemp("olist") / "csv")
+    generate(csv_dir, N_ORDERS, seed=0)
+    return csv_dir
+
+
+@pytest.fixture
+def olist(csv_dir, tmp_path):
+    """
+    Olist of the synthetic dataset, with an empty process-wide cache and
+    the on-disk cache (off by default) in a temporary directory
+    """
+    Olist.invalidate()
+    yield Olist(use_cache=False, cache_dir=str(tmp_path / "cache"),
+                encode_ids=False, csv_dir=csv_dir)
+    Olist.invalidate()
@@ -0,0 +1,74 @@
+import json
+import os
+from olist import bench
+
+SELECT = ["Olist.get_data", "Order.get_wait_time", "Seller.get_training_data"]
+
+
+def test_run_on_a_tiny_dataset(tmp_path):
+    bench_dir = str(tmp_path / "bench")
+    results = bench.run(scales=[1], select=SELECT, repeat=1,
+                        bench_dir=bench_dir, base_orders=100)
+    assert results["meta"]["base_orders"] == 100
+    rows = {r["case"]: r for r in results["results"]}
+    assert set(rows) == set(SELECT)
+    for row in rows.values():
+        assert row["scale"] == 1 and row["n_orders"] == 100
+        assert row["seconds"] > 0 and row["seconds"] <= row["mean_seconds"]
+        assert row["peak_mb"] > 0
+    assert rows["Olist.get_data"]["rows"] > 0
+
+    # The dataset is generated once and reused
+    csv_dir = bench.fixture(1, bench_dir, 100)
+    mtime = os.path.getmtime(os.path.join(csv_dir, "olist_orders_dataset.csv"))
+    assert bench.fixture(1, bench_dir, 100) == csv_dir
+    assert os.path.getmtime(
+        os.path.join(csv_dir, "olist_orders_dataset.csv")) == mtime
+
+
+def test_cases_cover_every_feature():
+    names = set(bench.cases())
+    for cls in bench.BUILDERS:
+        for name in list(cls.features.nodes) + ["get_training_data"]:
+            assert f"{cls.__name__}.{name}" in names
+
+
+def _results(*rows):
+    return {"results": [dict(scale=1, case=case, seconds=seconds,
+                             peak_mb=peak_mb)
+                        for case, seconds, peak_mb in rows]}
+
+
+def test_compare_flags_regressions():
+    baseline = _results(("same", 1.0, 10.0), ("slower", 1.0, 10.0),
+                        ("larger", 1.0, 10.0), ("noise", 0.001, 0.1),
+                        ("removed", 1.0, 10.0))
+    current = _results(("same", 1.1, 10.5), ("slower", 1.5, 10.0),
+                       ("larger", 1.0, 20.0), ("noise", 0.005, 0.5),
+                       ("added", 1.0, 10.0))
+    report = bench.compare(baseline, current).set_index("case")
+    assert set(report.index) == {"same", "slower", "larger", "noise"}
+    assert list(report.index[report["regression"]]) == ["slower", "larger"]
+    assert report.loc["slower", "time_ratio"] == 1.5
+
+
+def test_main_run_and_compare(tmp_path, capsys):
+    output = str(tmp_path / "results.json")
+    assert bench.main(["run", "--scales", "1", "--base-orders", "100",
+                       "--repeat", "1", "--select", "Olist.get_data",
+                       "--bench-dir", str(tmp_path / "bench"),
+                       "--output", output]) == 0
+    with open(output) as f:
+        assert [r["case"] for r in json.load(f)["results"]] == \
+            ["Olist.get_data"]
+
+    slower = str(tmp_path / "slower.json")
+    with open(output) as f:
+        results = json.load(f)
+    for row in results["results"]:
+        row["seconds"] += 1
+    with open(slower, "w") as f:
+        json.dump(results, f)
+    assert bench.main(["compare", output, output]) == 0
+    assert bench.main(["compare", output, slower]) == 1
+    assert "1 regression(s) out of 1 benchmarks" in capsys.readouterr().out
@@ -0,0 +1,122 @@
+import json
+import os
+import runpy
+import pandas as pd
+import pytest
+from olist.data import Olist
+from olist.order import Order
+from olist.seller import Seller
+from olist.snapshot import read_snapshot
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OLIST_RUN = os.path.join(ROOT_DIR, "scripts", "olist-run")
+
+
+@pytest.fixture(scope="module")
+def main():
+    return runpy.run_path(OLIST_RUN)["main"]
+
+
+@pytest.fixture
+def run(main, olist, tmp_path):
+    """
+    Runs olist-run with `args` on the test datasets, in tmp_path
+    """
+    def run(*args):
+        Olist.invalidate()
+        data = ["--data-dir", olist.csv_dir,
+                "--cache-dir", olist.cache_dir] \
+            if args[0] in ("build", "cache") else []
+        return main(list(args) + data)
+    return run
+
+
+def _read(path, fmt):
+    if fmt == "csv":
+        return pd.read_csv(path)
+    if fmt == "jsonl":
+        return pd.read_json(path, lines=True)
+    if fmt == "parquet":
+        return pd.read_parquet(path)
+    return read_snapshot(path, decode_strings=True)
+
+
+@pytest.mark.parametrize("fmt, extension", [("csv", ".csv"),
+                                            ("jsonl", ".jsonl"),
+                                            ("parquet", ".parquet"),
+                                            ("snapshot", "")])
+def test_build_formats(run, olist, tmp_path, fmt, extension):
+    assert run("build", "sellers", "--format", fmt, "--chunk-size", "7",
+               "--output-dir", str(tmp_path)) == 0
+    result = _read(str(tmp_path / ("sellers" + extension)), fmt)
+    expected = Seller(olist).get_training_data()
+    assert list(result.columns) == list(expected.columns)
+    assert result["seller_id"].tolist() == expected["seller_id"].tolist()
+    assert result["sales"].tolist() == pytest.approx(expected["sales"])
+
+
+def test_build_orders_by_partitions(run, olist, tmp_path):
+    assert run("build", "orders", "--chunk-size", "100", "--encode-ids",
+               "--jobs", "2", "--output-dir", str(tmp_path),
+               "--tmp-dir", str(tmp_path)) == 0
+    result = pd.read_csv(tmp_path / "orders.csv")
+    expected = Order(olist).get_training_data()
+    # Ids are written decoded
+    assert sorted(result["order_id"]) == sorted(expected["order_id"])
+
+
+def test_build_columns(run, tmp_path):
+    assert run("build", "sellers", "--columns", "seller_id", "sales",
+               "--cache", "--output-dir", str(tmp_path)) == 0
+    result = pd.read_csv(tmp_path / "sellers.csv")
+    assert list(result.columns) == ["seller_id", "sales"]
+
+
+def test_cache_warm_and_clear(run, olist):
+    assert run("cache", "warm") == 0
+    files = os.listdir(olist.cache_dir)
+    assert "orders.parquet" in files and "geo_index_first.npz" in files
+    assert run("cache", "clear") == 0
+    assert os.listdir(olist.cache_dir) == []
+
+
+def test_bench_run_and_compare(run, tmp_path):
+    output = str(tmp_path / "results.json")
+    assert run("bench", "run", "--scales", "1", "--base-orders", "100",
+               "--repeat", "1", "--select", "get_data",
+               "--bench-dir", str(tmp_path / "bench"),
+               "--output", output) == 0
+    with open(output) as f:
+        assert json.load(f)["results"]
+    assert run("bench", "compare", output, output) == 0
+
+
+def test_serve_options(run):
+    with pytest.raises(SystemExit):
+        run("serve", "--kinds", "order")
+
+
+def test_build_columns_keep_the_rows(run, olist, tmp_path):
+    columns = ["order_id", "review_score", "price"]
+    assert run("build", "orders", "--columns", *columns[1:],
+               "--output-dir", str(tmp_path)) == 0
+    result = pd.read_csv(tmp_path / "orders.csv")
+    expected = Order(olist).get_training_data()[columns]
+    assert len(result) == len(expected)
+    assert sorted(result["order_id"]) == sorted(expected["order_id"])
+
+
+@pytest.mark.parametrize("args", [
+    ["cache", "warm"],
+    ["bench", "compare", "{output}", "{output}"],
+    ["serve", "--kinds", "order"]])
+def test_every_command_ends_with_a_summary(run, tmp_path, capsys, args):
+    output = str(tmp_path / "results.json")
+    with open(output, "w") as f:
+        json.dump({"results": [{"scale": 1, "case": "get_data",
+                                "seconds": 1.0, "peak_mb": 1.0}]}, f)
+    try:
+        run(*[a.format(output=output) for a in args])
+    except SystemExit:
+        pass
+    assert "peak rss" in capsys.readouterr().err
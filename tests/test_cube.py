@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+from olist.cube import CUBE_KINDS, STATS, MetricCube
+
+
+@pytest.fixture
+def data(olist):
+    return olist.get_data()
+
+
+def _in_range(data, start, end):
+    # Orders purchased in the months from start to end (both included), with
+    # their items and reviews
+    orders = data["orders"]
+    month = orders["order_purchase_timestamp"].dt.to_period("M")
+    orders = orders[(month >= pd.Period(start, "M")) &
+                    (month <= pd.Period(end, "M"))]
+    items = data["order_items"].merge(orders, on="order_id")
+    return orders, items
+
+
+@pytest.mark.parametrize("kind", CUBE_KINDS)
+@pytest.mark.parametrize("start, end", [("2016-01", "2019-12"),
+                                        ("2017-03", "2017-08"),
+                                        ("2018-02", "2018-02")])
+def test_window_matches_a_groupby(data, olist, kind, start, end):
+    _, items = _in_range(data, start, end)
+    key = f"{kind}_id"
+    window = MetricCube.get(olist, kind).window(start, end)
+    by_entity = items.groupby(key)
+
+    expected = pd.DataFrame({
+        "orders": by_entity["order_id"].nunique(),
+        "items": by_entity.size(),
+        "price_sum": by_entity["price"].sum(),
+        "price": by_entity["price"].mean(),
+        "price_std": by_entity["price"].std(),
+        "freight_value_sum": by_entity["freight_value"].sum(),
+    })
+    delivered = items[items["order_status"] == "delivered"]
+    wait_time = (delivered["order_delivered_customer_date"]
+                 - delivered["order_purchase_timestamp"]) \
+        / pd.Timedelta(days=1)
+    expected["wait_time"] = wait_time.groupby(delivered[key]).mean()
+
+    # Reviews count once per seller or product of their order
+    pairs = items[["order_id", key]].drop_duplicates()
+    reviews = pairs.merge(data["order_reviews"], on="order_id")
+    scores = reviews.groupby(key)["review_score"]
+    expected["review_score_count"] = scores.count()
+    expected["review_score"] = scores.mean()
+    expected["stars_5"] = (reviews["review_score"] == 5)\
+        .groupby(reviews[key]).sum()
+    expected = expected.fillna({"review_score_count": 0, "stars_5": 0})
+
+    assert len(expected) > 0
+    result = window.loc[expected.index, expected.columns]
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False,
+                                  check_names=False)
+    # Entities without orders in the range are all zero
+    others = window.drop(expected.index)
+    assert (others[["orders", "items", "price_sum"]] == 0).all().all()
+
+
+def test_rolling_and_trend_match_monthly_windows(olist):
+    cube = MetricCube.get(olist, "seller")
+    rolling = cube.rolling("price_sum", months=2)
+    for month in cube.months[::3]:
+        window = cube.window(month - 1, month, names=["price_sum"])
+        pd.testing.assert_series_equal(rolling[month], window["price_sum"],
+                                       check_names=False)
+
+    months = cube.months[-6:]
+    monthly = pd.concat([cube.window(m, m, names=["orders"])["orders"]
+                         for m in months], axis=1).to_numpy(np.float64)
+    x = np.arange(len(months))
+    expected = ((monthly - monthly.mean(axis=1, keepdims=True))
+                @ (x - x.mean())) / ((x - x.mean()) ** 2).sum()
+    np.testing.assert_allclose(cube.trend("orders", months=6), expected,
+                               atol=1e-9)
+
+
+def test_stores_only_months_with_orders(olist):
+    cube = MetricCube.get(olist, "product")
+    assert set(cube.stats) == set(STATS)
+    # Each product is only sold in a few of the months of the cube
+    assert len(cube.cells) < len(cube.ids) * len(cube.months) / 2
+    assert all(len(values) == len(cube.cells)
+               for values in cube.stats.values())
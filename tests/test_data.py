@@ -0,0 +1,140 @@
+import os
+import shutil
+import subprocess
+import sys
+from unittest import mock
+import pandas as pd
+import pytest
+from olist import data
+from olist.data import CACHE_FORMATS, ID_CODES, Olist
+from olist.geo import GeoIndex
+from olist.seller import Seller
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RELOAD = """
+from unittest import mock
+from olist.data import Olist
+olist = Olist(use_cache=False, encode_ids=False, csv_dir={csv_dir!r})
+olist.get_data(eager=True)
+with mock.patch("os.cpu_count", return_value=4):
+    data = olist.reload()
+assert len(data["orders"]) > 0
+assert set(Olist._load_times) == set(data)
+"""
+
+
+def test_reload_with_several_threads(csv_dir):
+    # In a process of its own: a deadlock would hang the whole session
+    process = subprocess.run([sys.executable, "-c",
+                              RELOAD.format(csv_dir=csv_dir)],
+                             capture_output=True, text=True, timeout=60,
+                             cwd=ROOT_DIR)
+    assert process.returncode == 0, process.stderr
+
+
+def test_cached_tables_are_read_only_but_filterable(olist):
+    reviews = olist.get_data()["order_reviews"]
+    order_id = reviews["order_id"].iloc[0]
+    assert len(reviews[reviews.order_id == order_id]) >= 1
+    with pytest.raises(ValueError):
+        reviews["review_score"].to_numpy()[0] = 1
+
+
+def test_memoized_frames_are_filterable(olist):
+    seller = Seller(olist)
+    reviews = seller.get_seller_order_reviews()
+    seller_id = reviews["seller_id"].iloc[0]
+    assert len(reviews[reviews.seller_id == seller_id]) >= 1
+    with pytest.raises(ValueError):
+        reviews["review_score"].to_numpy()[0] = 1
+
+
+@pytest.fixture
+def cached(csv_dir, tmp_path):
+    """
+    Olist with the on-disk cache on, over a copy of the csv files
+    """
+    copy = str(tmp_path / "csv")
+    shutil.copytree(csv_dir, copy)
+    Olist.invalidate()
+    yield Olist(use_cache=True, cache_dir=str(tmp_path / "cache"),
+                encode_ids=False, csv_dir=copy)
+    Olist.invalidate()
+
+
+def _parsed(olist, key):
+    # Names of the datasets whose csv file is parsed to return `key`
+    parsed = []
+    read_csv = data.read_csv
+
+    def counting_read_csv(csv_file, key=None, usecols=None):
+        parsed.append(key)
+        return read_csv(csv_file, key, usecols)
+
+    Olist.invalidate()
+    with mock.patch("olist.data.read_csv", counting_read_csv):
+        df = olist.get_table(key)
+    return df, parsed
+
+
+@pytest.mark.parametrize("cache_format", list(CACHE_FORMATS))
+def test_cache_round_trip(olist, cached, cache_format):
+    cached.cache_format = cache_format
+    for key in cached.get_data():
+        df, parsed = _parsed(cached, key)
+        assert parsed == [key]
+        df, parsed = _parsed(cached, key)
+        assert parsed == []
+        pd.testing.assert_frame_equal(df, olist.get_table(key))
+
+
+def test_cache_is_rebuilt_when_the_csv_changes(cached):
+    _parsed(cached, "sellers")
+    csv_file = os.path.join(cached.csv_dir, "olist_sellers_dataset.csv")
+    # Touched only: the content hash tells the cache is still fresh
+    os.utime(csv_file, ns=(0, 0))
+    _, parsed = _parsed(cached, "sellers")
+    assert parsed == []
+
+    sellers = pd.read_csv(csv_file)
+    sellers.iloc[:-1].to_csv(csv_file, index=False)
+    df, parsed = _parsed(cached, "sellers")
+    assert parsed == ["sellers"]
+    assert len(df) == len(sellers) - 1
+
+
+def test_clear_cache_only_deletes_its_files(cached):
+    cached.get_data().load_all()
+    GeoIndex.get(cached)
+    assert "geo_index_first.npz" in os.listdir(cached.cache_dir)
+    other = os.path.join(cached.cache_dir, "notes.json")
+    with open(other, "w") as f:
+        f.write("{}")
+    cached.clear_cache()
+    assert os.listdir(cached.cache_dir) == ["notes.json"]
+
+
+def test_memory_report_counts_the_id_codes(olist):
+    report = olist.memory_report()
+    assert "id_codes" not in report.index
+    encoded = Olist(use_cache=False, encode_ids=True, csv_dir=olist.csv_dir)
+    report = encoded.memory_report()
+    assert report.loc["id_codes", "rows"] == len(ID_CODES) > 0
+    assert report.loc["id_codes", "schema_mb"] > 0
+
+
+def test_string_writes_stay_with_the_caller(olist):
+    orders = olist.get_data()["orders"]
+    order_id = orders["order_id"].iloc[0]
+    orders["order_id"].to_numpy()[0] = "changed"
+    assert orders["order_id"].iloc[0] == "changed"
+    assert Olist(use_cache=False, encode_ids=False, csv_dir=olist.csv_dir)\
+        .get_data()["orders"]["order_id"].iloc[0] == order_id
+
+    seller = Seller(olist)
+    reviews = seller.get_seller_order_reviews()
+    seller_id = reviews["seller_id"].iloc[0]
+    reviews["seller_id"].to_numpy()[0] = "changed"
+    assert seller.get_seller_order_reviews()["seller_id"].iloc[0] == \
+        seller_id
@@ -0,0 +1,83 @@
+import os
+from unittest import mock
+import pandas as pd
+import pytest
+from olist import data
+from olist.data import Olist
+from olist.order import Order
+from olist.product import Product
+from olist.seller import Seller
+
+BUILDERS = [Order, Seller, Product]
+
+
+def _sorted(training_set, key):
+    return training_set.sort_values(key).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("backend", ["threads", "processes"])
+@pytest.mark.parametrize("builder", BUILDERS)
+def test_concurrent_build_matches_sequential(olist, builder, backend):
+    key = builder.features.key
+    expected = builder(olist).get_training_data()
+    result = builder(olist).get_training_data(n_jobs=2, backend=backend)
+    pd.testing.assert_frame_equal(_sorted(result, key),
+                                  _sorted(expected, key))
+
+
+@pytest.mark.parametrize("builder", BUILDERS)
+def test_processes_build_with_encoded_ids(olist, builder):
+    olist = Olist(use_cache=False, cache_dir=olist.cache_dir,
+                  encode_ids=True, csv_dir=olist.csv_dir)
+    key = builder.features.key
+    expected = builder(olist).get_training_data()
+    result = builder(olist).get_training_data(n_jobs=2,
+                                              backend="processes")
+    assert result[key].dtype == expected[key].dtype
+    pd.testing.assert_frame_equal(_sorted(result, key),
+                                  _sorted(expected, key))
+
+
+@pytest.mark.parametrize("builder", BUILDERS)
+def test_threads_parse_each_table_once(olist, builder):
+    parsed = []
+    read_csv = data.read_csv
+
+    def counting_read_csv(csv_file, key=None, usecols=None):
+        parsed.append(key)
+        return read_csv(csv_file, key, usecols)
+
+    with mock.patch("olist.data.read_csv", counting_read_csv):
+        builder(olist).get_training_data(n_jobs=4)
+    assert sorted(parsed) == sorted(set(parsed))
+
+
+@pytest.mark.parametrize("builder", BUILDERS)
+def test_columns_do_not_change_the_rows(olist, builder):
+    key = builder.features.key
+    full = builder(olist).get_training_data()
+    for name, node in builder.features.nodes.items():
+        if not node.output or name == "get_distance_seller_customer":
+            continue
+        columns = [key] + list(node.columns)
+        result = builder(olist).get_training_data(columns=columns)
+        pd.testing.assert_frame_equal(result.reset_index(drop=True),
+                                      full[columns].reset_index(drop=True))
+
+
+def test_columns_with_distance(olist):
+    columns = ["order_id", "distance_seller_customer"]
+    full = Order(olist).get_training_data(with_distance_seller_customer=True)
+    result = Order(olist).get_training_data(columns=columns)
+    pd.testing.assert_frame_equal(result.reset_index(drop=True),
+                                  full[columns].reset_index(drop=True))
+
+
+def test_processes_leave_no_cache_without_use_cache(olist):
+    Seller(olist).get_training_data(n_jobs=2, backend="processes")
+    assert not os.path.exists(olist.cache_dir)
+
+    olist.use_cache = True
+    Olist.invalidate()
+    Seller(olist).get_training_data(n_jobs=2, backend="processes")
+    assert "sellers.parquet" in os.listdir(olist.cache_dir)
@@ -0,0 +1,64 @@
+import filecmp
+import os
+import pandas as pd
+from olist.data import SCHEMA, TIMESTAMP_FORMAT
+from olist.generator import generate
+from tests.conftest import N_ORDERS
+
+
+def test_loads_with_the_declared_schema(olist):
+    data = olist.get_data(eager=True)
+    assert set(SCHEMA) <= set(data.keys())
+    for key, schema in SCHEMA.items():
+        df = data[key]
+        assert len(df) > 0, key
+        for kind, columns in schema.items():
+            for column in columns:
+                dtype = df[column].dtype
+                if kind == "category":
+                    assert isinstance(dtype, pd.CategoricalDtype), column
+                elif kind == "integer":
+                    assert dtype.kind in "iu", column
+                elif kind == "float":
+                    assert dtype.kind == "f", column
+                else:
+                    assert dtype.kind == "M", column
+
+
+def test_timestamps_parse_with_the_declared_format(olist):
+    csv_files = olist._csv_files()
+    for key, schema in SCHEMA.items():
+        columns = schema.get("timestamp", [])
+        if not columns:
+            continue
+        raw = pd.read_csv(csv_files[key], usecols=columns, dtype=str)
+        for column in columns:
+            parsed = pd.to_datetime(raw[column], format=TIMESTAMP_FORMAT)
+            # Only empty cells are missing
+            assert (parsed.isna() == raw[column].isna()).all(), column
+
+
+def test_relations_between_datasets(olist):
+    data = olist.get_data()
+    orders = data["orders"]
+    assert len(orders) == N_ORDERS
+    assert orders["order_id"].is_unique
+    order_ids = set(orders["order_id"])
+    for key in ["order_items", "order_reviews", "order_payments"]:
+        assert set(data[key]["order_id"]) <= order_ids, key
+    items = data["order_items"]
+    assert set(items["seller_id"]) <= set(data["sellers"]["seller_id"])
+    assert set(items["product_id"]) <= set(data["products"]["product_id"])
+    assert set(orders["customer_id"]) == \
+        set(data["customers"]["customer_id"])
+    assert data["order_reviews"]["review_score"].between(1, 5).all()
+
+
+def test_same_seed_same_files(csv_dir, tmp_path):
+    other = str(tmp_path / "csv")
+    generate(other, N_ORDERS, seed=0)
+    names = sorted(os.listdir(csv_dir))
+    assert sorted(os.listdir(other)) == names
+    _, mismatch, errors = filecmp.cmpfiles(csv_dir, other, names,
+                                           shallow=False)
+    assert mismatch == [] and errors == []
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from olist.geo import GEO_MODES, GeoIndex
+
+COLUMNS = ["geolocation_lat", "geolocation_lng"]
+
+
+@pytest.fixture
+def geolocation(olist):
+    return olist.get_table("geolocation")
+
+
+def _expected(geolocation, key, mode):
+    groups = geolocation.groupby(key, observed=True)[COLUMNS]
+    return groups.first() if mode == "first" else groups.mean()
+
+
+@pytest.mark.parametrize("mode", GEO_MODES)
+def test_lookup_zip_matches_a_groupby(geolocation, mode):
+    index = GeoIndex.from_geolocation(geolocation, mode)
+    expected = _expected(geolocation, "geolocation_zip_code_prefix", mode)
+
+    lat, lng = index.lookup_zip(expected.index)
+    np.testing.assert_array_equal(lat, expected["geolocation_lat"])
+    np.testing.assert_array_equal(lng, expected["geolocation_lng"])
+
+    # Zip code prefixes as strings, as in the seller and customer tables
+    lat, _ = index.lookup_zip(expected.index.astype(str))
+    np.testing.assert_array_equal(lat, expected["geolocation_lat"])
+
+    unknown = sorted(set(range(expected.index.max() + 2))
+                     - set(expected.index))[:10]
+    lat, lng = index.lookup_zip(unknown + [-5, 10 ** 9, "abc", None])
+    assert np.isnan(lat).all() and np.isnan(lng).all()
+
+
+@pytest.mark.parametrize("mode", GEO_MODES)
+def test_lookup_city_matches_a_groupby(geolocation, mode):
+    index = GeoIndex.from_geolocation(geolocation, mode)
+    expected = _expected(geolocation, "geolocation_city", mode)
+
+    cities = list(expected.index)[::-1]
+    lat, lng = index.lookup_city(cities + ["nowhere"])
+    np.testing.assert_allclose(lat[:-1], expected["geolocation_lat"][cities])
+    np.testing.assert_allclose(lng[:-1], expected["geolocation_lng"][cities])
+    assert np.isnan(lat[-1]) and np.isnan(lng[-1])
+
+
+def test_first_is_the_first_row_of_each_zip(geolocation):
+    index = GeoIndex.from_geolocation(geolocation, "first")
+    first = geolocation.drop_duplicates("geolocation_zip_code_prefix")
+    lat, lng = index.lookup_zip(first["geolocation_zip_code_prefix"])
+    np.testing.assert_array_equal(lat, first["geolocation_lat"])
+    np.testing.assert_array_equal(lng, first["geolocation_lng"])
+
+
+@pytest.mark.parametrize("mode", GEO_MODES)
+def test_save_and_load(geolocation, tmp_path, mode):
+    index = GeoIndex.from_geolocation(geolocation, mode)
+    path = str(tmp_path / "geo.npz")
+    index.save(path)
+    loaded = GeoIndex.load(path)
+    assert loaded.mode == mode
+    zips = geolocation["geolocation_zip_code_prefix"].unique()
+    cities = geolocation["geolocation_city"].unique()
+    for lookup, keys in [("lookup_zip", zips), ("lookup_city", cities)]:
+        np.testing.assert_array_equal(getattr(loaded, lookup)(keys),
+                                      getattr(index, lookup)(keys))
+
+
+def test_get_caches_the_index_on_disk(olist):
+    olist.use_cache = True
+    index = GeoIndex.get(olist, "centroid")
+    assert index.mode == "centroid"
+    path = f"{olist.cache_dir}/geo_index_centroid.npz"
+    loaded = GeoIndex.load(path)
+    np.testing.assert_array_equal(loaded.source, index.source)
+    zips = olist.get_table("geolocation")["geolocation_zip_code_prefix"]
+    np.testing.assert_array_equal(loaded.lookup_zip(zips),
+                                  index.lookup_zip(zips))
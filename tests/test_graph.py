@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+from olist.graph import REDUCTIONS, Adjacency, OrderGraph
+
+
+@pytest.fixture
+def tables(olist):
+    data = olist.get_data()
+    return data["orders"], data["order_items"], data["order_reviews"]
+
+
+@pytest.fixture
+def graph(olist):
+    return OrderGraph.get(olist)
+
+
+@pytest.mark.parametrize("kind", OrderGraph.KINDS)
+def test_neighbors_and_degrees_match_a_groupby(tables, graph, kind):
+    orders, items, _ = tables
+    rows = orders if kind == "customer" else items
+    # Number of rows of every (entity, order) pair
+    expected = rows.groupby([f"{kind}_id", "order_id"]).size()
+    adjacency = graph.adjacency(kind)
+    ids = graph.ids(kind)
+
+    degrees = expected.groupby(level=0).size()
+    assert (pd.Series(adjacency.degree(), index=ids)[degrees.index]
+            == degrees).all()
+    for code in range(0, len(ids), max(1, len(ids) // 50)):
+        orders_of = graph.order_ids[adjacency.neighbors(code)]
+        pairs = expected.loc[ids[code]]
+        assert sorted(orders_of) == sorted(pairs.index)
+        if adjacency.weights is not None:
+            weights = adjacency.weights[
+                adjacency.offsets[code]:adjacency.offsets[code + 1]]
+            assert (weights == pairs[orders_of].to_numpy()).all()
+
+
+def test_order_degrees(tables, graph):
+    _, items, reviews = tables
+    for adjacency, rows in [(graph.order_items, items),
+                            (graph.order_reviews, reviews)]:
+        sizes = rows.groupby("order_id").size()\
+            .reindex(graph.order_ids, fill_value=0)
+        assert (adjacency.degree() == sizes.to_numpy()).all()
+
+
+@pytest.mark.parametrize("how", REDUCTIONS)
+@pytest.mark.parametrize("per_item", [False, True])
+def test_aggregate_matches_a_merge(tables, graph, how, per_item):
+    orders, items, _ = tables
+    values = orders.set_index("order_id")["order_approved_at"]
+    values = (values - values.min()) / pd.Timedelta(days=1)
+    pairs = items[["order_id", "seller_id"]]
+    if not per_item:
+        pairs = pairs.drop_duplicates()
+    merged = pairs.merge(values.rename("value").reset_index(), on="order_id")
+    expected = merged.groupby("seller_id")["value"].agg(how)
+
+    result = graph.aggregate("seller", values, how, per_item=per_item)
+    assert sorted(result.index) == sorted(expected.index)
+    np.testing.assert_allclose(result[expected.index].astype(float),
+                               expected.astype(float))
+
+
+def test_aggregate_datetimes(tables, graph):
+    orders, items, _ = tables
+    values = orders.set_index("order_id")["order_approved_at"]
+    merged = items[["order_id", "seller_id"]].drop_duplicates()\
+        .merge(values.reset_index(), on="order_id")
+    expected = merged.groupby("seller_id")["order_approved_at"].min()
+    result = graph.aggregate("seller", values, "min")
+    pd.testing.assert_series_equal(result[expected.index], expected,
+                                   check_names=False)
+
+
+def test_expand_matches_a_merge(tables, graph):
+    orders, items, _ = tables
+    frame = orders[["order_id", "order_status"]]
+    result = graph.expand("product", frame)
+    expected = frame.merge(
+        items[["order_id", "product_id"]].drop_duplicates(), on="order_id")
+    key = ["order_id", "product_id"]
+    pd.testing.assert_frame_equal(
+        result.sort_values(key).reset_index(drop=True),
+        expected[key + ["order_status"]].sort_values(key)
+        .reset_index(drop=True))
+
+
+@pytest.mark.parametrize("how", REDUCTIONS)
+def test_reduce_skips_missing_values(how):
+    sources = np.array([0, 0, 1, 3, 3, 3, -1])
+    targets = np.array([0, 1, 2, 3, 4, 5, 0])
+    values = np.array([1.0, np.nan, np.nan, 4.0, 2.0, 6.0])
+    adjacency = Adjacency.from_pairs(sources, targets, 5)
+    valid = sources >= 0
+    expected = pd.Series(values[targets[valid]]).groupby(
+        sources[valid]).agg(how).reindex(range(5))
+    if how in ("sum", "count"):
+        expected = expected.fillna(0)
+    np.testing.assert_allclose(adjacency.reduce(values, how),
+                               expected.to_numpy(float))
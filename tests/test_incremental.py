@@ -0,0 +1,55 @@
+import os
+import shutil
+import pandas as pd
+import pytest
+from olist.data import Olist
+from olist.incremental import IncrementalFeatures
+from olist.product import Product
+from olist.seller import Seller
+
+# csv files of the datasets appended to IncrementalFeatures
+APPENDED = {"orders": "olist_orders_dataset.csv",
+            "order_items": "olist_order_items_dataset.csv",
+            "order_reviews": "olist_order_reviews_dataset.csv"}
+
+
+@pytest.fixture
+def split(csv_dir, tmp_path):
+    """
+    Olist of a copy of the csv files keeping the first half of the orders,
+    and the rows of the other half, by dataset
+    """
+    half_dir = str(tmp_path / "csv")
+    shutil.copytree(csv_dir, half_dir)
+    orders = pd.read_csv(os.path.join(csv_dir, APPENDED["orders"]))
+    first = set(orders["order_id"].iloc[:len(orders) // 2])
+    rest = {}
+    for key, file_name in APPENDED.items():
+        df = pd.read_csv(os.path.join(csv_dir, file_name))
+        in_first = df["order_id"].isin(first)
+        df[in_first].to_csv(os.path.join(half_dir, file_name), index=False)
+        rest[key] = df[~in_first]
+    Olist.invalidate()
+    yield Olist(use_cache=False, encode_ids=False, csv_dir=half_dir), rest
+    Olist.invalidate()
+
+
+@pytest.mark.parametrize("builder, key", [(Seller, "seller_id"),
+                                          (Product, "product_id")])
+def test_append_matches_a_full_rebuild(split, olist, builder, key):
+    half, rest = split
+    features = IncrementalFeatures(half)
+    features.append(orders=rest["orders"], order_items=rest["order_items"])
+    # Reviews may come after their orders
+    touched = features.append(order_reviews=rest["order_reviews"])
+    assert touched[key]
+
+    if builder is Seller:
+        result = features.get_seller_training_data()
+    else:
+        result = features.get_product_training_data()
+    Olist.invalidate()
+    expected = builder(olist).get_training_data()
+    pd.testing.assert_frame_equal(
+        result.sort_values(key).reset_index(drop=True),
+        expected.sort_values(key).reset_index(drop=True), check_dtype=False)
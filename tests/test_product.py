@@ -0,0 +1,20 @@
+import pytest
+from olist.product import Product
+
+
+def test_profits_are_aligned_on_product_id(olist):
+    product = Product(olist)
+    revenues = product.get_revenues().set_index('product_id')['revenues']
+    costs = product.get_costs().set_index('product_id')['costs']
+    profits = product.get_profits().set_index('product_id')['profits']
+
+    # Products without reviews have no costs, hence no profits
+    assert set(profits.index) == set(costs.index) & set(revenues.index)
+    assert len(profits) < len(revenues)
+    assert profits.notna().all()
+    expected = revenues[profits.index] - costs[profits.index]
+    assert (profits == expected).all()
+    # Values of the synthetic dataset of the tests
+    assert len(profits) == 145
+    assert profits.sum() == pytest.approx(-358.863)
+    assert profits['02b22b0bf2e60260b13bf3f09b88c3a9'] == pytest.approx(12.669)
@@ -0,0 +1,116 @@
+import json
+import threading
+import time
+import numpy as np
+from olist import profiling
+from olist.order import Order
+
+
+@profiling.profiled
+def _leaf(seconds):
+    time.sleep(seconds)
+    profiling.count(rows_in=10, csv_loads=1)
+    return [0] * 3
+
+
+@profiling.profiled("outer")
+def _outer():
+    _leaf(0.02)
+    _leaf(0.01)
+    with profiling.span("block") as s:
+        time.sleep(0.01)
+        s.rows(rows_in=5, rows_out=7)
+    return None
+
+
+def test_nested_spans_record_their_timings():
+    with profiling.profile(trace_memory=False) as prof:
+        _outer()
+    assert profiling.current() is None
+
+    (root,) = prof.roots
+    assert root.name == "outer"
+    assert [c.name for c in root.children] == ["_leaf", "_leaf", "block"]
+    first, second, block = root.children
+    assert first.wall >= 0.02 and second.wall >= 0.01 and block.wall >= 0.01
+    assert root.wall >= first.wall + second.wall + block.wall
+    assert first.rows_out == 3 and first.rows_in == 10
+    assert block.rows_in == 5 and block.rows_out == 7
+    assert root.rows_out is None
+    assert root.csv_loads == 0 and root.total_csv_loads == 2
+
+    tree = json.loads(prof.to_json())["spans"][0]
+    assert tree["csv_loads"] == 2
+    assert [c["name"] for c in tree["children"]] == \
+        ["_leaf", "_leaf", "block"]
+    lines = prof.to_text().splitlines()
+    assert [line.split()[0] for line in lines[1:]] == \
+        ["outer", "_leaf", "_leaf", "block"]
+    assert lines[2].startswith("  _leaf")
+
+
+def test_peak_memory_is_folded_into_parents():
+    @profiling.profiled("allocate")
+    def allocate():
+        return np.ones(2 ** 20)
+
+    @profiling.profiled("parent")
+    def parent():
+        allocate()
+        return []
+
+    with profiling.profile() as prof:
+        parent()
+    (root,) = prof.roots
+    assert root.children[0].peak >= 8 * 2 ** 20
+    assert root.peak >= root.children[0].peak
+
+
+def test_thread_spans_nest_under_their_parent():
+    with profiling.profile(trace_memory=False) as prof:
+        with profiling.span("pool"):
+            parent = profiling.current()
+
+            def task():
+                with profiling.inherit(parent):
+                    _leaf(0)
+
+            threads = [threading.Thread(target=task) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+    (root,) = prof.roots
+    assert [c.name for c in root.children] == ["_leaf"] * 3
+
+
+def test_disabled_profiling_records_nothing():
+    with profiling.profile(trace_memory=False) as prof:
+        pass
+    assert profiling.current() is None
+    assert _leaf(0) == [0, 0, 0]
+    assert _outer() is None
+    with profiling.span("off") as s:
+        s.rows(rows_in=1, rows_out=1)
+        assert s.span is None and profiling.current() is None
+    with profiling.inherit(None):
+        profiling.count(rows_in=1, csv_loads=1)
+    # Calls after the profile stopped are not added to it
+    assert prof.roots == []
+
+
+def test_profiles_the_pipeline(olist):
+    with profiling.profile(trace_memory=False) as prof:
+        training = Order(olist).get_training_data()
+    (root,) = prof.roots
+    assert root.name == "Order.get_training_data"
+    assert root.rows_out == len(training)
+    assert root.total_csv_loads > 0
+    names = set()
+
+    def visit(span):
+        names.add(span.name)
+        for child in span.children:
+            visit(child)
+    visit(root)
+    assert "Order.get_wait_time" in names
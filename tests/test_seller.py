@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import pytest
+from olist.seller import Seller
+
+
+def test_profits_are_aligned_on_seller_id(olist):
+    seller = Seller(olist)
+    sales = seller.get_sales().set_index('seller_id')['sales']
+    months = seller.get_active_dates().set_index('seller_id')[
+        'active_months']
+    revenues = seller.get_revenues().set_index('seller_id')['revenues']
+    costs = seller.get_costs().set_index('seller_id')['costs']
+    profits = seller.get_profits().set_index('seller_id')['profits']
+
+    assert (revenues == sales[revenues.index] / 10
+            + months[revenues.index] * 80).all()
+    assert set(profits.index) == set(costs.index) & set(revenues.index)
+    assert (profits == revenues[profits.index]
+            - costs[profits.index]).all()
+
+
+@pytest.fixture
+def seller(olist):
+    return Seller(olist)
+
+
+@pytest.fixture(params=["get_profits", "random"])
+def sellers(request, seller):
+    if request.param == "get_profits":
+        return seller.get_profits()
+    # Ties and missing profits, which rank worst
+    rng = np.random.default_rng(0)
+    profits = rng.integers(-5, 5, 300).astype(np.float64)
+    profits[rng.choice(300, 20, replace=False)] = np.nan
+    return pd.DataFrame({"seller_id": [f"s{i}" for i in range(300)],
+                         "profits": profits})
+
+
+def _ranked(sellers):
+    # Sellers from the best to the worst, as sorted in the notebook
+    return sellers.sort_values("profits", ascending=False,
+                               na_position="last", kind="stable")
+
+
+def test_removal_gains_match_the_notebook_loop(seller, sellers):
+    ranked = _ranked(sellers)
+    total = ranked["profits"].sum()
+    n = len(ranked)
+    profits, benefits = [], []
+    for removed in range(n):
+        kept = ranked.iloc[:n - removed]
+        profits.append(kept["profits"].sum())
+        benefits.append((kept["profits"].sum() - total) / total * 100)
+
+    gains = seller.get_removal_gains(sellers)
+    assert list(gains["n_sellers_removed"]) == list(range(n))
+    np.testing.assert_allclose(gains["profits"], profits, atol=1e-6)
+    np.testing.assert_allclose(gains["benefits_of_removing"], benefits,
+                               atol=1e-9)
+
+
+@pytest.mark.parametrize("bounds, quantiles", [
+    ((20, 50, 100), False),
+    ((0, 0, 1000), False),
+    ((0.1, 0.25, 0.5), True),
+    ((0., 0.5, 1.), True),
+])
+def test_profiles_match_ranks(seller, sellers, bounds, quantiles):
+    labels = ("Worst", "Bad", "Neutral", "Good")
+    worst_first = _ranked(sellers).iloc[::-1]
+    n = len(worst_first)
+    counts = [min(int(np.rint(b * n)) if quantiles else b, n)
+              for b in bounds]
+    expected = np.repeat(labels, np.diff([0] + counts + [n]))
+
+    profiles = seller.get_profiles(bounds, labels, quantiles=quantiles,
+                                   sellers=sellers)
+    assert list(profiles["seller_id"]) == list(sellers["seller_id"])
+    assert list(profiles["profile"].cat.categories) == list(labels)
+    # Tied sellers can swap labels: compare the profits of each profile
+    for label in labels:
+        got = profiles.loc[profiles["profile"] == label, "profits"]
+        want = worst_first.loc[expected == label, "profits"]
+        np.testing.assert_array_equal(np.sort(got.to_numpy()),
+                                      np.sort(want.to_numpy()))
+
+
+def test_profiles_reject_bad_bounds(seller, sellers):
+    with pytest.raises(ValueError):
+        seller.get_profiles((5, 2, 10), sellers=sellers)
+    with pytest.raises(ValueError):
+        seller.get_profiles((20, 50), sellers=sellers)
+
+
+def test_simulate_removal_matches_the_notebook_loop(seller, sellers):
+    profiles = seller.get_profiles(sellers=sellers)
+    ids = list(sellers["seller_id"])
+    seller_sets = {
+        profile: profiles.loc[profiles["profile"] <= profile, "seller_id"]
+        for profile in ["Worst", "Bad", "Neutral"]}
+    seller_sets["none"] = []
+    seller_sets["twice"] = ids[:3] + ids[:3]
+
+    result = seller.simulate_removal(seller_sets, sellers=sellers)
+    total = sellers["profits"].sum()
+    for name, removed in seller_sets.items():
+        kept = sellers[~sellers["seller_id"].isin(removed)]
+        row = result.loc[name]
+        assert row["n_sellers_removed"] == len(set(removed))
+        assert row["profits"] == pytest.approx(
+            kept["profits"].sum(), abs=1e-6)
+        assert row["benefits_of_removing"] == pytest.approx(
+            (kept["profits"].sum() - total) / total * 100, abs=1e-9)
+
+    with pytest.raises(KeyError):
+        seller.simulate_removal([["unknown"]], sellers=sellers)
@@ -0,0 +1,50 @@
+import asyncio
+import pytest
+from olist import server
+from olist.server import BUILDERS, KEYS, FeatureServer, csv_loader
+
+
+@pytest.mark.parametrize("kind", list(BUILDERS))
+def test_server_starts_with_each_kind(olist, kind):
+    features = FeatureServer({kind: csv_loader(kind, olist.csv_dir)})
+    features.load()
+    training_set = BUILDERS[kind](olist).get_training_data()
+    key = training_set[KEYS[kind]].iloc[0]
+
+    async def get(path):
+        return await features.route("GET", path, b"")
+
+    status, body = asyncio.run(get(f"/{kind}/{key}"))
+    assert status == 200
+    assert body[KEYS[kind]] == key
+    status, _ = asyncio.run(get(f"/{kind}/unknown"))
+    assert status == 404
+
+
+def test_orders_are_not_served():
+    with pytest.raises(SystemExit):
+        server.main(["--kinds", "order"])
+
+
+async def _exchange(features, request):
+    # Sends the raw `request` to a server of `features`, returns the answer
+    server = await asyncio.start_server(features.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(request)
+    await writer.drain()
+    answer = await reader.read()
+    writer.close()
+    server.close()
+    await server.wait_closed()
+    return answer
+
+
+@pytest.mark.parametrize("length", ["abc", "-5", "1.5", "²"])
+def test_malformed_content_length(length):
+    features = FeatureServer({})
+    request = (f"POST /seller HTTP/1.1\r\nContent-Length: {length}\r\n\r\n"
+               f"{{}}").encode()
+    answer = asyncio.run(_exchange(features, request))
+    assert answer.startswith(b"HTTP/1.1 400 Bad Request\r\n")
+    assert b"Connection: close" in answer
@@ -0,0 +1,83 @@
+import os
+from unittest import mock
+import numpy as np
+import pandas as pd
+import pytest
+from olist.data import Olist
+from olist.seller import Seller
+from olist.snapshot import export_training_data, read_snapshot, \
+    write_snapshot
+
+
+def test_round_trip(tmp_path):
+    training_set = pd.DataFrame({
+        "id": ["a", "b", None],
+        "n": np.array([1, 2, 3], dtype=np.int32),
+        "x": [0.5, np.nan, 1.5],
+        "flag": [True, False, True],
+        "at": pd.to_datetime(["2018-01-01", None, "2018-03-01"]),
+        "state": pd.Categorical(["SP", "RJ", "SP"])})
+    path = write_snapshot(training_set, str(tmp_path / "snapshot"))
+
+    result = read_snapshot(path)
+    assert isinstance(result["n"].to_numpy().base, np.memmap)
+    with pytest.raises(ValueError):
+        result["n"].to_numpy()[0] = 0
+    pd.testing.assert_frame_equal(
+        result, training_set.astype({"id": "category"}))
+    pd.testing.assert_frame_equal(
+        read_snapshot(path, columns=["x", "id"], decode_strings=True),
+        training_set[["x", "id"]])
+    with pytest.raises(KeyError):
+        read_snapshot(path, columns=["unknown"])
+
+
+def test_unsupported_columns_are_rejected(tmp_path):
+    with pytest.raises(TypeError):
+        write_snapshot(pd.DataFrame({"o": [1, "a"]}), str(tmp_path / "s"))
+
+
+def test_export_decodes_ids(csv_dir, tmp_path):
+    Olist.invalidate()
+    olist = Olist(use_cache=False, encode_ids=True, csv_dir=csv_dir)
+    path = export_training_data(Seller(olist), str(tmp_path / "sellers"))
+    expected = olist.decode_ids(Seller(olist).get_training_data())
+    result = read_snapshot(path, decode_strings=True)
+    pd.testing.assert_frame_equal(result, expected.reset_index(drop=True),
+                                  check_dtype=False)
+    Olist.invalidate()
+
+
+def test_rewrite_swaps_the_snapshot_at_once(tmp_path):
+    path = str(tmp_path / "sellers")
+    sibling = write_snapshot(pd.DataFrame({"x": [0]}),
+                             str(tmp_path / "sellers.v2"))
+    # Snapshots written as plain directories are replaced too
+    os.makedirs(path)
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        f.write("{}")
+
+    replace = os.replace
+    seen = []
+
+    def checked_replace(src, dst):
+        seen.append(os.path.exists(path))
+        replace(src, dst)
+        seen.append(os.path.exists(path))
+
+    first = None
+    for i in range(4):
+        with mock.patch("olist.snapshot.os.replace", checked_replace):
+            write_snapshot(pd.DataFrame({"x": [i, i]}), path)
+        if first is None:
+            first = read_snapshot(path)
+            seen.clear()
+        assert read_snapshot(path)["x"].tolist() == [i, i]
+    assert all(seen)
+    # Mapped files of older snapshots stay readable
+    assert first["x"].tolist() == [0, 0]
+    # The current and previous data directories are kept
+    assert len([f for f in os.listdir(tmp_path)
+                if f.startswith("sellers.") and f.endswith(".data")
+                and not f.startswith("sellers.v2")]) == 2
+    assert read_snapshot(sibling)["x"].tolist() == [0]
@@ -0,0 +1,70 @@
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+from olist.seller import Seller
+from olist.store import FeatureStore
+
+
+@pytest.fixture
+def sellers(olist):
+    return Seller(olist).get_training_data()
+
+
+def test_lookups_match_the_training_set(sellers):
+    store = FeatureStore(sellers, "seller_id")
+    assert len(store) == len(sellers)
+    ids = sellers["seller_id"].tolist()
+
+    row = store.get(ids[0])
+    expected = sellers.iloc[0].to_dict()
+    assert row.keys() == expected.keys()
+    for column, value in expected.items():
+        if isinstance(value, float):
+            assert row[column] == pytest.approx(value, nan_ok=True)
+        else:
+            assert row[column] == value
+
+    assert store.get("unknown") is None
+    assert store.get(["unknown", ids[1]], default={}) == \
+        [{}, store.get(ids[1])]
+
+    frame = store.get_frame(ids[::-1])
+    pd.testing.assert_frame_equal(
+        frame, sellers.iloc[::-1].reset_index(drop=True), check_dtype=False)
+    assert frame["seller_id"].tolist() == ids[::-1]
+    assert store.get_frame(["unknown"]).drop(columns="seller_id")\
+        .select_dtypes("number").isna().all(axis=None)
+
+
+def test_duplicate_ids_are_rejected(sellers):
+    with pytest.raises(ValueError):
+        FeatureStore(pd.concat([sellers, sellers.iloc[:1]]), "seller_id")
+
+
+def test_swap_serves_the_new_features_at_once(sellers):
+    store = FeatureStore(sellers, "seller_id")
+    seller_id = sellers["seller_id"].iloc[0]
+    updated = sellers.assign(sales=sellers["sales"] + 1)
+    old, new = sellers["sales"].iloc[0], updated["sales"].iloc[0]
+
+    seen = set()
+    stop = threading.Event()
+
+    def lookup():
+        while not stop.is_set():
+            row = store.get([seller_id])[0]
+            seen.add(row["sales"])
+
+    reader = threading.Thread(target=lookup)
+    reader.start()
+    try:
+        for version in range(1, 21):
+            assert store.swap(updated if version % 2 else sellers) == version
+    finally:
+        stop.set()
+        reader.join()
+    assert store.version == 20
+    assert store.get(seller_id)["sales"] == old
+    assert seen <= {old, new}
+    assert np.isclose(store.get_frame([seller_id])["sales"][0], old)
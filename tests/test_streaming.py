@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+from olist.data import Olist
+from olist.order import Order
+from olist.streaming import ORDER_TABLES, partition_by_order
+
+
+def _sorted(df):
+    # Buckets parse categories separately, and their concatenation has
+    # object columns in place of categoricals: compare the values
+    categories = df.select_dtypes("category").columns
+    return df.astype({c: object for c in categories})\
+        .sort_values(list(df.columns)).reset_index(drop=True)
+
+
+def test_partitions_keep_orders_with_their_rows(olist, tmp_path):
+    data = olist.get_data()
+    all_orders = set(data["orders"]["order_id"])
+    buckets = list(partition_by_order(olist, 100, str(tmp_path)))
+    assert len(buckets) == 5
+    seen = set()
+    for tables in buckets:
+        order_ids = set(tables["orders"]["order_id"])
+        assert not order_ids & seen
+        seen |= order_ids
+        # Items and reviews are in the bucket of their order
+        for key in ORDER_TABLES:
+            assert set(tables[key]["order_id"]) & all_orders <= order_ids
+    assert seen == all_orders
+    for key in ORDER_TABLES:
+        streamed = pd.concat([tables[key] for tables in buckets])
+        expected = data[key][streamed.columns]
+        assert len(streamed) == len(expected)
+        pd.testing.assert_frame_equal(_sorted(streamed), _sorted(expected))
+    # The buckets are removed once read
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"is_delivered": False},
+    {"with_distance_seller_customer": True},
+])
+def test_streamed_training_data_matches_in_memory(olist, tmp_path, kwargs):
+    expected = Order(olist).get_training_data(**kwargs)
+    chunks = list(Order(olist).iter_training_data(
+        chunk_size=100, tmp_dir=str(tmp_path), **kwargs))
+    assert len(chunks) > 1
+    pd.testing.assert_frame_equal(_sorted(pd.concat(chunks)),
+                                  _sorted(expected))
+
+
+def test_streamed_training_data_with_encoded_ids(csv_dir, tmp_path):
+    Olist.invalidate()
+    olist = Olist(use_cache=False, encode_ids=True, csv_dir=csv_dir)
+    expected = Order(olist).get_training_data()
+    streamed = pd.concat(Order(olist).iter_training_data(
+        chunk_size=100, tmp_dir=str(tmp_path)))
+    pd.testing.assert_frame_equal(_sorted(streamed), _sorted(expected))
+    Olist.invalidate()
+
+
+def test_write_training_data(olist, tmp_path):
+    path = tmp_path / "training.csv"
+    n_rows = Order(olist).write_training_data(str(path), chunk_size=100,
+                                              tmp_dir=str(tmp_path))
+    expected = Order(olist).get_training_data()
+    assert n_rows == len(expected)
+    written = pd.read_csv(path)
+    assert list(written.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(_sorted(written), _sorted(expected),
+                                  check_dtype=False)
@@ -0,0 +1,67 @@
+from math import asin, cos, radians, sin, sqrt
+import numpy as np
+import pandas as pd
+import pytest
+from olist.utils import haversine_distance, haversine_matrix, \
+    haversine_matrix_chunks
+
+
+def _scalar_haversine(lon1, lat1, lon2, lat2):
+    # haversine_distance as it was before being vectorized
+    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
+    return 2 * 6371 * asin(sqrt(a))
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(0)
+    n = 2000
+    lon1, lon2 = rng.uniform(-180, 180, (2, n))
+    lat1, lat2 = rng.uniform(-90, 90, (2, n))
+    # Identical and antipodal points, the ends of the range of distances
+    lon2[:10], lat2[:10] = lon1[:10], lat1[:10]
+    lon2[10:20] = np.where(lon1[10:20] > 0, lon1[10:20] - 180,
+                           lon1[10:20] + 180)
+    lat2[10:20] = -lat1[10:20]
+    return lon1, lat1, lon2, lat2
+
+
+def test_matches_the_scalar_formula(points):
+    expected = np.array([_scalar_haversine(*p) for p in zip(*points)])
+    distances = haversine_distance(*points)
+    np.testing.assert_allclose(distances, expected, rtol=1e-12, atol=1e-9)
+    assert (distances[:10] == 0).all()
+    np.testing.assert_allclose(distances[10:20], np.pi * 6371, rtol=1e-6)
+    # Series are computed element-wise too
+    series = haversine_distance(*(pd.Series(p) for p in points))
+    np.testing.assert_array_equal(series, distances)
+
+
+def test_scalars_return_floats(points):
+    for p in list(zip(*points))[:25]:
+        distance = haversine_distance(*p)
+        assert isinstance(distance, float)
+        assert distance == pytest.approx(_scalar_haversine(*p), abs=1e-9)
+
+
+def test_float32(points):
+    distances = haversine_distance(*points, dtype=np.float32)
+    assert distances.dtype == np.float32
+    np.testing.assert_allclose(distances, haversine_distance(*points),
+                               rtol=1e-3, atol=1.)
+
+
+def test_matrix_matches_pairwise_distances(points):
+    lon1, lat1, lon2, lat2 = (p[:50] for p in points)
+    expected = np.array([[_scalar_haversine(a, b, c, d)
+                          for c, d in zip(lon2, lat2)]
+                         for a, b in zip(lon1, lat1)])
+    matrix = haversine_matrix(lon1, lat1, lon2, lat2, chunk_size=16,
+                              dtype=np.float64)
+    np.testing.assert_allclose(matrix, expected, rtol=1e-12, atol=1e-9)
+    blocks = [(start, stop) for start, stop, _ in haversine_matrix_chunks(
+        lon1, lat1, lon2, lat2, chunk_size=16)]
+    assert blocks == [(0, 16), (16, 32), (32, 48), (48, 50)]